@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+# Pelo ASGI as listagens usam as views assíncronas (ASYNC_VIEWS=False no ambiente desativa)
+os.environ.setdefault('ASYNC_VIEWS', 'True')
 
 application = get_asgi_application()
@@ -81,8 +81,20 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    # Desativado por padrão (ver SQL_INSTRUMENTATION abaixo)
+    'data_importer.middleware.SqlInstrumentationMiddleware',
 ]
 
+# Instrumentação de SQL por requisição: cabeçalho Server-Timing com o número de
+# consultas e o tempo no banco, e log das requisições acima de SQL_SLOW_REQUEST_MS.
+SQL_INSTRUMENTATION = env.bool('SQL_INSTRUMENTATION', default=False)
+SQL_SLOW_REQUEST_MS = env.int('SQL_SLOW_REQUEST_MS', default=500)
+SQL_SLOWEST_STATEMENTS = 3
+
+# Versões assíncronas das listagens e dos endpoints JSON (data_importer/async_views.py).
+# core/asgi.py ativa-as por padrão; pelo WSGI (gunicorn sync) ficam as views síncronas.
+ASYNC_VIEWS = env.bool('ASYNC_VIEWS', default=False)
+
 ROOT_URLCONF = 'core.urls'
 
 TEMPLATES = [
@@ -113,6 +125,73 @@ DATABASES = {
 }
 
 
+# Cache
+# O cache 'pages' guarda as páginas de listagem (ver data_importer/cache.py).
+# PAGE_CACHE_BACKEND pode ser 'locmem' (por processo) ou 'file' (partilhado entre
+# os workers do gunicorn). A invalidação é feita pela versão do conjunto de dados;
+# o TIMEOUT serve apenas para descartar as páginas de versões antigas.
+PAGE_CACHE_BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+}
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'pages': {
+        'BACKEND': PAGE_CACHE_BACKENDS[env('PAGE_CACHE_BACKEND', default='locmem')],
+        'LOCATION': env('PAGE_CACHE_LOCATION', default=str(BASE_DIR / '.cache' / 'pages')),
+        'TIMEOUT': 60 * 60 * 24,
+    },
+}
+
+# Cache em disco das respostas da API do IBGE (revalidadas com ETag/Last-Modified).
+# Deixe IBGE_CACHE_DIR vazio para desativar.
+IBGE_CACHE_DIR = env('IBGE_CACHE_DIR', default=str(BASE_DIR / '.cache' / 'ibge'))
+
+# Cache colunar (Parquet) dos arquivos da Receita já lidos, um por SHA-256 do zip.
+# Deixe RECEITA_CACHE_DIR vazio para desativar.
+RECEITA_CACHE_DIR = env('RECEITA_CACHE_DIR', default=str(BASE_DIR / '.cache' / 'receita'))
+# Tamanho máximo do cache colunar em MB (as entradas menos usadas saem primeiro); 0 = sem limite.
+# Independente do limite, gravar um arquivo apaga as versões anteriores com o mesmo nome.
+RECEITA_CACHE_MAX_MB = env.int('RECEITA_CACHE_MAX_MB', default=4096)
+
+# Token (Authorization: Bearer <token>) aceito pelo endpoint /metrics, para o Prometheus.
+# Sem o token, só usuários staff logados acessam o endpoint. Vazio desativa o acesso por token.
+METRICS_TOKEN = env('METRICS_TOKEN', default='')
+
+# Logging
+# Os comandos de importação emitem um evento JSON por chunk/etapa no logger
+# 'data_importer.events' (ver data_importer/telemetry.py), uma linha por evento.
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'json_lines': {'format': '%(message)s'},
+    },
+    'handlers': {
+        'events': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'json_lines',
+        },
+    },
+    'loggers': {
+        'data_importer.events': {
+            'handlers': ['events'],
+            'level': env('IMPORT_EVENTS_LEVEL', default='INFO'),
+            'propagate': False,
+        },
+        # Requisições lentas registradas pelo SqlInstrumentationMiddleware (uma linha JSON cada)
+        'data_importer.slow_requests': {
+            'handlers': ['events'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
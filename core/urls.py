@@ -19,6 +19,8 @@ from django.contrib import admin
 from django.urls import path, include
 from django.views.generic import RedirectView
 
+from data_importer.views import MetricsView
+
 urlpatterns = [
     # Redireciona a página inicial (raiz) diretamente para a página de login
     path('', RedirectView.as_view(pattern_name='login', permanent=False)),
@@ -29,6 +31,9 @@ urlpatterns = [
     # Inclui as URLs de autenticação do Django (login, logout, etc.)
     path('accounts/', include('django.contrib.auth.urls')),
 
+    # Métricas para o Prometheus (última importação e latência das listagens)
+    path('metrics', MetricsView.as_view(), name='metrics'),
+
     # Inclui todas as URLs da nossa aplicação sob o prefixo 'app/'
     path('app/', include('data_importer.urls', namespace='data_importer')),
 ]
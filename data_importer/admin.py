@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Region, State, Municipality, District, Company
+from .models import Region, State, Municipality, District, Company, ImportCheckpoint, DatasetVersion, ImportRun
 
 @admin.register(Region)
 class RegionAdmin(admin.ModelAdmin):
@@ -32,4 +32,20 @@ class DistrictAdmin(admin.ModelAdmin):
 class CompanyAdmin(admin.ModelAdmin):
     list_display = ('cnpj', 'razao_social', 'porte_empresa', 'capital_social')
     search_fields = ('cnpj', 'razao_social')
-    list_filter = ('porte_empresa',)
\ No newline at end of file
+    list_filter = ('porte_empresa',)
+@admin.register(ImportCheckpoint)
+class ImportCheckpointAdmin(admin.ModelAdmin):
+    list_display = ('archive', 'rows_processed', 'chunks_processed', 'completed', 'updated_at')
+    search_fields = ('archive',)
+    list_filter = ('completed',)
+
+
+@admin.register(DatasetVersion)
+class DatasetVersionAdmin(admin.ModelAdmin):
+    list_display = ('name', 'version', 'updated_at')
+
+
+@admin.register(ImportRun)
+class ImportRunAdmin(admin.ModelAdmin):
+    list_display = ('command', 'finished_at', 'success', 'rows', 'created', 'updated', 'unchanged')
+    list_filter = ('command', 'success')
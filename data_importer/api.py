@@ -0,0 +1,132 @@
+# data_importer/api.py
+import hashlib
+from django.contrib.auth.mixins import LoginRequiredMixin
+from django.http import JsonResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from django.views.generic import View
+
+from .cache import DATASET_COMPANIES, DATASET_IBGE, canonical_querystring, get_dataset_state
+from .filters import RegionFilter, StateFilter, MunicipalityFilter, DistrictFilter, CompanyFilter
+from .models import Region, State, Municipality, District, Company
+from .pagination import CursorPaginator
+
+
+class ApiListView(LoginRequiredMixin, View):
+    """
+    Listagem JSON somente leitura de um modelo.
+
+    Reaproveita o FilterSet das páginas HTML, serializa com `.values()` (sem montar
+    instâncias do modelo) e pagina por cursor (?cursor=, ?limit=). O ETag e o
+    Last-Modified vêm da versão do conjunto de dados, incrementada a cada
+    importação: um cliente que repete a consulta com If-None-Match/If-Modified-Since
+    recebe 304 sem que a listagem seja consultada.
+    """
+    raise_exception = True  # 403 em vez de redirecionar para o login
+    model = None
+    filterset_class = None
+    fields = ()
+    # Última coluna precisa ser única (ver CursorPaginator)
+    ordering = ('name', 'id')
+    dataset = DATASET_IBGE
+    page_size = 100
+    max_page_size = 1000
+
+    def get_etag(self, request, version):
+        # Cada combinação de filtros/cursor é uma representação diferente
+        query = canonical_querystring(request.GET)
+        digest = hashlib.sha256(f'{self.__class__.__name__}:{version}:{query}'.encode()).hexdigest()
+        return f'"{digest[:32]}"'
+
+    def get_limit(self, request):
+        try:
+            limit = int(request.GET.get('limit', self.page_size))
+        except ValueError:
+            limit = self.page_size
+        return max(1, min(limit, self.max_page_size))
+
+    def page_url(self, request, cursor):
+        query = request.GET.copy()
+        query['cursor'] = cursor
+        return request.build_absolute_uri(f'{request.path}?{query.urlencode()}')
+
+    def get_validators(self, request, version, last_import):
+        etag = self.get_etag(request, version)
+        # Em segundos inteiros, a mesma precisão do cabeçalho If-Modified-Since
+        last_modified = int(last_import.timestamp()) if last_import else None
+        return etag, last_modified
+
+    def finalize_response(self, response, etag, last_modified):
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(last_modified)
+            # O cliente pode guardar a resposta, mas precisa revalidá-la (304 barato) a cada uso
+            patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    def get(self, request, *args, **kwargs):
+        etag, last_modified = self.get_validators(request, *get_dataset_state(self.dataset))
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = self.list(request)
+        return self.finalize_response(response, etag, last_modified)
+
+    def get_filterset(self, request):
+        return self.filterset_class(request.GET, queryset=self.model.objects.all())
+
+    def get_paginator(self, filterset, request):
+        queryset = filterset.qs.values(*self.fields)
+        return CursorPaginator(queryset, self.get_limit(request), ordering=self.ordering)
+
+    def page_response(self, request, page):
+        return JsonResponse({
+            'results': page.object_list,
+            'next': self.page_url(request, page.next_cursor) if page.has_next() else None,
+            'previous': self.page_url(request, page.previous_cursor) if page.has_previous() else None,
+        })
+
+    def invalid_filters(self, filterset):
+        return JsonResponse({'errors': filterset.errors}, status=400)
+
+    def list(self, request):
+        filterset = self.get_filterset(request)
+        if not filterset.is_valid():
+            return self.invalid_filters(filterset)
+        page = self.get_paginator(filterset, request).page(request.GET.get('cursor'))
+        return self.page_response(request, page)
+
+
+class RegionApiView(ApiListView):
+    model = Region
+    filterset_class = RegionFilter
+    fields = ('id', 'name', 'acronym')
+
+
+class StateApiView(ApiListView):
+    model = State
+    filterset_class = StateFilter
+    fields = ('id', 'name', 'acronym', 'region_id')
+
+
+class MunicipalityApiView(ApiListView):
+    model = Municipality
+    filterset_class = MunicipalityFilter
+    fields = ('id', 'name', 'state_id')
+
+
+class DistrictApiView(ApiListView):
+    model = District
+    filterset_class = DistrictFilter
+    fields = ('id', 'name', 'municipality_id')
+
+
+class CompanyApiView(ApiListView):
+    model = Company
+    filterset_class = CompanyFilter
+    fields = (
+        'cnpj', 'razao_social', 'natureza_juridica', 'qualificacao_responsavel',
+        'capital_social', 'porte_empresa', 'ente_federativo_responsavel',
+    )
+    ordering = ('razao_social', 'cnpj')
+    dataset = DATASET_COMPANIES
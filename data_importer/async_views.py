@@ -0,0 +1,223 @@
+# data_importer/async_views.py
+import time
+import itertools
+from asgiref.sync import sync_to_async
+from django.contrib.auth.mixins import LoginRequiredMixin
+from django.contrib.auth.views import redirect_to_login
+from django.core.cache import caches
+from django.core.exceptions import PermissionDenied
+from django.core.paginator import InvalidPage
+from django.http import Http404, HttpResponse, JsonResponse
+from django.utils.cache import get_conditional_response
+from django.utils.translation import gettext as _
+from django.views.generic import View
+
+from . import api, views
+from .cache import PAGE_CACHE_ALIAS, aget_dataset_state, apage_cache_key, arecord_page_cache
+from .export import EXPORT_CHUNK_SIZE, aencode_stream, agzip_stream, aiter_csv, aiter_jsonl
+from .filters import CompanyFilter
+from .models import Company
+from .pagination import AsyncPaginator, CursorPaginator
+from .telemetry import LIST_VIEW_LATENCY
+
+
+class AsyncLoginRequiredMixin(LoginRequiredMixin):
+    """LoginRequiredMixin para views assíncronas: o usuário vem de `request.auser()`, sem acesso síncrono à sessão."""
+
+    async def dispatch(self, request, *args, **kwargs):
+        user = await request.auser()
+        if not user.is_authenticated:
+            if self.raise_exception:
+                raise PermissionDenied(self.get_permission_denied_message())
+            return redirect_to_login(request.get_full_path(), self.get_login_url(), self.get_redirect_field_name())
+        # View.dispatch só escolhe o handler; os dispatch síncronos das views originais ficam de fora
+        return await View.dispatch(self, request, *args, **kwargs)
+
+
+class AsyncListMixin(AsyncLoginRequiredMixin):
+    """
+    Versão assíncrona das listagens de views.py, para servir pelo ASGI (core/asgi.py).
+
+    O cache de páginas, a contagem e a leitura da página usam o ORM assíncrono, e o
+    template recebe listas já carregadas. Só a validação do filtro (que pode consultar
+    o banco nos ModelChoiceFilter) e a renderização do template passam por uma thread,
+    como o Django já faz com qualquer TemplateResponse servida por ASGI.
+    """
+
+    async def get(self, request, *args, **kwargs):
+        started_at = time.perf_counter()
+        response = await self.cached_response(request)
+        LIST_VIEW_LATENCY.observe(request.resolver_match.url_name, time.perf_counter() - started_at)
+        return response
+
+    async def cached_response(self, request):
+        page_cache = caches[PAGE_CACHE_ALIAS]
+        key = await apage_cache_key(self.__class__.__name__, self.dataset, request.GET)
+        cached = await page_cache.aget(key)
+        if cached is not None:
+            await arecord_page_cache('hits')
+            response = HttpResponse(cached['content'], content_type=cached['content_type'])
+            response['X-Page-Cache'] = 'HIT'
+            return response
+
+        await arecord_page_cache('misses')
+        response = await self.render_list(request)
+        if response.status_code == 200:
+            await page_cache.aset(key, {'content': response.content, 'content_type': response['Content-Type']})
+        response['X-Page-Cache'] = 'MISS'
+        return response
+
+    async def render_list(self, request):
+        self.object_list = await sync_to_async(self.get_queryset)()
+        paginator, page, object_list, is_paginated = await self.apaginate_queryset(
+            self.object_list, self.get_paginate_by(self.object_list)
+        )
+        context = {
+            'view': self,
+            'filter': self.filter,
+            'paginator': paginator,
+            'page_obj': page,
+            'is_paginated': is_paginated,
+            'object_list': object_list,
+            self.get_context_object_name(self.object_list): object_list,
+            **(self.extra_context or {}),
+        }
+        response = self.render_to_response(context)
+        await sync_to_async(response.render)()
+        return response
+
+    async def apaginate_queryset(self, queryset, page_size):
+        """Mesmo que ListView.paginate_queryset, com a contagem e a página lidas por acount()/apage()."""
+        paginator = self.get_paginator(
+            queryset, page_size, orphans=self.get_paginate_orphans(),
+            allow_empty_first_page=self.get_allow_empty(),
+        )
+        page = self.kwargs.get(self.page_kwarg) or self.request.GET.get(self.page_kwarg) or 1
+        try:
+            page_number = int(page)
+        except ValueError:
+            if page != 'last':
+                raise Http404(_('Page is not “last”, nor can it be converted to an int.'))
+            await paginator.acount()
+            page_number = paginator.num_pages
+        try:
+            page = await paginator.apage(page_number)
+        except InvalidPage as e:
+            raise Http404(_('Invalid page (%(page_number)s): %(message)s') % {
+                'page_number': page_number, 'message': str(e),
+            })
+        return (paginator, page, page.object_list, page.has_other_pages())
+
+
+class AsyncStateListView(AsyncListMixin, views.StateListView):
+    paginator_class = AsyncPaginator
+
+
+class AsyncMunicipalityListView(AsyncListMixin, views.MunicipalityListView):
+    paginator_class = AsyncPaginator
+
+
+class AsyncDistrictListView(AsyncListMixin, views.DistrictListView):
+    pass
+
+
+class AsyncCompanyListView(AsyncListMixin, views.CompanyListView):
+
+    async def apaginate_queryset(self, queryset, page_size):
+        if self.page_kwarg in self.request.GET:
+            return await super().apaginate_queryset(queryset, page_size)
+        paginator = CursorPaginator(queryset, page_size, ordering=self.cursor_ordering)
+        page = await paginator.apage(self.request.GET.get('cursor'))
+        return (paginator, page, page.object_list, page.has_other_pages())
+
+
+class AsyncAutocompleteMixin(AsyncLoginRequiredMixin):
+
+    async def get(self, request, *args, **kwargs):
+        results = [{'id': obj.pk, 'text': self.get_label(obj)} async for obj in self.search(request)]
+        return JsonResponse({'results': results})
+
+
+class AsyncRegionAutocompleteView(AsyncAutocompleteMixin, views.RegionAutocompleteView):
+    pass
+
+
+class AsyncStateAutocompleteView(AsyncAutocompleteMixin, views.StateAutocompleteView):
+    pass
+
+
+class AsyncMunicipalityAutocompleteView(AsyncAutocompleteMixin, views.MunicipalityAutocompleteView):
+    pass
+
+
+async def aiterate(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Como QuerySet.aiterator(): lê o cursor no servidor em blocos de `chunk_size` linhas,
+    cada bloco numa thread. O aiterator() do Django 5.2 abre o cursor ainda no contexto
+    assíncrono com values_list() (SynchronousOnlyOperation), então o iterator() síncrono,
+    que só executa a consulta no primeiro next(), é consumido aqui do mesmo jeito.
+    """
+    rows = queryset.iterator(chunk_size=chunk_size)
+    next_batch = sync_to_async(lambda: list(itertools.islice(rows, chunk_size)))
+    while batch := await next_batch():
+        for row in batch:
+            yield row
+
+
+class AsyncCompanyExportView(AsyncLoginRequiredMixin, views.CompanyExportView):
+    """
+    Exportação servida pelo ASGI. As linhas chegam por geradores assíncronos (aiterate):
+    o Django lê um iterador síncrono inteiro para uma lista antes de enviar o primeiro byte
+    por ASGI, o que faria a memória crescer com o tamanho da exportação.
+    """
+    async_formats = {'csv': aiter_csv, 'jsonl': aiter_jsonl}
+
+    async def get(self, request, *args, **kwargs):
+        export_format = request.GET.get('format', 'csv')
+        if export_format not in self.formats:
+            return self.invalid_format()
+        filterset = CompanyFilter(request.GET, queryset=Company.objects.all())
+        if not await sync_to_async(filterset.is_valid)():
+            return self.invalid_filters(filterset)
+
+        rows = aiterate(self.get_rows(filterset), EXPORT_CHUNK_SIZE)
+        _, content_type = self.formats[export_format]
+        stream = aencode_stream(self.async_formats[export_format](rows, self.fields))
+        return self.stream_response(request, stream, export_format, content_type, agzip_stream)
+
+class AsyncApiListMixin(AsyncLoginRequiredMixin):
+    """ApiListView com a versão do conjunto de dados e a página lidas pelo ORM assíncrono."""
+
+    async def get(self, request, *args, **kwargs):
+        etag, last_modified = self.get_validators(request, *await aget_dataset_state(self.dataset))
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = await self.alist(request)
+        return self.finalize_response(response, etag, last_modified)
+
+    async def alist(self, request):
+        filterset = self.get_filterset(request)
+        if not await sync_to_async(filterset.is_valid)():
+            return self.invalid_filters(filterset)
+        page = await self.get_paginator(filterset, request).apage(request.GET.get('cursor'))
+        return self.page_response(request, page)
+
+
+class AsyncRegionApiView(AsyncApiListMixin, api.RegionApiView):
+    pass
+
+
+class AsyncStateApiView(AsyncApiListMixin, api.StateApiView):
+    pass
+
+
+class AsyncMunicipalityApiView(AsyncApiListMixin, api.MunicipalityApiView):
+    pass
+
+
+class AsyncDistrictApiView(AsyncApiListMixin, api.DistrictApiView):
+    pass
+
+
+class AsyncCompanyApiView(AsyncApiListMixin, api.CompanyApiView):
+    pass
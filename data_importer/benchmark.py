@@ -0,0 +1,123 @@
+# data_importer/benchmark.py
+import os
+import sys
+import json
+import time
+import threading
+import subprocess
+from contextlib import contextmanager
+from django.conf import settings
+from django.db import connection
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+class QueryStats:
+    """
+    Wrapper de execução (connection.execute_wrapper) que conta as consultas
+    e soma o tempo gasto esperando o banco.
+    """
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        started_at = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started_at
+            with self._lock:
+                self.queries += 1
+                self.db_seconds += elapsed
+
+
+class StageStats(QueryStats):
+    """Tempo total, linhas e consultas de uma etapa que pode ser medida em vários trechos."""
+
+    def __init__(self):
+        super().__init__()
+        self.seconds = 0.0
+        self.rows = 0
+
+    @contextmanager
+    def measure(self):
+        started_at = time.perf_counter()
+        with connection.execute_wrapper(self):
+            yield
+        self.seconds += time.perf_counter() - started_at
+
+    def as_dict(self):
+        return {
+            'seconds': round(self.seconds, 4),
+            'rows': self.rows,
+            'rows_per_second': round(self.rows / self.seconds, 1) if self.seconds else None,
+            'queries': self.queries,
+            'db_seconds': round(self.db_seconds, 4),
+        }
+
+
+def reset_peak_rss():
+    """Zera o pico de memória do processo (Linux), para medir cada etapa separadamente."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def current_rss_mb():
+    """Memória residente (RSS) atual do processo em MiB (Linux), ou None."""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+def peak_rss_mb():
+    """Pico de memória residente (RSS) do processo em MiB, ou None se não for possível medir."""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    # ru_maxrss é em KiB no Linux e em bytes no macOS
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(maxrss / (2**20 if sys.platform == 'darwin' else 1024), 1)
+
+
+def git_commit():
+    """Commit atual (abreviado), para identificar a versão medida; None fora de um repositório git."""
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def append_result(path, run):
+    """Acrescenta uma execução à lista de resultados guardada em `path` (JSON)."""
+    results = []
+    if os.path.exists(path):
+        with open(path) as f:
+            results = json.load(f)
+    results.append(run)
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+        f.write('\n')
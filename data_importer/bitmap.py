@@ -0,0 +1,97 @@
+# data_importer/bitmap.py
+import itertools
+import threading
+import numpy as np
+import pandas as pd
+
+from .models import Company
+
+# O CNPJ básico tem 8 dígitos: cabe num bitmap de 10^8 bits (12,5 MB)
+CNPJ_BASICO_LIMIT = 10**8
+
+
+def cnpj_numbers(cnpjs):
+    """
+    Converte uma Series de CNPJs básicos em inteiros. Retorna (números, válidos): só os
+    textos com exatamente 8 dígitos cabem no bitmap ('0000001' e '00000001' seriam o mesmo bit).
+    """
+    cnpjs = pd.Series(cnpjs, dtype=object)
+    valid = ((cnpjs.str.len() == 8) & cnpjs.str.isdigit()).fillna(False).to_numpy(dtype=bool)
+    numbers = np.zeros(len(cnpjs), dtype=np.int64)
+    numbers[valid] = cnpjs[valid].to_numpy().astype(np.int64)
+    return numbers, valid
+
+
+class CnpjBitmap:
+    """Conjunto de inteiros em [0, size) guardado como um array de bits."""
+
+    def __init__(self, size=CNPJ_BASICO_LIMIT):
+        self.size = size
+        self.bits = np.zeros((size + 7) // 8, dtype=np.uint8)
+
+    def add(self, numbers):
+        numbers = np.asarray(numbers, dtype=np.int64)
+        np.bitwise_or.at(self.bits, numbers >> 3, (1 << (numbers & 7)).astype(np.uint8))
+
+    def contains(self, numbers):
+        numbers = np.asarray(numbers, dtype=np.int64)
+        return ((self.bits[numbers >> 3] >> (numbers & 7)) & 1).astype(bool)
+
+    def __len__(self):
+        return int(np.bitwise_count(self.bits).sum())
+
+    def to_bytes(self):
+        return self.bits.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data, size=CNPJ_BASICO_LIMIT):
+        bitmap = cls(size)
+        bitmap.bits = np.frombuffer(data, dtype=np.uint8).copy()
+        return bitmap
+
+
+class CnpjMembership:
+    """
+    Decide, sem consultar a base, quais CNPJs de um chunk são novos.
+
+    `known` começa com os CNPJs da base (lidos uma vez, com um cursor no servidor) e
+    recebe os de cada chunk à medida que são gravados; `seen` guarda os lidos nesta
+    execução, para contar os CNPJs que aparecem mais de uma vez. Um CNPJ fora de
+    `known` é certamente novo e vai direto para a criação; os demais ainda precisam
+    da consulta dos hashes (para separar atualizados de inalterados). Um bit marcado
+    por um chunk que acabou desfeito só faz o CNPJ passar pela consulta, que o trata
+    como novo: o bitmap pode errar para "talvez exista", nunca para "é novo".
+    """
+
+    def __init__(self, known=None):
+        # `known` pode ser um bitmap já montado, compartilhado pelas importações de um mesmo processo
+        self.known = known if known is not None else CnpjBitmap()
+        self.seen = CnpjBitmap()
+        self.repeated = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_database(cls, batch_size=100000):
+        membership = cls()
+        # iterator() usa um cursor no servidor no PostgreSQL: a lista de CNPJs nunca fica inteira na memória
+        cnpjs = Company.objects.order_by().values_list('cnpj', flat=True).iterator(chunk_size=batch_size)
+        while batch := list(itertools.islice(cnpjs, batch_size)):
+            numbers, valid = cnpj_numbers(batch)
+            membership.known.add(numbers[valid])
+        return membership
+
+    def route(self, cnpjs, repeated_in_chunk=0):
+        """
+        Recebe os CNPJs (sem repetição) de um chunk e devolve a máscara dos que talvez
+        existam na base e precisam da consulta; os que não cabem no bitmap também vão
+        para a consulta. Marca todos como conhecidos e vistos nesta execução.
+        """
+        numbers, valid = cnpj_numbers(cnpjs)
+        numbers = numbers[valid]
+        maybe_existing = ~valid
+        with self._lock:
+            maybe_existing[valid] = self.known.contains(numbers)
+            self.repeated += repeated_in_chunk + int(self.seen.contains(numbers).sum())
+            self.known.add(numbers)
+            self.seen.add(numbers)
+        return maybe_existing
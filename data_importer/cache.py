@@ -0,0 +1,85 @@
+# data_importer/cache.py
+import hashlib
+from django.core.cache import caches
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Company, DatasetVersion
+
+# Conjuntos de dados: cada comando de importação incrementa a versão do seu
+DATASET_IBGE = 'ibge'
+DATASET_COMPANIES = 'companies'
+
+PAGE_CACHE_ALIAS = 'pages'
+
+
+def dataset_for_model(model):
+    return DATASET_COMPANIES if model is Company else DATASET_IBGE
+
+
+def get_dataset_version(name):
+    return DatasetVersion.objects.filter(name=name).values_list('version', flat=True).first() or 0
+
+
+async def aget_dataset_version(name):
+    return await DatasetVersion.objects.filter(name=name).values_list('version', flat=True).afirst() or 0
+
+
+def get_dataset_state(name):
+    """Retorna (versão, data da última importação) do conjunto de dados; (0, None) se nunca foi importado."""
+    return DatasetVersion.objects.filter(name=name).values_list('version', 'updated_at').first() or (0, None)
+
+
+async def aget_dataset_state(name):
+    return await DatasetVersion.objects.filter(name=name).values_list('version', 'updated_at').afirst() or (0, None)
+
+
+def bump_dataset_version(name):
+    """Incrementa (de forma atômica) a versão do conjunto de dados ao fim de uma importação."""
+    updated = DatasetVersion.objects.filter(name=name).update(version=F('version') + 1, updated_at=timezone.now())
+    if not updated:
+        DatasetVersion.objects.get_or_create(name=name, defaults={'version': 1})
+
+
+def canonical_querystring(query_dict):
+    """Querystring ordenada e sem parâmetros vazios: '?b=2&a=1&c=' e '?a=1&b=2' geram a mesma chave."""
+    items = sorted((key, value) for key, values in query_dict.lists() for value in values if value != '')
+    return '&'.join(f'{key}={value}' for key, value in items)
+
+
+def page_cache_key(view_name, dataset, query_dict, version=None):
+    if version is None:
+        version = get_dataset_version(dataset)
+    digest = hashlib.sha256(canonical_querystring(query_dict).encode()).hexdigest()
+    return f'page:{view_name}:{dataset}:v{version}:{digest}'
+
+
+async def apage_cache_key(view_name, dataset, query_dict):
+    return page_cache_key(view_name, dataset, query_dict, version=await aget_dataset_version(dataset))
+
+
+def record_page_cache(outcome):
+    """Conta hits e misses do cache de páginas (no próprio backend, para valer entre processos)."""
+    page_cache = caches[PAGE_CACHE_ALIAS]
+    key = f'page-cache:{outcome}'
+    try:
+        page_cache.incr(key)
+    except ValueError:
+        page_cache.set(key, 1, timeout=None)
+
+
+async def arecord_page_cache(outcome):
+    page_cache = caches[PAGE_CACHE_ALIAS]
+    key = f'page-cache:{outcome}'
+    try:
+        await page_cache.aincr(key)
+    except ValueError:
+        await page_cache.aset(key, 1, timeout=None)
+
+
+def page_cache_stats():
+    page_cache = caches[PAGE_CACHE_ALIAS]
+    return {
+        'hits': page_cache.get('page-cache:hits', 0),
+        'misses': page_cache.get('page-cache:misses', 0),
+    }
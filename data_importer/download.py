@@ -0,0 +1,307 @@
+# data_importer/download.py
+import os
+import json
+import time
+import zlib
+import logging
+import zipfile
+import threading
+import requests
+from concurrent.futures import ThreadPoolExecutor, wait
+from requests.adapters import HTTPAdapter
+from tqdm import tqdm
+from urllib3.util.retry import Retry
+
+from .services import DEFAULT_BACKOFF_FACTOR, DEFAULT_RETRIES, DEFAULT_TIMEOUT, RETRY_STATUSES
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONNECTIONS = 4
+# Segmentos menores que isso não compensam uma conexão a mais
+MIN_SEGMENT_SIZE = 8 * 1024 * 1024
+BLOCK_SIZE = 1024 * 1024
+# De quanto em quanto cada segmento grava o progresso (o que permite retomar após um kill)
+STATE_SAVE_INTERVAL = 16 * 1024 * 1024
+
+
+class DownloadError(Exception):
+    pass
+
+
+def verify_zip(path):
+    """Confere o diretório central e o CRC de cada membro; levanta DownloadError se o zip estiver corrompido."""
+    try:
+        with zipfile.ZipFile(path) as zf:
+            bad_member = zf.testzip()
+    except (zipfile.BadZipFile, zlib.error, EOFError, OSError) as e:
+        raise DownloadError(f'{path} não é um zip válido: {e}') from e
+    if bad_member is not None:
+        raise DownloadError(f'{path} está corrompido (CRC inválido em {bad_member}).')
+
+
+class RangeDownloader:
+    """
+    Baixa um arquivo em segmentos paralelos (HTTP Range), com retomada.
+
+    O arquivo é montado em `<destino>.part` e o progresso de cada segmento fica em
+    `<destino>.part.json`, junto com o tamanho e o ETag do servidor: uma nova execução
+    continua de onde parou se o arquivo remoto não mudou. No fim o zip é verificado
+    e renomeado para o destino, e os validadores vão para `<destino>.json`, com os quais
+    uma cópia local é comparada ao servidor antes de ser reaproveitada.
+    Sem suporte a Range (ou sem Content-Length), o arquivo vem por uma única conexão.
+    """
+
+    def __init__(self, connections=DEFAULT_CONNECTIONS, timeout=DEFAULT_TIMEOUT, retries=DEFAULT_RETRIES,
+                 backoff_factor=DEFAULT_BACKOFF_FACTOR, min_segment_size=MIN_SEGMENT_SIZE, progress=True):
+        self.connections = max(1, connections)
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.min_segment_size = min_segment_size
+        self.progress = progress
+        self._retry = Retry(
+            total=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=['HEAD', 'GET'],
+            respect_retry_after_header=True,
+        )
+        self._local = threading.local()
+        self._state_lock = threading.Lock()
+        self._failed = threading.Event()
+
+    def _session(self):
+        # Uma sessão por thread: cada segmento reaproveita a sua própria conexão
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = requests.Session()
+            adapter = HTTPAdapter(max_retries=self._retry)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+        return session
+
+    def remote_info(self, url):
+        """Tamanho, validadores (ETag/Last-Modified) e suporte a Range do arquivo remoto."""
+        response = self._session().head(url, timeout=self.timeout, allow_redirects=True)
+        response.raise_for_status()
+        size = response.headers.get('Content-Length')
+        return {
+            'url': response.url,
+            'size': int(size) if size is not None else None,
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'ranges': response.headers.get('Accept-Ranges', '').lower() == 'bytes',
+        }
+
+    def download(self, url, path):
+        """
+        Garante em `path` uma cópia íntegra e atual do arquivo da URL.
+        Retorna 'cached' (a cópia local já estava em dia), 'resumed' ou 'downloaded'.
+        """
+        try:
+            remote = self.remote_info(url)
+        except requests.RequestException as e:
+            if os.path.exists(path):
+                # Servidor fora do ar: uma cópia local íntegra ainda serve
+                logger.warning(f'Não foi possível consultar {url} ({e}). Usando a cópia local.')
+                verify_zip(path)
+                return 'cached'
+            raise DownloadError(f'Falha ao consultar {url}: {e}') from e
+
+        if os.path.exists(path):
+            if self._is_current(path, remote):
+                return 'cached'
+            logger.warning(f'{path} está incompleto ou desatualizado em relação a {url}. Baixando de novo.')
+            os.remove(path)
+
+        part_path = f'{path}.part'
+        resumed = self._fetch(remote, part_path)
+        try:
+            if remote['size'] is not None and os.path.getsize(part_path) != remote['size']:
+                raise DownloadError(
+                    f'Download de {url} incompleto: {os.path.getsize(part_path)} de {remote["size"]} bytes.'
+                )
+            verify_zip(part_path)
+        except DownloadError:
+            # Um arquivo que chegou inteiro e não fecha não adianta retomar
+            self._discard(part_path)
+            raise
+        os.replace(part_path, path)
+        self._remove(f'{part_path}.json')
+        with open(f'{path}.json', 'w') as f:
+            json.dump(self._validators(remote), f)
+        return 'resumed' if resumed else 'downloaded'
+
+    def _is_current(self, path, remote):
+        """A cópia local tem o tamanho e o ETag do servidor e é um zip íntegro?"""
+        if remote['size'] is not None and os.path.getsize(path) != remote['size']:
+            return False
+        try:
+            with open(f'{path}.json') as f:
+                local = json.load(f)
+        except (OSError, ValueError):
+            # Cópia de uma versão anterior do comando, sem validadores: vale o tamanho e o zip
+            local = {}
+        for validator in ('etag', 'last_modified'):
+            if local.get(validator) and remote[validator] and local[validator] != remote[validator]:
+                return False
+        try:
+            verify_zip(path)
+        except DownloadError:
+            return False
+        return True
+
+    def _validators(self, remote):
+        return {key: remote[key] for key in ('url', 'size', 'etag', 'last_modified')}
+
+    def _plan(self, size):
+        """Divide [0, size) em até `connections` segmentos (intervalos fechados, como no cabeçalho Range)."""
+        if size == 0:
+            return []
+        count = max(1, min(self.connections, size // self.min_segment_size))
+        step = -(-size // count)
+        return [
+            {'start': start, 'end': min(start + step, size) - 1, 'offset': start}
+            for start in range(0, size, step)
+        ]
+
+    def _load_state(self, part_path, remote):
+        """Progresso de uma tentativa anterior, se o arquivo remoto for o mesmo; senão descarta a parte."""
+        try:
+            with open(f'{part_path}.json') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            state = None
+        if (state is not None and state.get('validators') == self._validators(remote)
+                and os.path.exists(part_path) and os.path.getsize(part_path) == remote['size']):
+            return state
+        self._discard(part_path)
+        return None
+
+    def _save_state(self, part_path, state):
+        with self._state_lock:
+            tmp_path = f'{part_path}.json.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(state, f)
+            os.replace(tmp_path, f'{part_path}.json')
+
+    def _fetch(self, remote, part_path):
+        """Baixa o arquivo para `part_path`; retorna True se continuou um download anterior."""
+        if not remote['ranges'] or remote['size'] is None:
+            self._discard(part_path)
+            self._fetch_whole(remote, part_path)
+            return False
+
+        state = self._load_state(part_path, remote)
+        resumed = state is not None
+        if state is None:
+            state = {'validators': self._validators(remote), 'segments': self._plan(remote['size'])}
+            try:
+                with open(part_path, 'wb') as f:
+                    f.truncate(remote['size'])
+                self._save_state(part_path, state)
+            except OSError as e:
+                raise DownloadError(f'Falha ao criar {part_path}: {e}') from e
+
+        pending = [segment for segment in state['segments'] if segment['offset'] <= segment['end']]
+        done = remote['size'] - sum(segment['end'] + 1 - segment['offset'] for segment in pending)
+        self._failed.clear()
+        with self._progress_bar(part_path, remote['size'], done) as bar, \
+                ThreadPoolExecutor(max_workers=self.connections) as executor:
+            futures = [
+                executor.submit(self._fetch_segment, remote, part_path, segment, state, bar) for segment in pending
+            ]
+            try:
+                for future in futures:
+                    future.result()
+            except BaseException:
+                # Os outros segmentos param no próximo bloco; o progresso fica salvo para a retomada
+                self._failed.set()
+                raise
+            finally:
+                wait(futures)
+                self._save_state(part_path, state)
+        return resumed
+
+    @staticmethod
+    def _if_range_validator(remote):
+        """
+        Validador para o If-Range. Um ETag fraco (W/"...") não pode ser usado ali (RFC 9110):
+        o servidor devolveria o arquivo inteiro a cada segmento. Nesse caso vale o Last-Modified.
+        """
+        etag = remote['etag']
+        if etag and not etag.startswith('W/'):
+            return etag
+        return remote['last_modified']
+
+    def _fetch_segment(self, remote, part_path, segment, state, bar):
+        headers = {}
+        validator = self._if_range_validator(remote)
+        if validator:
+            # Se o arquivo mudou no servidor, a resposta vem inteira (200) em vez do trecho pedido
+            headers['If-Range'] = validator
+        attempt = 0
+        try:
+            # Sem buffer: o que o progresso registra já foi entregue ao sistema operacional
+            f = open(part_path, 'r+b', buffering=0)
+        except OSError as e:
+            raise DownloadError(f'Falha ao abrir {part_path}: {e}') from e
+        with f:
+            while segment['offset'] <= segment['end'] and not self._failed.is_set():
+                headers['Range'] = f"bytes={segment['offset']}-{segment['end']}"
+                try:
+                    with self._session().get(remote['url'], headers=headers, stream=True, timeout=self.timeout) as r:
+                        r.raise_for_status()
+                        if r.status_code != 206:
+                            raise DownloadError(f"O servidor não devolveu o trecho pedido de {remote['url']} (o arquivo mudou?).")
+                        f.seek(segment['offset'])
+                        unsaved = 0
+                        for block in r.iter_content(chunk_size=BLOCK_SIZE):
+                            if self._failed.is_set():
+                                return
+                            block = block[:segment['end'] + 1 - segment['offset']]
+                            f.write(block)
+                            segment['offset'] += len(block)
+                            unsaved += len(block)
+                            bar.update(len(block))
+                            if unsaved >= STATE_SAVE_INTERVAL:
+                                self._save_state(part_path, state)
+                                unsaved = 0
+                except requests.RequestException as e:
+                    # A conexão caiu no meio do segmento: pede de novo só o que falta
+                    attempt += 1
+                    if attempt > self.retries:
+                        raise DownloadError(f"Falha no download de {remote['url']}: {e}") from e
+                    logger.warning(f"Segmento {segment['start']}-{segment['end']} interrompido (tentativa {attempt}): {e}")
+                    time.sleep(self.backoff_factor * 2 ** (attempt - 1))
+                except OSError as e:
+                    # Erro ao gravar a parte (ex.: disco cheio); o progresso até aqui é salvo por _fetch
+                    raise DownloadError(f'Falha ao gravar {part_path}: {e}') from e
+
+    def _fetch_whole(self, remote, part_path):
+        try:
+            with self._session().get(remote['url'], stream=True, timeout=self.timeout) as r, \
+                    open(part_path, 'wb') as f, self._progress_bar(part_path, remote['size'], 0) as bar:
+                r.raise_for_status()
+                for block in r.iter_content(chunk_size=BLOCK_SIZE):
+                    bar.update(f.write(block))
+        except requests.RequestException as e:
+            self._remove(part_path)
+            raise DownloadError(f"Falha no download de {remote['url']}: {e}") from e
+        except OSError as e:
+            self._remove(part_path)
+            raise DownloadError(f'Falha ao gravar {part_path}: {e}') from e
+
+    def _progress_bar(self, path, total, initial):
+        return tqdm(
+            desc=path, total=total, initial=initial, unit='iB', unit_scale=True, unit_divisor=1024,
+            disable=not self.progress,
+        )
+
+    def _discard(self, part_path):
+        self._remove(part_path)
+        self._remove(f'{part_path}.json')
+
+    def _remove(self, path):
+        if os.path.exists(path):
+            os.remove(path)
@@ -0,0 +1,114 @@
+# data_importer/export.py
+import io
+import csv
+import json
+import zlib
+import itertools
+
+# Linhas lidas do cursor do banco (e serializadas) de cada vez
+EXPORT_CHUNK_SIZE = 2000
+
+
+def _batches(rows, size):
+    rows = iter(rows)
+    while batch := list(itertools.islice(rows, size)):
+        yield batch
+
+
+async def _abatches(rows, size):
+    batch = []
+    async for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _csv_text(rows):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue()
+
+
+def _jsonl_text(rows, fields):
+    # Decimais viram texto, sem perder precisão
+    return ''.join(json.dumps(dict(zip(fields, row)), ensure_ascii=False, default=str) + '\n' for row in rows)
+
+
+def iter_csv(rows, fields, batch_size=EXPORT_CHUNK_SIZE):
+    """Gera o CSV (com cabeçalho) em blocos de texto de `batch_size` linhas."""
+    yield _csv_text([fields])
+    for batch in _batches(rows, batch_size):
+        yield _csv_text(batch)
+
+
+def iter_jsonl(rows, fields, batch_size=EXPORT_CHUNK_SIZE):
+    """Gera JSON Lines (um objeto por linha)."""
+    for batch in _batches(rows, batch_size):
+        yield _jsonl_text(batch, fields)
+
+
+async def aiter_csv(rows, fields, batch_size=EXPORT_CHUNK_SIZE):
+    """iter_csv para um iterador assíncrono de linhas (ex.: QuerySet.aiterator())."""
+    yield _csv_text([fields])
+    async for batch in _abatches(rows, batch_size):
+        yield _csv_text(batch)
+
+
+async def aiter_jsonl(rows, fields, batch_size=EXPORT_CHUNK_SIZE):
+    """iter_jsonl para um iterador assíncrono de linhas."""
+    async for batch in _abatches(rows, batch_size):
+        yield _jsonl_text(batch, fields)
+
+
+def encode_stream(chunks, encoding='utf-8'):
+    for chunk in chunks:
+        yield chunk.encode(encoding)
+
+
+async def aencode_stream(chunks, encoding='utf-8'):
+    async for chunk in chunks:
+        yield chunk.encode(encoding)
+
+
+def accepts_gzip(accept_encoding):
+    """Diz se o cabeçalho Accept-Encoding aceita gzip (diretamente ou por '*'); q=0 recusa."""
+    qualities = {}
+    for item in accept_encoding.split(','):
+        coding, _, params = item.partition(';')
+        quality = 1.0
+        for param in params.split(';'):
+            name, _, value = param.strip().partition('=')
+            if name.lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[coding.strip().lower()] = quality
+    return qualities.get('gzip', qualities.get('*', 0.0)) > 0
+
+
+def _gzip_compressor(level):
+    return zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits=31: cabeçalho gzip
+
+
+def gzip_stream(chunks, level=6):
+    """Comprime um fluxo de bytes em formato gzip à medida que ele é gerado."""
+    compressor = _gzip_compressor(level)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+async def agzip_stream(chunks, level=6):
+    """gzip_stream para um fluxo assíncrono."""
+    compressor = _gzip_compressor(level)
+    async for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
@@ -1,9 +1,48 @@
 # data_importer/filters.py
 import django_filters
-from .models import State, Municipality, District, Company
+from django.db import connections
+from django.db.models import CharField, Func, Value
+from django.db.models.functions import Lower
+from .models import Region, State, Municipality, District, Company
+from .widgets import AutocompleteSelect
+
+
+class Unaccent(Func):
+    # Função IMMUTABLE criada pela migração 0006 (a mesma expressão do índice trigram)
+    function = 'data_importer_unaccent'
+    output_field = CharField()
+
+
+def search_expression(expression):
+    """Normaliza o texto do jeito indexado: unaccent(lower(...))."""
+    return Unaccent(Lower(expression))
+
+
+def filter_prefix(queryset, field, value):
+    """
+    Filtra pelo início do texto. No PostgreSQL usa a mesma normalização dos índices
+    text_pattern_ops (ignora acentos); nos demais bancos usa istartswith.
+    """
+    if connections[queryset.db].vendor != 'postgresql':
+        return queryset.filter(**{f'{field}__istartswith': value})
+    return queryset.alias(
+        prefix_search=search_expression(field)
+    ).filter(prefix_search__startswith=search_expression(Value(value)))
+
+class RegionFilter(django_filters.FilterSet):
+    name = django_filters.CharFilter(lookup_expr='icontains', label='Nome da Região')
+
+    class Meta:
+        model = Region
+        fields = ['name', 'acronym']
 
 class StateFilter(django_filters.FilterSet):
     name = django_filters.CharFilter(lookup_expr='icontains', label='Nome do Estado')
+    region = django_filters.ModelChoiceFilter(
+        queryset=Region.objects.all(),
+        label='Região',
+        widget=AutocompleteSelect('data_importer:region_autocomplete'),
+    )
 
     class Meta:
         model = State
@@ -11,6 +50,11 @@ class StateFilter(django_filters.FilterSet):
 
 class MunicipalityFilter(django_filters.FilterSet):
     name = django_filters.CharFilter(lookup_expr='icontains', label='Nome do Município')
+    state = django_filters.ModelChoiceFilter(
+        queryset=State.objects.all(),
+        label='Estado',
+        widget=AutocompleteSelect('data_importer:state_autocomplete'),
+    )
 
     class Meta:
         model = Municipality
@@ -18,14 +62,30 @@ class MunicipalityFilter(django_filters.FilterSet):
 
 class DistrictFilter(django_filters.FilterSet):
     name = django_filters.CharFilter(lookup_expr='icontains', label='Nome do Distrito')
+    municipality = django_filters.ModelChoiceFilter(
+        queryset=Municipality.objects.select_related('state'),
+        label='Município',
+        widget=AutocompleteSelect('data_importer:municipality_autocomplete'),
+    )
 
     class Meta:
         model = District
         fields = ['name', 'municipality']
 
 class CompanyFilter(django_filters.FilterSet):
-    razao_social = django_filters.CharFilter(lookup_expr='icontains', label='Razão Social')
+    razao_social = django_filters.CharFilter(method='filter_razao_social', label='Razão Social')
 
     class Meta:
         model = Company
-        fields = ['razao_social', 'porte_empresa']
\ No newline at end of file
+        fields = ['razao_social', 'porte_empresa']
+
+    def filter_razao_social(self, queryset, name, value):
+        if not value:
+            return queryset
+        # No PostgreSQL a busca por substring usa o índice GIN pg_trgm (e ignora acentos);
+        # nos demais bancos (ex.: SQLite nos testes) mantém o icontains
+        if connections[queryset.db].vendor != 'postgresql':
+            return queryset.filter(**{f'{name}__icontains': value})
+        return queryset.alias(
+            razao_social_search=search_expression(name)
+        ).filter(razao_social_search__contains=search_expression(Value(value)))
\ No newline at end of file
@@ -0,0 +1,191 @@
+# data_importer/loaders.py
+import io
+import logging
+import pandas as pd
+from decimal import Decimal
+from django.db import connection, transaction
+
+from .models import Company
+from .receita import REQUIRED_TEXT_COLUMNS
+from .telemetry import timed
+
+logger = logging.getLogger(__name__)
+
+# Campos atualizados quando um CNPJ já existe na base
+COMPANY_UPDATE_FIELDS = [
+    'razao_social', 'natureza_juridica', 'qualificacao_responsavel',
+    'capital_social', 'porte_empresa', 'ente_federativo_responsavel', 'row_hash'
+]
+COMPANY_FIELDS = ['cnpj'] + COMPANY_UPDATE_FIELDS
+
+ENGINES = ['orm', 'copy']
+
+
+def column_values(series: pd.Series):
+    """Valores da coluna como objetos Python; categorias e strings Arrow trazem None nos ausentes (e não NaN/NA)."""
+    if series.dtype == object or pd.api.types.is_numeric_dtype(series):
+        return series.tolist()
+    return series.astype(object).where(series.notna(), None).tolist()
+
+
+def decimal_values(series: pd.Series):
+    """Capital social como Decimal, venha como texto ('1000.00') ou como float (modo tipado)."""
+    if pd.api.types.is_numeric_dtype(series):
+        return [Decimal(f'{value:.2f}') for value in series.tolist()]
+    return list(map(Decimal, series.tolist()))
+
+
+class OrmCompanyLoader:
+    """
+    Grava os chunks com bulk_create/bulk_update do ORM.
+    Funciona em qualquer banco (é o caminho usado nos testes com SQLite).
+
+    Com um `membership` (bitmap.CnpjMembership), só os CNPJs que talvez já existam
+    passam pela consulta dos hashes; os demais vão direto para o bulk_create.
+    """
+    name = 'orm'
+    # Memória de trabalho por linha gravada (instâncias de Company e listas de valores),
+    # medida com tracemalloc num chunk de 50 mil linhas; usada pelo --memory-budget
+    write_bytes_per_row = 600
+
+    def __init__(self, batch_size=1000, membership=None):
+        self.batch_size = batch_size
+        self.membership = membership
+
+    def build_companies(self, chunk: pd.DataFrame):
+        """Monta as instâncias de Company numa única passada pelas colunas do chunk."""
+        columns = [column_values(chunk[field]) for field in COMPANY_FIELDS]
+        columns[COMPANY_FIELDS.index('capital_social')] = decimal_values(chunk['capital_social'])
+        # COMPANY_FIELDS segue a ordem dos campos do modelo, então dá para usar o construtor posicional
+        return [Company(*values) for values in zip(*columns)]
+
+    def load(self, chunk: pd.DataFrame, timings=None):
+        """
+        Grava o chunk já normalizado (com a coluna row_hash) e retorna
+        (criadas, atualizadas, inalteradas). Linhas com o mesmo hash não são regravadas.
+        Se `timings` for um dict, soma nele os segundos de 'lookup', 'insert' e 'update'.
+        """
+        with timed(timings, 'lookup'):
+            # CNPJ repetido no chunk: fica a última linha, como no upsert do engine copy
+            # (duas linhas novas com o mesmo CNPJ fariam o bulk_create violar a chave primária)
+            repeated = chunk['cnpj'].duplicated(keep='last')
+            if repeated.any():
+                chunk = chunk[~repeated]
+            lookup_cnpjs = chunk['cnpj']
+            if self.membership is not None:
+                lookup_cnpjs = lookup_cnpjs[self.membership.route(lookup_cnpjs, int(repeated.sum()))]
+            existing_hashes = {}
+            if len(lookup_cnpjs):
+                existing_hashes = dict(
+                    Company.objects.filter(cnpj__in=lookup_cnpjs.tolist()).values_list('cnpj', 'row_hash')
+                )
+
+            is_existing = chunk['cnpj'].isin(existing_hashes.keys())
+            is_unchanged = is_existing & (chunk['cnpj'].map(existing_hashes.get) == chunk['row_hash'])
+
+        with timed(timings, 'insert'):
+            objects_to_create = self.build_companies(chunk[~is_existing])
+            if objects_to_create:
+                Company.objects.bulk_create(objects_to_create, batch_size=self.batch_size)
+
+        with timed(timings, 'update'):
+            objects_to_update = self.build_companies(chunk[is_existing & ~is_unchanged])
+            if objects_to_update:
+                Company.objects.bulk_update(objects_to_update, COMPANY_UPDATE_FIELDS, batch_size=self.batch_size)
+
+        return len(objects_to_create), len(objects_to_update), int(is_unchanged.sum())
+
+
+class CopyCompanyLoader:
+    """
+    Grava os chunks via COPY FROM STDIN numa tabela de staging e faz o merge
+    na tabela de empresas com um único INSERT ... ON CONFLICT (apenas PostgreSQL).
+
+    A staging é uma tabela temporária: não gera WAL (como uma UNLOGGED) e é
+    privada da sessão, então vários processos/threads podem importar ao mesmo tempo.
+    """
+    name = 'copy'
+    staging_table = 'data_importer_company_staging'
+    # O buffer CSV do COPY, medido como no OrmCompanyLoader
+    write_bytes_per_row = 300
+
+    def _ensure_staging_table(self, cursor):
+        # A tabela temporária vive enquanto a conexão estiver aberta
+        cursor.execute(
+            f'CREATE TEMPORARY TABLE IF NOT EXISTS {self.staging_table} '
+            f'(LIKE {Company._meta.db_table} INCLUDING DEFAULTS)'
+        )
+
+    def _copy_sql(self, table):
+        # No CSV do COPY um campo vazio sem aspas é NULL; nas colunas NOT NULL ele vale ''
+        return (
+            f"COPY {table} ({', '.join(COMPANY_FIELDS)}) FROM STDIN "
+            f"WITH (FORMAT csv, FORCE_NOT_NULL ({', '.join(REQUIRED_TEXT_COLUMNS)}))"
+        )
+
+    def _to_csv_buffer(self, chunk: pd.DataFrame):
+        buffer = io.StringIO()
+        # Campos vazios (NaN) viram NULL no formato CSV do COPY
+        chunk[COMPANY_FIELDS].to_csv(buffer, index=False, header=False, float_format='%.2f')
+        buffer.seek(0)
+        return buffer
+
+    def load(self, chunk: pd.DataFrame, timings=None):
+        """
+        Grava o chunk já normalizado (com a coluna row_hash) e retorna
+        (criadas, atualizadas, inalteradas). Linhas com o mesmo hash não são regravadas.
+        Se `timings` for um dict, soma nele os segundos de 'copy' (staging) e 'merge'
+        (a busca, a inserção e a atualização acontecem juntas no upsert).
+        """
+        table = Company._meta.db_table
+        columns = ', '.join(COMPANY_FIELDS)
+        updates = ', '.join(f'{field} = EXCLUDED.{field}' for field in COMPANY_UPDATE_FIELDS)
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            with timed(timings, 'copy'):
+                self._ensure_staging_table(cursor)
+                cursor.execute(f'TRUNCATE {self.staging_table}')
+                cursor.copy_expert(self._copy_sql(self.staging_table), self._to_csv_buffer(chunk))
+            # DISTINCT ON evita o erro de "afetar a mesma linha duas vezes" quando
+            # um CNPJ se repete dentro do mesmo chunk
+            # (xmax = 0) identifica as linhas inseridas (e não atualizadas) pelo upsert;
+            # o WHERE do DO UPDATE pula as linhas cujo hash não mudou
+            with timed(timings, 'merge'):
+                cursor.execute(
+                    f'WITH merged AS ('
+                    f'INSERT INTO {table} ({columns}) '
+                    f'SELECT DISTINCT ON (cnpj) {columns} FROM {self.staging_table} ORDER BY cnpj '
+                    f'ON CONFLICT (cnpj) DO UPDATE SET {updates} '
+                    f'WHERE {table}.row_hash IS DISTINCT FROM EXCLUDED.row_hash '
+                    f'RETURNING (xmax = 0) AS inserted'
+                    f') SELECT COUNT(*) FILTER (WHERE inserted), COUNT(*) FROM merged'
+                )
+                created, written = cursor.fetchone()
+
+        return created, written - created, chunk['cnpj'].nunique() - written
+
+
+class SnapshotCompanyLoader(CopyCompanyLoader):
+    """
+    Grava os chunks por COPY direto na tabela sombra do modo --snapshot (ver snapshot.py).
+    A sombra ainda não tem chave primária nem índices: não há busca nem upsert, só
+    acréscimo, e todas as linhas contam como criadas.
+    """
+    name = 'snapshot'
+
+    def __init__(self, table):
+        self.table = table
+
+    def load(self, chunk: pd.DataFrame, timings=None):
+        with timed(timings, 'copy'), connection.cursor() as cursor:
+            cursor.copy_expert(self._copy_sql(self.table), self._to_csv_buffer(chunk))
+        return len(chunk), 0, 0
+
+
+def get_loader(engine: str):
+    """Retorna o loader do engine pedido, caindo para o ORM fora do PostgreSQL."""
+    if engine == 'copy':
+        if connection.vendor == 'postgresql':
+            return CopyCompanyLoader()
+        logger.warning(f"Engine 'copy' requer PostgreSQL (banco atual: {connection.vendor}). Usando o ORM.")
+    return OrmCompanyLoader()
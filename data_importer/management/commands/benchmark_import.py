@@ -0,0 +1,138 @@
+import os
+import io
+import time
+import tempfile
+import zipfile
+import platform
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from data_importer.benchmark import StageStats, append_result, git_commit, peak_rss_mb, reset_peak_rss
+from data_importer.loaders import ENGINES
+from data_importer.management.commands.populate_companies import Command as PopulateCompaniesCommand
+from data_importer.receita import find_csv_member, read_csv_chunks
+
+STAGES = ['process_chunk', 'populate_companies']
+
+
+class Command(BaseCommand):
+    help = (
+        'Mede o desempenho da importação de empresas num arquivo .zip (ex.: gerado por generate_empresas) '
+        'e acrescenta o resultado a um arquivo JSON, para comparar execuções entre commits.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('archive', help="Arquivo .zip no formato da Receita.")
+        parser.add_argument('--engine', choices=ENGINES, default='orm', help="Engine de gravação a medir.")
+        parser.add_argument(
+            '--stages',
+            nargs='+',
+            choices=STAGES,
+            default=STAGES,
+            help="'process_chunk': leitura, transformação e gravação medidas separadamente, numa transação "
+                 "desfeita no fim; 'populate_companies': o comando completo (grava de fato na base)."
+        )
+        parser.add_argument(
+            '--output',
+            default=os.path.join(settings.BASE_DIR, 'benchmark_results.json'),
+            help="Arquivo JSON onde os resultados são acumulados."
+        )
+        parser.add_argument('--label', default='', help="Descrição livre desta execução.")
+
+    def handle(self, *args, **options):
+        archive = options['archive']
+        if not os.path.exists(archive):
+            raise CommandError(f'Arquivo {archive} não encontrado.')
+
+        run = {
+            'timestamp': timezone.now().isoformat(),
+            'commit': git_commit(),
+            'label': options['label'],
+            'archive': os.path.basename(archive),
+            'archive_bytes': os.path.getsize(archive),
+            'database': connection.vendor,
+            'engine': options['engine'],
+            'python': platform.python_version(),
+            'stages': {},
+        }
+
+        if 'process_chunk' in options['stages']:
+            self.stdout.write('Medindo process_chunk (leitura, transformação e gravação)...')
+            run['stages']['process_chunk'] = self.benchmark_process_chunk(archive, options['engine'])
+        if 'populate_companies' in options['stages']:
+            self.stdout.write('Medindo o comando populate_companies...')
+            run['stages']['populate_companies'] = self.benchmark_populate_companies(archive, options['engine'])
+
+        append_result(options['output'], run)
+        for name, stage in run['stages'].items():
+            self.stdout.write(
+                f"{name}: {stage['rows']} linhas em {stage['seconds']:.2f}s ({stage['rows_per_second']} linhas/s), "
+                f"{stage['queries']} consultas, {stage['db_seconds']:.2f}s no banco, pico de {stage['peak_rss_mb']} MiB."
+            )
+        self.stdout.write(self.style.SUCCESS(f"Resultado acrescentado a {options['output']}."))
+
+    def benchmark_process_chunk(self, archive, engine):
+        """Mede cada etapa do processamento por chunk; as gravações são desfeitas no fim."""
+        command = PopulateCompaniesCommand(stdout=io.StringIO())
+        # Os padrões do próprio populate_companies, para medir a mesma configuração que ele executa
+        parser = command.create_parser('manage.py', 'populate_companies')
+        command.configure({**vars(parser.parse_args([archive])), 'engine': engine})
+        stages = {'read': StageStats(), 'transform': StageStats(), 'write': StageStats()}
+
+        reset_peak_rss()
+        started_at = time.perf_counter()
+        with transaction.atomic(), zipfile.ZipFile(archive) as zf, zf.open(find_csv_member(zf)) as csv_file:
+            chunks = read_csv_chunks(
+                csv_file, command.chunk_size, mode=command.parse_mode, arrow_strings=command.arrow_strings
+            )
+            while True:
+                with stages['read'].measure():
+                    chunk, _ = next(chunks, (None, None))
+                if chunk is None:
+                    break
+                for stage in stages.values():
+                    stage.rows += len(chunk)
+                with stages['transform'].measure():
+                    chunk = command.transform_chunk(chunk)
+                with stages['write'].measure():
+                    command.write_chunk(chunk)
+            # A base fica como estava, para que as etapas seguintes partam do mesmo estado
+            transaction.set_rollback(True)
+        seconds = time.perf_counter() - started_at
+
+        rows = stages['read'].rows
+        return {
+            'seconds': round(seconds, 4),
+            'rows': rows,
+            'rows_per_second': round(rows / seconds, 1) if seconds else None,
+            'queries': sum(stage.queries for stage in stages.values()),
+            'db_seconds': round(sum(stage.db_seconds for stage in stages.values()), 4),
+            'peak_rss_mb': peak_rss_mb(),
+            'created': command.companies_created,
+            'updated': command.companies_updated,
+            'unchanged': command.companies_unchanged,
+            'stages': {name: stage.as_dict() for name, stage in stages.items()},
+        }
+
+    def benchmark_populate_companies(self, archive, engine):
+        """
+        Mede o comando completo, como seria executado em produção (sem --resume). O cache
+        colunar fica numa pasta vazia a cada execução: todas leem o CSV (e gravam o cache),
+        como a primeira importação de um arquivo, e os números se comparam entre si.
+        """
+        stats = StageStats()
+        output = io.StringIO()
+        reset_peak_rss()
+        with tempfile.TemporaryDirectory() as cache_dir, override_settings(RECEITA_CACHE_DIR=cache_dir):
+            with stats.measure():
+                call_command('populate_companies', archive, engine=engine, stdout=output, stderr=output)
+        stats.rows = self._count_rows(archive)
+        return {**stats.as_dict(), 'peak_rss_mb': peak_rss_mb()}
+
+    def _count_rows(self, archive):
+        with zipfile.ZipFile(archive) as zf, zf.open(find_csv_member(zf)) as csv_file:
+            return sum(1 for _ in csv_file)
@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from data_importer.cache import DATASET_COMPANIES, bump_dataset_version
+from data_importer.snapshot import CompanySnapshot
+
+
+class Command(BaseCommand):
+    help = (
+        'Administra os snapshots da tabela de empresas criados por populate_companies --snapshot: '
+        'mostra as tabelas existentes, volta para a base anterior ou remove-a.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'action',
+            choices=['status', 'rollback', 'drop-previous'],
+            help="'status': linhas estimadas de cada tabela; 'rollback': troca a base em uso pela anterior "
+                 "(rodar de novo desfaz); 'drop-previous': remove a base anterior e libera o espaço."
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError(f'Os snapshots de empresas requerem PostgreSQL (banco atual: {connection.vendor}).')
+        snapshot = CompanySnapshot()
+
+        if options['action'] == 'rollback':
+            try:
+                snapshot.rollback()
+            except ValueError as e:
+                raise CommandError(str(e))
+            # As páginas em cache são da base que acabou de sair
+            bump_dataset_version(DATASET_COMPANIES)
+            self.stdout.write(self.style.SUCCESS(
+                f'Base anterior restaurada. A que estava em uso ficou em {snapshot.previous_table}.'
+            ))
+        elif options['action'] == 'drop-previous':
+            snapshot.drop_previous()
+            self.stdout.write(self.style.SUCCESS(f'{snapshot.previous_table} removida.'))
+
+        for table, rows in snapshot.row_estimates().items():
+            if rows is None:
+                status = 'não existe'
+            elif rows < 0:
+                status = 'sem estatísticas (ainda não passou por ANALYZE)'
+            else:
+                status = f'~{rows} linhas'
+            self.stdout.write(f'{table}: {status}')
@@ -0,0 +1,74 @@
+import os
+import time
+import itertools
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from data_importer.models import Company
+from data_importer.synthetic import generate_empresas_zip
+
+
+class Command(BaseCommand):
+    help = 'Gera um arquivo Empresas.zip sintético (no formato da Receita Federal) para testes de desempenho.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'output',
+            nargs='?',
+            default=os.path.join(settings.BASE_DIR.parent, 'data', 'EmpresasSintetico.zip'),
+            help="Caminho do .zip a ser gerado."
+        )
+        parser.add_argument('--rows', type=int, default=1_000_000, help="Quantidade de linhas do arquivo.")
+        parser.add_argument(
+            '--collide-fraction',
+            type=float,
+            default=0.0,
+            help="Fração das linhas (0 a 1) que reutiliza CNPJs já existentes na base, com outros dados."
+        )
+        parser.add_argument('--seed', type=int, default=0, help="Semente do gerador (mesma semente, mesmo arquivo).")
+        parser.add_argument('--chunk-size', type=int, default=100000, help="Linhas geradas e gravadas por bloco.")
+
+    def handle(self, *args, **options):
+        if options['rows'] < 1:
+            raise CommandError('--rows precisa ser maior que zero.')
+        if not 0 <= options['collide_fraction'] <= 1:
+            raise CommandError('--collide-fraction precisa estar entre 0 e 1.')
+
+        existing = np.array([], dtype=np.int64)
+        if options['collide_fraction'] > 0 or Company.objects.exists():
+            # Os CNPJs da base são usados para as colisões e para que os novos não colidam por acaso
+            existing = self.existing_cnpjs()
+
+        os.makedirs(os.path.dirname(os.path.abspath(options['output'])), exist_ok=True)
+        self.stdout.write(f"Gerando {options['rows']} linhas em {options['output']}...")
+        started_at = time.perf_counter()
+        stats = generate_empresas_zip(
+            options['output'],
+            options['rows'],
+            existing_cnpjs=existing,
+            collide_fraction=options['collide_fraction'],
+            seed=options['seed'],
+            chunk_size=max(1, options['chunk_size']),
+        )
+        if stats['colliding'] < round(options['rows'] * options['collide_fraction']):
+            self.stdout.write(self.style.WARNING(
+                f"A base tem apenas {len(existing)} CNPJs: {stats['colliding']} linhas colidem com dados existentes."
+            ))
+        self.stdout.write(self.style.SUCCESS(
+            f"Arquivo gerado em {time.perf_counter() - started_at:.1f}s: {stats['rows']} linhas "
+            f"({stats['colliding']} com CNPJs existentes), {stats['bytes'] / 2**20:.1f} MiB."
+        ))
+
+    def existing_cnpjs(self, batch_size=100000):
+        """
+        CNPJs da base como int64, convertidos em lotes como em CnpjMembership.from_database:
+        só um lote de textos fica na memória por vez (8 bytes por CNPJ no resultado).
+        """
+        cnpjs = Company.objects.order_by().values_list('cnpj', flat=True).iterator(chunk_size=batch_size)
+        batches = [np.array([], dtype=np.int64)]
+        while batch := list(itertools.islice(cnpjs, batch_size)):
+            numbers = pd.to_numeric(pd.Series(batch, dtype=object), errors='coerce').dropna()
+            batches.append(numbers.to_numpy(dtype=np.int64))
+        return np.concatenate(batches)
@@ -1,10 +1,12 @@
 import logging
 from django.core.management.base import BaseCommand
 from django.db import transaction
+from django.utils import timezone
 
 from data_importer.models import Region, State, Municipality, District
 from data_importer.services import IBGEApiClient
-from data_importer.schemas import FullDistrictSchema 
+from data_importer.cache import DATASET_IBGE, bump_dataset_version
+from data_importer.telemetry import add_timings, emit_event, record_import_run, rounded, timed
 
 logger = logging.getLogger(__name__)
 
@@ -14,72 +16,127 @@ class Command(BaseCommand):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.client = IBGEApiClient()
-        self.regions_created = set()
-        self.states_created = set()
-        self.municipalities_created = set()
-        self.districts_created = set()
 
     @transaction.atomic
     def handle(self, *args, **options):
+        started_at = timezone.now()
         self.stdout.write(self.style.SUCCESS('>>> Iniciando importador otimizado...'))
         
         self.stdout.write('Buscando todos os distritos da API do IBGE... (Pode levar um momento)')
-        districts_data = self.client.get_districts()
-        
-        if not districts_data:
-            self.stdout.write(self.style.ERROR('Nenhum dado recebido da API. Abortando.'))
-            return
-            
+
+        # Os distritos chegam por um gerador: o JSON é lido e validado em lotes
+        stage_seconds = {}
         try:
-            validated_districts = [FullDistrictSchema.model_validate(d) for d in districts_data]
-        except Exception as e:
-            logger.error(f"Erro de validação Pydantic: {e}")
+            with timed(stage_seconds, 'fetch'):
+                total, levels = self._collect(self.client.iter_districts())
+        except ValueError as e:
+            logger.error(f"Erro de validação dos dados do IBGE: {e}")
             self.stdout.write(self.style.ERROR('Os dados recebidos da API não estão no formato esperado. Abortando.'))
+            record_import_run('importer', started_at, success=False, stage_seconds=stage_seconds)
+            return
+        emit_event('stage', command='importer', stage='fetch', rows=total, timings=rounded(stage_seconds))
+
+        if not total:
+            self.stdout.write(self.style.ERROR('Nenhum dado recebido da API. Abortando.'))
+            record_import_run('importer', started_at, success=False, stage_seconds=stage_seconds)
             return
 
-        self.stdout.write(f'{len(validated_districts)} distritos encontrados. Processando e salvando no banco de dados...')
+        self.stdout.write(f'{total} distritos encontrados. Salvando no banco de dados...')
+
+        # Um upsert por nível, dos pais para os filhos (por causa das chaves estrangeiras)
+        regions, states, municipalities, districts = levels
+        counts = {}
+        for level, model, objects, fields in [
+            ('regions', Region, regions, ['name', 'acronym']),
+            ('states', State, states, ['name', 'acronym', 'region']),
+            ('municipalities', Municipality, municipalities, ['name', 'state']),
+            ('districts', District, districts, ['name', 'municipality']),
+        ]:
+            timings = {}
+            created, updated = self._upsert(model, objects, fields, timings=timings)
+            counts[level] = (created, updated)
+            emit_event(
+                'stage', command='importer', stage=level, rows=len(objects), created=created, updated=updated,
+                unchanged=len(objects) - created - updated, timings=rounded(timings),
+            )
+            add_timings(stage_seconds, {f'{level}_{step}': seconds for step, seconds in timings.items()})
+
+        self.stdout.write(self.style.SUCCESS('--- Resumo da Importação ---'))
+        self.stdout.write(f"{counts['regions'][0]} novas regiões criadas, {counts['regions'][1]} atualizadas.")
+        self.stdout.write(f"{counts['states'][0]} novos estados criados, {counts['states'][1]} atualizados.")
+        self.stdout.write(f"{counts['municipalities'][0]} novos municípios criados, {counts['municipalities'][1]} atualizados.")
+        self.stdout.write(f"{counts['districts'][0]} novos distritos criados, {counts['districts'][1]} atualizados.")
+        # Invalida o cache das páginas de localidades
+        bump_dataset_version(DATASET_IBGE)
+
+        created = sum(level_created for level_created, _ in counts.values())
+        updated = sum(level_updated for _, level_updated in counts.values())
+        objects_total = sum(len(objects) for objects in levels)
+        record_import_run(
+            'importer', started_at, success=True, rows=total, created=created, updated=updated,
+            unchanged=objects_total - created - updated, stage_seconds=stage_seconds,
+        )
+        self.stdout.write(self.style.SUCCESS('>>> Importação otimizada concluída com sucesso!'))
+
+    def _collect(self, validated_districts):
+        """
+        Remove as repetições da resposta da API: cada distrito traz o município, o estado
+        e a região completos. Retorna o total de distritos lidos e um dicionário
+        {id: instância} por nível. Os objetos pydantic são descartados à medida que chegam.
+        """
+        regions, states, municipalities, districts = {}, {}, {}, {}
+        total = 0
 
         for district_item in validated_districts:
+            total += 1
             municipality_item = district_item.municipio
 
-            # ADICIONE ESTA VERIFICAÇÃO DE SEGURANÇA AQUI
             if not municipality_item.microrregiao:
                 logger.warning(f"Município '{municipality_item.nome}' (ID: {municipality_item.id}) veio sem microrregião. Pulando distrito '{district_item.nome}'.")
-                continue # Pula para o próximo distrito da lista
+                continue
 
-            microrregiao_item = municipality_item.microrregiao
-            mesorregiao_item = microrregiao_item.mesorregiao
-            mesorregiao_item = microrregiao_item.mesorregiao
-            state_item = mesorregiao_item.UF
+            state_item = municipality_item.microrregiao.mesorregiao.UF
             region_item = state_item.regiao
 
-            region, created = Region.objects.get_or_create(
-                id=region_item.id,
-                defaults={'name': region_item.nome, 'acronym': region_item.sigla}
+            regions[region_item.id] = Region(id=region_item.id, name=region_item.nome, acronym=region_item.sigla)
+            states[state_item.id] = State(
+                id=state_item.id, name=state_item.nome, acronym=state_item.sigla, region_id=region_item.id
             )
-            if created: self.regions_created.add(region.id)
-
-            state, created = State.objects.get_or_create(
-                id=state_item.id,
-                defaults={'name': state_item.nome, 'acronym': state_item.sigla, 'region': region}
+            municipalities[municipality_item.id] = Municipality(
+                id=municipality_item.id, name=municipality_item.nome, state_id=state_item.id
             )
-            if created: self.states_created.add(state.id)
-
-            municipality, created = Municipality.objects.get_or_create(
-                id=municipality_item.id,
-                defaults={'name': municipality_item.nome, 'state': state}
+            districts[district_item.id] = District(
+                id=district_item.id, name=district_item.nome, municipality_id=municipality_item.id
             )
-            if created: self.municipalities_created.add(municipality.id)
 
-            district, created = District.objects.get_or_create(
-                id=district_item.id,
-                defaults={'name': district_item.nome, 'municipality': municipality}
-            )
-            if created: self.districts_created.add(district.id)
+        return total, (regions, states, municipalities, districts)
 
-        self.stdout.write(self.style.SUCCESS('--- Resumo da Importação ---'))
-        self.stdout.write(f'{len(self.regions_created)} novas regiões criadas.')
-        self.stdout.write(f'{len(self.states_created)} novos estados criados.')
-        self.stdout.write(f'{len(self.municipalities_created)} novos municípios criados.')
-        self.stdout.write(f'{len(self.districts_created)} novos distritos criados.')
-        self.stdout.write(self.style.SUCCESS('>>> Importação otimizada concluída com sucesso!'))
\ No newline at end of file
+    def _upsert(self, model, objects, fields, timings=None):
+        """
+        Grava as instâncias novas ou alteradas de um nível num único INSERT ... ON CONFLICT DO UPDATE.
+
+        As tabelas do IBGE são pequenas (alguns milhares de linhas): uma leitura dos valores
+        atuais permite separar criados, atualizados e inalterados, e os inalterados nem são enviados.
+        Retorna (criados, atualizados) e soma em `timings` os segundos de 'lookup' e 'upsert'.
+        """
+        attnames = [model._meta.get_field(field).attname for field in fields]
+        with timed(timings, 'lookup'):
+            current = {row[0]: row[1:] for row in model.objects.order_by().values_list('pk', *attnames)}
+
+            created, changed = [], []
+            for pk, obj in objects.items():
+                values = tuple(getattr(obj, attname) for attname in attnames)
+                if pk not in current:
+                    created.append(obj)
+                elif current[pk] != values:
+                    changed.append(obj)
+
+        if created or changed:
+            with timed(timings, 'upsert'):
+                model.objects.bulk_create(
+                    created + changed,
+                    update_conflicts=True,
+                    unique_fields=['id'],
+                    update_fields=fields,
+                )
+        return len(created), len(changed)
@@ -0,0 +1,146 @@
+import os
+import time
+import platform
+import itertools
+import statistics
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode, urlsplit
+import requests
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY, get_user_model
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from data_importer.benchmark import append_result, git_commit
+
+
+class Command(BaseCommand):
+    help = (
+        'Teste de carga das listagens: dispara requisições concorrentes contra um servidor já em execução '
+        '(ex.: gunicorn com core.wsgi ou uvicorn com core.asgi) e acrescenta p50/p99 e a vazão a um arquivo '
+        'JSON, para comparar as implantações.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('urls', nargs='+', help="URLs requisitadas em rodízio (ex.: http://127.0.0.1:8000/app/companies/?razao_social=AGRO).")
+        parser.add_argument('--requests', type=int, default=500, help="Total de requisições medidas.")
+        parser.add_argument('--concurrency', type=int, default=20, help="Requisições simultâneas.")
+        parser.add_argument('--warmup', type=int, default=10, help="Requisições iniciais, fora da medição.")
+        parser.add_argument('--timeout', type=float, default=30.0, help="Tempo máximo de cada requisição (segundos).")
+        parser.add_argument(
+            '--user',
+            help="Usuário em nome do qual as requisições são feitas; a sessão é criada direto na base "
+                 "(o servidor precisa usar a mesma base e o mesmo SECRET_KEY)."
+        )
+        parser.add_argument(
+            '--bust-cache',
+            action='store_true',
+            help="Acrescenta um parâmetro único a cada requisição, para medir a view e não o cache de páginas."
+        )
+        parser.add_argument(
+            '--output',
+            default=os.path.join(settings.BASE_DIR, 'benchmark_results.json'),
+            help="Arquivo JSON onde os resultados são acumulados."
+        )
+        parser.add_argument('--label', default='', help="Descrição livre desta execução (ex.: 'wsgi, 4 workers').")
+
+    def handle(self, *args, **options):
+        if options['requests'] < 2 or options['concurrency'] < 1:
+            raise CommandError('Use --requests >= 2 e --concurrency >= 1.')
+        self.timeout = options['timeout']
+        self.bust_cache = options['bust_cache']
+        self.cookies = self._session_cookies(options['user']) if options['user'] else {}
+        self._local = threading.local()
+        self._counter = itertools.count()
+        self._counter_lock = threading.Lock()
+
+        urls = options['urls']
+        self.stdout.write(f"Aquecendo com {options['warmup']} requisições...")
+        self._run(urls, options['warmup'], options['concurrency'])
+
+        self.stdout.write(f"Medindo {options['requests']} requisições com concorrência {options['concurrency']}...")
+        started_at = time.perf_counter()
+        results = self._run(urls, options['requests'], options['concurrency'])
+        seconds = time.perf_counter() - started_at
+
+        run = {
+            'timestamp': timezone.now().isoformat(),
+            'commit': git_commit(),
+            'label': options['label'],
+            'benchmark': 'loadtest',
+            'python': platform.python_version(),
+            'urls': urls,
+            'requests': len(results),
+            'concurrency': options['concurrency'],
+            'bust_cache': self.bust_cache,
+            'seconds': round(seconds, 4),
+            'requests_per_second': round(len(results) / seconds, 1),
+            'latency_ms': latency_summary([elapsed for _, elapsed in results]),
+            'status': dict(sorted(Counter(str(status) for status, _ in results).items())),
+        }
+        append_result(options['output'], run)
+
+        latency = run['latency_ms']
+        errors = sum(count for status, count in run['status'].items() if not status.startswith(('2', '3')))
+        self.stdout.write(
+            f"{run['requests']} requisições em {seconds:.2f}s ({run['requests_per_second']} req/s): "
+            f"p50 {latency['p50']} ms, p90 {latency['p90']} ms, p99 {latency['p99']} ms, máx. {latency['max']} ms."
+        )
+        if errors:
+            self.stdout.write(self.style.WARNING(f"{errors} requisições falharam: {run['status']}"))
+        self.stdout.write(self.style.SUCCESS(f"Resultado acrescentado a {options['output']}."))
+
+    def _run(self, urls, total, concurrency):
+        if total <= 0:
+            return []
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            return list(executor.map(lambda i: self._request(urls[i % len(urls)]), range(total)))
+
+    def _request(self, url):
+        """Faz uma requisição e devolve (status, segundos); erros de conexão contam como status 'error'."""
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            # Uma sessão HTTP por thread: conexões keep-alive, como um cliente real
+            session = self._local.session = requests.Session()
+            session.cookies.update(self.cookies)
+        if self.bust_cache:
+            with self._counter_lock:
+                number = next(self._counter)
+            url += ('&' if urlsplit(url).query else '?') + urlencode({'_loadtest': number})
+
+        started_at = time.perf_counter()
+        try:
+            response = session.get(url, timeout=self.timeout, allow_redirects=False)
+            response.content  # mede até o último byte
+            status = response.status_code
+        except requests.RequestException:
+            status = 'error'
+        return status, time.perf_counter() - started_at
+
+    def _session_cookies(self, username):
+        """Cria uma sessão autenticada para `username`, como faria o login, e devolve o cookie."""
+        try:
+            user = get_user_model().objects.get(username=username)
+        except get_user_model().DoesNotExist:
+            raise CommandError(f'Usuário {username} não encontrado.')
+        session = SessionStore()
+        session[SESSION_KEY] = str(user.pk)
+        session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+        session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        session.create()
+        return {settings.SESSION_COOKIE_NAME: session.session_key}
+
+
+def latency_summary(seconds):
+    """Percentis (método 'inclusive' do statistics.quantiles), média e máximo em milissegundos."""
+    cuts = statistics.quantiles(seconds, n=100, method='inclusive')
+    return {
+        'p50': round(cuts[49] * 1000, 2),
+        'p90': round(cuts[89] * 1000, 2),
+        'p99': round(cuts[98] * 1000, 2),
+        'mean': round(statistics.fmean(seconds) * 1000, 2),
+        'max': round(max(seconds) * 1000, 2),
+    }
@@ -1,132 +1,694 @@
 import os
-import requests
+import glob
+import time
+import django
 import zipfile
+import argparse
+import itertools
+import threading
 import logging
+import numpy as np
 import pandas as pd
-from decimal import Decimal
-from django.core.management.base import BaseCommand
-from django.db import transaction
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
+from urllib.parse import urlparse
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, transaction
 from django.conf import settings
-from tqdm import tqdm
+from django.utils import timezone
 
-from data_importer.models import Company
+from data_importer.bitmap import CnpjBitmap, CnpjMembership
+from data_importer.cache import DATASET_COMPANIES, bump_dataset_version
+from data_importer.download import DEFAULT_CONNECTIONS, DownloadError, RangeDownloader
+from data_importer.loaders import ENGINES, OrmCompanyLoader, SnapshotCompanyLoader, get_loader
+from data_importer.models import Company, ImportCheckpoint
+from data_importer.parquet_cache import ArchiveCache
+from data_importer.pipeline import ChunkPipeline
+from data_importer.snapshot import CompanySnapshot
+from data_importer.telemetry import add_timings, emit_event, record_import_run, rounded, timed
+from data_importer.receita import (
+    COLUMN_NAMES, NULLABLE_COLUMNS, REQUIRED_TEXT_COLUMNS, DEFAULT_CHUNK_SIZE, PARSE_MODES, chunk_size_for_budget,
+    compute_row_hashes, file_sha256, find_csv_member, read_csv_chunks
+)
 
 logger = logging.getLogger(__name__)
 
-# Nomes das colunas baseados no documento de metadados da Receita Federal
-COLUMN_NAMES = [
-    'cnpj', 'razao_social', 'natureza_juridica', 'qualificacao_responsavel',
-    'capital_social', 'porte_empresa', 'ente_federativo_responsavel'
-]
+# Cópias de colunas feitas por normalize_chunk, por linha (medido com tracemalloc num chunk de 50 mil linhas)
+TRANSFORM_BYTES_PER_ROW = 300
 
 class Command(BaseCommand):
     help = 'Baixa, descompacta e popula o banco de dados com dados de empresas da Receita Federal.'
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # O ORM é o padrão (e o fallback fora do PostgreSQL)
+        self.loader = OrmCompanyLoader()
+        self.chunk_size = DEFAULT_CHUNK_SIZE
+        self.parse_mode = 'text'
+        self.arrow_strings = False
+        # Com um orçamento (MB), o chunk_size é calculado para cada arquivo
+        self.memory_budget_mb = None
+        self.commit_every = 1
+        self.resume = False
+        # No modo --snapshot os checkpoints ficam só na memória (ver _get_checkpoint)
+        self.save_checkpoints = True
+        self.track_seen = False
+        self.pipeline = False
+        self.queue_depth = 2
+        self.writers = 1
+        self._counters_lock = threading.Lock()
+        self.companies_created = 0
+        self.companies_updated = 0
+        self.companies_unchanged = 0
+        # Segundos por etapa (read, transform, lookup, insert, update...) do arquivo atual
+        self.stage_seconds = {}
+        # Segundos das etapas fora dos arquivos (bitmap de CNPJs; índices e troca do --snapshot)
+        self.run_seconds = {}
+        self.archive_name = None
+        # Cache Parquet dos arquivos já lidos (ver configure)
+        self.archive_cache = None
+        # CNPJs lidos no arquivo atual (para detectar empresas removidas da base da Receita)
+        self.seen_cnpjs = []
+
     def add_arguments(self, parser):
-        parser.add_argument('url', type=str, help="A URL para o arquivo .zip de empresas.")
+        parser.add_argument(
+            'sources',
+            nargs='+',
+            type=str,
+            help="URLs, caminhos ou padrões glob (ex.: 'data/Empresas*.zip') dos arquivos .zip de empresas."
+        )
+        parser.add_argument(
+            '--engine',
+            choices=ENGINES,
+            default='orm',
+            help="Forma de gravação: 'orm' (bulk_create/bulk_update) ou 'copy' (COPY FROM STDIN + upsert, apenas PostgreSQL)."
+        )
+        parser.add_argument(
+            '--connections',
+            type=int,
+            default=DEFAULT_CONNECTIONS,
+            help="Conexões simultâneas (requisições HTTP Range) no download de cada URL."
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help="Número de processos que importam arquivos em paralelo (um arquivo por processo)."
+        )
+        parser.add_argument(
+            '--commit-every',
+            type=int,
+            default=1,
+            help="Quantidade de chunks gravados por transação (o checkpoint é salvo a cada commit)."
+        )
+        parser.add_argument(
+            '--resume',
+            action='store_true',
+            help="Continua cada arquivo a partir do último chunk confirmado (e pula os já concluídos)."
+        )
+        parser.add_argument(
+            '--missing',
+            choices=['ignore', 'report', 'delete'],
+            default='ignore',
+            help="O que fazer com CNPJs da base que não aparecem em nenhum arquivo importado "
+                 "(use 'report' ou 'delete' apenas ao importar a base completa)."
+        )
+        parser.add_argument(
+            '--cnpj-bitmap',
+            action=argparse.BooleanOptionalAction,
+            default=True,
+            help="Engine 'orm': lê uma vez os CNPJs da base para um bitmap em memória (12,5 MB) e só consulta "
+                 "os hashes dos CNPJs que já existem (use --no-cnpj-bitmap para consultar todos os do chunk)."
+        )
+        parser.add_argument(
+            '--snapshot',
+            action='store_true',
+            help="Carrega a base completa numa tabela sombra (índices criados depois da carga) e troca-a "
+                 "pela tabela em uso numa transação curta, guardando a anterior para rollback (apenas PostgreSQL)."
+        )
+        parser.add_argument(
+            '--parse',
+            choices=PARSE_MODES,
+            default='text',
+            help="Leitura do CSV: 'text' (tudo como str) ou 'typed' (colunas de baixa cardinalidade como "
+                 "category e capital social numérico, bem menos memória por linha)."
+        )
+        parser.add_argument(
+            '--arrow-strings',
+            action='store_true',
+            help="Guarda os textos do CSV em buffers do Arrow (string[pyarrow]) em vez de objetos Python."
+        )
+        parser.add_argument(
+            '--memory-budget',
+            type=int,
+            help="Memória (MB, por processo) para os chunks em processamento; o tamanho do chunk é "
+                 "calculado a partir de uma amostra de cada arquivo."
+        )
+        parser.add_argument(
+            '--pipeline',
+            action='store_true',
+            help="Lê, transforma e grava os chunks em threads separadas, ligadas por filas limitadas."
+        )
+        parser.add_argument(
+            '--queue-depth',
+            type=int,
+            default=2,
+            help="Chunks que cada fila do pipeline pode acumular (limita o uso de memória)."
+        )
+        parser.add_argument(
+            '--writers',
+            type=int,
+            default=1,
+            help="Threads que gravam chunks no banco em paralelo no modo --pipeline. Só vale para os engines "
+                 "'copy' e --snapshot: no 'orm', dois gravadores podem criar o mesmo CNPJ ao mesmo tempo "
+                 "(violando a chave primária), então ele usa sempre 1."
+        )
 
-    @transaction.atomic
     def handle(self, *args, **options):
-        url = options['url']
+        started_at = timezone.now()
+        if options['snapshot']:
+            self._check_snapshot_options(options)
+        archives = self._resolve_sources(options['sources'], options['connections'])
+        if not archives:
+            raise CommandError('Nenhum arquivo .zip encontrado para as fontes informadas.')
+
+        snapshot = None
+        if options['snapshot']:
+            snapshot = CompanySnapshot()
+            snapshot.prepare()
+            self.stdout.write(f'Modo snapshot: carregando na tabela {snapshot.shadow_table}.')
+
+        workers = max(1, min(options['workers'], len(archives)))
+        if workers > 1 and connection.vendor == 'sqlite':
+            # O SQLite aceita um único escritor por vez; os processos só iriam disputar o lock
+            self.stdout.write(self.style.WARNING('SQLite não suporta escrita concorrente. Usando 1 processo.'))
+            workers = 1
+        self.stdout.write(self.style.SUCCESS(f'>>> {len(archives)} arquivo(s) para importar com {workers} processo(s).'))
+
+        if workers > 1:
+            results = self._import_in_pool(archives, workers, options)
+        else:
+            self.configure(options)
+            results = [self._safe_import(path, self.import_archive, path) for path in archives]
+
+        try:
+            self._write_summary(results)
+            if snapshot is not None:
+                self._publish_snapshot(snapshot)
+            if options['missing'] != 'ignore':
+                self._handle_missing(results, delete=options['missing'] == 'delete')
+        finally:
+            if snapshot is not None:
+                # Sem troca (algum arquivo falhou), a tabela em uso fica intacta e a sombra é descartada
+                snapshot.discard()
+            # Mesmo com falhas parciais, chunks já confirmados mudaram a base: invalida o cache das páginas
+            bump_dataset_version(DATASET_COMPANIES)
+            self._record_run(started_at, results)
+
+    def configure(self, options, known_cnpjs=None):
+        """
+        Aplica as opções da linha de comando (também usado pelos processos do pool, que recebem
+        em `known_cnpjs` o bitmap de CNPJs montado uma vez pelo processo principal).
+        """
+        self.loader = get_loader(options['engine'])
+        if options.get('snapshot'):
+            self.loader = SnapshotCompanyLoader(CompanySnapshot().shadow_table)
+        if self.loader.name == 'orm' and options.get('cnpj_bitmap'):
+            if known_cnpjs is not None:
+                self.loader.membership = CnpjMembership(known=known_cnpjs)
+            else:
+                self.loader.membership = self._load_membership()
+        self.parse_mode = options.get('parse', 'text')
+        self.arrow_strings = options.get('arrow_strings', False)
+        self.memory_budget_mb = options.get('memory_budget')
+        if settings.RECEITA_CACHE_DIR:
+            max_bytes = settings.RECEITA_CACHE_MAX_MB * 2**20 if settings.RECEITA_CACHE_MAX_MB else None
+            self.archive_cache = ArchiveCache(
+                settings.RECEITA_CACHE_DIR, self.parse_mode, self.arrow_strings, max_bytes=max_bytes
+            )
+        self.commit_every = max(1, options['commit_every'])
+        self.resume = options['resume']
+        self.save_checkpoints = not options.get('snapshot')
+        self.track_seen = options['missing'] != 'ignore'
+        self.pipeline = options['pipeline']
+        self.queue_depth = max(1, options['queue_depth'])
+        self.writers = max(1, options['writers'])
+        if self.pipeline and self.writers > 1 and self.loader.name == 'orm':
+            # Cada gravador decide sozinho quais CNPJs são novos: dois chunks com o mesmo CNPJ
+            # gravados ao mesmo tempo tentariam criá-lo duas vezes
+            self.stdout.write(self.style.WARNING("O engine 'orm' grava com uma única thread. Usando --writers=1."))
+            self.writers = 1
+        if self.pipeline and self.writers > 1 and connection.vendor == 'sqlite':
+            # O SQLite aceita um único escritor por vez
+            self.writers = 1
+
+    def _check_snapshot_options(self, options):
+        if connection.vendor != 'postgresql':
+            raise CommandError(f'--snapshot requer PostgreSQL (banco atual: {connection.vendor}).')
+        if options['resume']:
+            raise CommandError('--snapshot recarrega a base do zero e não pode ser combinado com --resume.')
+        if options['missing'] != 'ignore':
+            raise CommandError('--snapshot já descarta as empresas ausentes dos arquivos; não use --missing.')
+
+    def _load_membership(self):
+        """Monta o bitmap com os CNPJs já gravados (ver bitmap.CnpjMembership)."""
+        with timed(self.run_seconds, 'cnpj_bitmap'):
+            membership = CnpjMembership.from_database()
+        cnpjs = len(membership.known)
+        emit_event('cnpj_bitmap_loaded', command='populate_companies', cnpjs=cnpjs,
+                   seconds=round(self.run_seconds['cnpj_bitmap'], 4))
+        self.stdout.write(f"Bitmap de CNPJs: {cnpjs} CNPJs da base lidos em {self.run_seconds['cnpj_bitmap']:.1f}s.")
+        return membership
+
+    def _repeated_cnpjs(self):
+        membership = getattr(self.loader, 'membership', None)
+        return membership.repeated if membership is not None else 0
+
+    def _publish_snapshot(self, snapshot):
+        """Cria os índices da sombra, faz o ANALYZE e troca-a pela tabela em uso."""
+        self.stdout.write('Criando a chave primária e os índices da nova tabela de empresas...')
+        with timed(self.run_seconds, 'snapshot_index'):
+            removed = snapshot.finish()
+        if removed:
+            self.stdout.write(self.style.WARNING(f'{removed} linhas com CNPJ repetido foram descartadas.'))
+        with timed(self.run_seconds, 'snapshot_swap'):
+            snapshot.swap()
+        emit_event('snapshot_swapped', command='populate_companies', duplicates=removed, **rounded(self.run_seconds))
+        self.stdout.write(self.style.SUCCESS(
+            f'Nova base de empresas publicada em {self.run_seconds["snapshot_swap"]:.2f}s. A anterior ficou em '
+            f'{snapshot.previous_table} (para voltar: python manage.py company_snapshot rollback).'
+        ))
+
+    def _resolve_sources(self, sources, connections=DEFAULT_CONNECTIONS):
+        """Baixa as URLs para a pasta 'data' e expande os padrões glob locais."""
         # Define o caminho onde os dados serão salvos, dentro da pasta 'data'
         data_dir = os.path.join(settings.BASE_DIR.parent, 'data')
-        os.makedirs(data_dir, exist_ok=True) # Garante que a pasta 'data' exista
-        zip_file_path = os.path.join(data_dir, 'Empresas.zip')
+        archives = []
+        for source in sources:
+            if source.startswith(('http://', 'https://')):
+                os.makedirs(data_dir, exist_ok=True) # Garante que a pasta 'data' exista
+                path = os.path.join(data_dir, os.path.basename(urlparse(source).path) or 'Empresas.zip')
+                self._download_file(source, path, connections)
+                archives.append(path)
+            else:
+                archives.extend(sorted(glob.glob(source)))
+        # Remove duplicados mantendo a ordem
+        return list(dict.fromkeys(archives))
 
-        self._download_file(url, zip_file_path)
-        self._process_zip_file(zip_file_path)
+    def _import_in_pool(self, archives, workers, options):
+        known_cnpjs = None
+        # O pool só é usado no PostgreSQL, onde o engine pedido é o engine usado
+        if options['engine'] == 'orm' and options['cnpj_bitmap'] and not options['snapshot']:
+            # Lido uma vez aqui e copiado para cada processo, em vez de cada um varrer a tabela de empresas
+            known_cnpjs = self._load_membership().known.to_bytes()
+        # Cada processo abre a sua própria conexão; a conexão herdada não pode ser compartilhada
+        connections.close_all()
+        worker_options = {
+            key: options[key]
+            for key in (
+                'engine', 'commit_every', 'resume', 'missing', 'cnpj_bitmap', 'snapshot', 'parse', 'arrow_strings',
+                'memory_budget', 'pipeline', 'queue_depth', 'writers',
+            )
+        }
+        results = []
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(known_cnpjs,)) as pool:
+            futures = {pool.submit(_import_archive_worker, path, worker_options): path for path in archives}
+            for future in as_completed(futures):
+                results.append(self._safe_import(futures[future], future.result))
+        return results
 
-    def _download_file(self, url, path):
-        if os.path.exists(path):
-            self.stdout.write(self.style.SUCCESS(f'Arquivo {path} já existe. Pulando download.'))
+    def _safe_import(self, path, func, *args):
+        """Executa a importação de um arquivo sem deixar a falha de um interromper os demais."""
+        try:
+            return func(*args)
+        except Exception as e:
+            logger.error(f'Falha ao importar {path}: {e}')
+            self.stderr.write(self.style.ERROR(f'Falha ao importar {path}: {e}'))
+            return {'archive': os.path.basename(path), 'error': str(e)}
+
+    def _write_summary(self, results):
+        self.stdout.write(self.style.SUCCESS('--- Resumo da Importação ---'))
+        for result in sorted(results, key=lambda r: r['archive']):
+            if 'error' in result:
+                self.stdout.write(self.style.ERROR(f"{result['archive']}: FALHOU ({result['error']})"))
+                continue
+            self.stdout.write(
+                f"{result['archive']}: {result['rows']} linhas, {result['created']} criadas, "
+                f"{result['updated']} atualizadas, {result['unchanged']} inalteradas em {result['seconds']:.1f}s"
+            )
+            if result.get('repeated'):
+                self.stdout.write(self.style.WARNING(
+                    f"{result['archive']}: {result['repeated']} linhas com CNPJ já lido nesta execução (vale a última)."
+                ))
+
+        failed = [r for r in results if 'error' in r]
+        total_rows = sum(r['rows'] for r in results if 'error' not in r)
+        self.stdout.write(f'Total: {total_rows} linhas em {len(results) - len(failed)} arquivo(s).')
+        if failed:
+            raise CommandError(f'{len(failed)} arquivo(s) falharam na importação.')
+
+    def _record_run(self, started_at, results):
+        """Guarda os totais da execução (exibidos em /metrics) e emite o evento final."""
+        imported = [result for result in results if 'error' not in result]
+        stage_seconds = {}
+        for result in imported:
+            add_timings(stage_seconds, result['stage_seconds'])
+        add_timings(stage_seconds, self.run_seconds)
+        record_import_run(
+            'populate_companies',
+            started_at,
+            success=len(imported) == len(results),
+            rows=sum(result['rows'] for result in imported),
+            created=sum(result['created'] for result in imported),
+            updated=sum(result['updated'] for result in imported),
+            unchanged=sum(result['unchanged'] for result in imported),
+            stage_seconds=stage_seconds,
+        )
+
+    def _handle_missing(self, results, delete):
+        """Detecta (e opcionalmente remove) os CNPJs da base que não vieram em nenhum arquivo."""
+        if any(result['partial'] for result in results):
+            self.stdout.write(self.style.WARNING(
+                'Alguns arquivos foram retomados ou pulados; sem a leitura completa não é possível '
+                'detectar empresas removidas.'
+            ))
             return
-        
-        self.stdout.write(self.style.SUCCESS(f'Baixando arquivo de {url}...'))
+
+        seen = np.unique(np.concatenate([result['seen_cnpjs'] for result in results]))
+        missing_total = 0
+        for missing in self._iter_missing_cnpjs(seen):
+            missing_total += len(missing)
+            if delete:
+                Company.objects.filter(cnpj__in=missing).delete()
+
+        action = 'removidas' if delete else 'encontradas'
+        self.stdout.write(self.style.WARNING(f'{missing_total} empresas ausentes dos arquivos importados foram {action}.'))
+
+    def _iter_missing_cnpjs(self, seen, batch_size=10000):
+        """Percorre os CNPJs da base com um cursor e gera, em lotes, os que não estão em `seen`."""
+        cnpjs = Company.objects.order_by().values_list('cnpj', flat=True).iterator(chunk_size=batch_size)
+        while batch := list(itertools.islice(cnpjs, batch_size)):
+            numbers = pd.to_numeric(pd.Series(batch), errors='coerce').to_numpy()
+            # CNPJs não numéricos nunca vêm da Receita, então também são considerados ausentes
+            is_missing = ~np.isin(numbers, seen)
+            if is_missing.any():
+                yield [cnpj for cnpj, flag in zip(batch, is_missing) if flag]
+
+    def import_archive(self, zip_file_path):
+        """Importa um arquivo .zip (com commits por chunk) e retorna o resumo da importação."""
+        self.companies_created = 0
+        self.companies_updated = 0
+        self.companies_unchanged = 0
+        self.stage_seconds = {}
+        self.archive_name = os.path.basename(zip_file_path)
+        self.seen_cnpjs = []
+        repeated_before = self._repeated_cnpjs()
+        started_at = time.perf_counter()
+        rows, partial = self._process_zip_file(zip_file_path)
+        result = {
+            'archive': os.path.basename(zip_file_path),
+            'rows': rows,
+            'created': self.companies_created,
+            'updated': self.companies_updated,
+            'unchanged': self.companies_unchanged,
+            # Linhas cujo CNPJ já tinha aparecido nesta execução (só com o bitmap de CNPJs)
+            'repeated': self._repeated_cnpjs() - repeated_before,
+            'seconds': time.perf_counter() - started_at,
+            # Retomado ou pulado: nem todas as linhas do arquivo foram lidas nesta execução
+            'partial': partial,
+            'stage_seconds': rounded(self.stage_seconds),
+        }
+        emit_event('archive_finished', command='populate_companies', engine=self.loader.name, **result)
+        if self.track_seen:
+            result['seen_cnpjs'] = np.unique(np.concatenate(self.seen_cnpjs)) if self.seen_cnpjs else np.array([], dtype=np.uint32)
+        return result
+
+    def _download_file(self, url, path, connections=DEFAULT_CONNECTIONS):
+        """Baixa (ou retoma) o arquivo em segmentos paralelos e só o aceita se o zip estiver íntegro."""
+        self.stdout.write(f'Verificando {url}...')
         try:
-            with requests.get(url, stream=True) as r:
-                r.raise_for_status()
-                total_size = int(r.headers.get('content-length', 0))
-                with open(path, 'wb') as f, tqdm(
-                    desc=path,
-                    total=total_size,
-                    unit='iB',
-                    unit_scale=True,
-                    unit_divisor=1024,
-                ) as bar:
-                    for chunk in r.iter_content(chunk_size=8192):
-                        size = f.write(chunk)
-                        bar.update(size)
-            self.stdout.write(self.style.SUCCESS('Download concluído.'))
-        except requests.RequestException as e:
+            status = RangeDownloader(connections=connections).download(url, path)
+        except DownloadError as e:
             self.stderr.write(self.style.ERROR(f'Falha no download: {e}'))
-            # Se o download falhar, remove o arquivo parcial
-            if os.path.exists(path):
-                os.remove(path)
-            raise e
+            # O arquivo parcial fica guardado: a próxima execução continua de onde parou
+            raise CommandError(f'Falha no download de {url}: {e}')
+        messages = {
+            'cached': f'Arquivo {path} já existe e confere com o servidor. Pulando download.',
+            'resumed': f'Download de {path} retomado e concluído.',
+            'downloaded': f'Download de {path} concluído.',
+        }
+        self.stdout.write(self.style.SUCCESS(messages[status]))
+
+    def _get_checkpoint(self, archive_name, archive_hash):
+        """Retorna o checkpoint do arquivo, descartando-o se não for para retomar ou se o arquivo mudou."""
+        if not self.save_checkpoints:
+            # Os dados vão para a tabela sombra: um checkpoint gravado diria que a tabela em uso recebeu
+            # o arquivo, e um --resume depois de uma troca que não aconteceu pularia arquivos que não estão nela
+            return ImportCheckpoint(archive=archive_name, archive_hash=archive_hash)
+        checkpoint, created = ImportCheckpoint.objects.get_or_create(
+            archive=archive_name, defaults={'archive_hash': archive_hash}
+        )
+        if created:
+            return checkpoint
+        if self.resume and checkpoint.archive_hash != archive_hash:
+            self.stdout.write(self.style.WARNING(f'{archive_name} mudou desde o último checkpoint. Recomeçando do início.'))
+        if not self.resume or checkpoint.archive_hash != archive_hash:
+            checkpoint.archive_hash = archive_hash
+            checkpoint.byte_offset = 0
+            checkpoint.rows_processed = 0
+            checkpoint.chunks_processed = 0
+            checkpoint.completed = False
+            checkpoint.save()
+        return checkpoint
+
+    def _save_checkpoint(self, checkpoint, fields):
+        if self.save_checkpoints:
+            checkpoint.save(update_fields=[*fields, 'updated_at'])
 
     def _process_zip_file(self, zip_file_path):
         self.stdout.write(self.style.SUCCESS(f'Processando arquivo zip: {zip_file_path}'))
-        chunk_size = 50000
-        total_rows_processed = 0
+        archive_name = os.path.basename(zip_file_path)
+        archive_hash = file_sha256(zip_file_path)
+        checkpoint = self._get_checkpoint(archive_name, archive_hash)
+        if checkpoint.completed:
+            self.stdout.write(self.style.SUCCESS(f'{archive_name} já foi importado por completo. Pulando.'))
+            return 0, True
+        partial = checkpoint.byte_offset > 0
+        if partial:
+            self.stdout.write(self.style.WARNING(
+                f'Retomando {archive_name} a partir do chunk {checkpoint.chunks_processed + 1} '
+                f'(byte {checkpoint.byte_offset}, {checkpoint.rows_processed} linhas já gravadas).'
+            ))
 
-        with zipfile.ZipFile(zip_file_path) as zf:
-            # Encontra o primeiro arquivo CSV dentro do zip
-            csv_filename = next((name for name in zf.namelist() if '.csv' in name.lower() or '.emprecsv' in name.lower()), None)
-            if not csv_filename:
-                raise FileNotFoundError(f'Nenhum arquivo CSV encontrado em {zip_file_path}')
-
-            with zf.open(csv_filename) as csv_file:
-                csv_reader = pd.read_csv(
-                    csv_file,
-                    header=None,
-                    names=COLUMN_NAMES,
-                    sep=';',
-                    encoding='latin-1',
-                    dtype=str,
-                    chunksize=chunk_size
-                )
-
-                self.stdout.write(self.style.WARNING('Iniciando importação para o banco de dados... Este processo pode levar vários minutos.'))
-                for i, chunk in enumerate(csv_reader):
-                    self.process_chunk(chunk)
-                    total_rows_processed += len(chunk)
-                    self.stdout.write(f'Processado chunk {i+1}... Total de linhas até agora: {total_rows_processed}')
-        
+        started_at = time.perf_counter()
+
+        with self._read_archive(zip_file_path, archive_hash, checkpoint.byte_offset) as archive_chunks:
+            chunks = self._timed_chunks(archive_chunks, first_chunk=checkpoint.chunks_processed + 1)
+
+            self.stdout.write(self.style.WARNING('Iniciando importação para o banco de dados... Este processo pode levar vários minutos.'))
+            run = self._run_pipeline if self.pipeline else self._run_sequential
+            total_rows_processed = run(chunks, checkpoint, archive_name)
+
+        checkpoint.completed = True
+        self._save_checkpoint(checkpoint, ['completed'])
+
+        elapsed = time.perf_counter() - started_at
+        rows_per_second = total_rows_processed / elapsed if elapsed else 0
         self.stdout.write(self.style.SUCCESS(f'>>> Importação concluída! Total de {total_rows_processed} linhas processadas.'))
+        self.stdout.write(
+            f'{self.companies_created} empresas criadas, {self.companies_updated} atualizadas, '
+            f'{self.companies_unchanged} inalteradas.'
+        )
+        self.stdout.write(f"Engine '{self.loader.name}': {elapsed:.1f}s ({rows_per_second:,.0f} linhas/s).")
+        return total_rows_processed, partial
 
-    def process_chunk(self, chunk: pd.DataFrame):
-        # Esta função continua exatamente a mesma de antes, com a lógica de bulk_create e bulk_update
-        chunk['capital_social'] = chunk['capital_social'].str.replace(',', '.', regex=False)
-        chunk['capital_social'] = pd.to_numeric(chunk['capital_social'], errors='coerce').fillna(0)
-
-        objects_to_update = []
-        objects_to_create = []
-
-        cnpjs_in_chunk = set(chunk['cnpj'])
-        existing_cnpjs = set(Company.objects.filter(cnpj__in=cnpjs_in_chunk).values_list('cnpj', flat=True))
-
-        for _, row in chunk.iterrows():
-            company_data = {
-                'cnpj': row['cnpj'],
-                'razao_social': row['razao_social'],
-                'natureza_juridica': row['natureza_juridica'],
-                'qualificacao_responsavel': row['qualificacao_responsavel'],
-                'capital_social': Decimal(row['capital_social']),
-                'porte_empresa': row['porte_empresa'],
-                'ente_federativo_responsavel': row['ente_federativo_responsavel'],
-            }
-
-            if row['cnpj'] in existing_cnpjs:
-                objects_to_update.append(Company(**company_data))
+    @contextmanager
+    def _read_archive(self, zip_file_path, archive_hash, start_offset):
+        """
+        Gera os (chunk, byte_offset) do arquivo: do cache Parquet, se ele já tiver sido
+        convertido, ou do CSV dentro do zip (gravando o cache numa leitura completa).
+        """
+        if self.memory_budget_mb:
+            self._apply_memory_budget(zip_file_path)
+        cache = self.archive_cache
+        if cache is not None and cache.can_read(archive_hash, start_offset):
+            largest = max(cache.row_group_sizes(archive_hash), default=0)
+            if self.memory_budget_mb and largest > self.chunk_size:
+                # Os offsets do CSV só existem no fim de cada row group: não há como partir um deles
+                self.stdout.write(self.style.WARNING(
+                    f'O cache colunar de {os.path.basename(zip_file_path)} tem chunks de até {largest} linhas, '
+                    f'acima das {self.chunk_size} do --memory-budget. Lendo o CSV.'
+                ))
             else:
-                objects_to_create.append(Company(**company_data))
-        
-        if objects_to_create:
-            Company.objects.bulk_create(objects_to_create, batch_size=1000)
-
-        if objects_to_update:
-            Company.objects.bulk_update(
-                objects_to_update,
-                ['razao_social', 'natureza_juridica', 'qualificacao_responsavel', 'capital_social', 'porte_empresa', 'ente_federativo_responsavel'],
-                batch_size=1000
-            )
\ No newline at end of file
+                self.stdout.write(f'Lendo {os.path.basename(zip_file_path)} do cache colunar {cache.path(archive_hash)}.')
+                max_rows = self.chunk_size if self.memory_budget_mb else None
+                chunks = cache.read_chunks(archive_hash, start_offset, max_rows=max_rows)
+                try:
+                    yield chunks
+                finally:
+                    chunks.close()
+                return
+
+        with zipfile.ZipFile(zip_file_path) as zf, zf.open(find_csv_member(zf)) as csv_file:
+            chunks = read_csv_chunks(
+                csv_file, self.chunk_size, start_offset=start_offset, mode=self.parse_mode,
+                arrow_strings=self.arrow_strings,
+            )
+            if cache is not None and start_offset == 0:
+                # Numa leitura completa o cache é (re)gravado com o tamanho de chunk atual
+                chunks = cache.write_chunks(archive_hash, chunks, archive_name=os.path.basename(zip_file_path))
+            try:
+                yield chunks
+            finally:
+                # Sem chegar ao fim do CSV (falha na importação), o cache incompleto é descartado
+                chunks.close()
+
+    def _apply_memory_budget(self, zip_file_path):
+        """Calcula o chunk_size do arquivo para caber no --memory-budget, com uma amostra do CSV."""
+        with zipfile.ZipFile(zip_file_path) as zf, zf.open(find_csv_member(zf)) as sample_file:
+            self.chunk_size = chunk_size_for_budget(
+                sample_file, self.memory_budget_mb, self._chunks_in_flight(),
+                TRANSFORM_BYTES_PER_ROW + self.writers * self.loader.write_bytes_per_row,
+                self.parse_mode, self.arrow_strings,
+            )
+        self.stdout.write(
+            f'Chunks de {self.chunk_size} linhas para caber em {self.memory_budget_mb} MB '
+            f'({self._chunks_in_flight()} chunk(s) em processamento).'
+        )
+
+    def _chunks_in_flight(self):
+        """Chunks que podem estar na memória ao mesmo tempo (ver ChunkPipeline)."""
+        return 2 * self.queue_depth + self.writers + 2 if self.pipeline else 1
+
+    def _timed_chunks(self, chunks, first_chunk=1):
+        """Mede a leitura de cada chunk; o tempo e o número do chunk seguem em `chunk.attrs` até o evento."""
+        for number in itertools.count(first_chunk):
+            started_at = time.perf_counter()
+            item = next(chunks, None)
+            if item is None:
+                return
+            chunk, byte_offset = item
+            chunk.attrs['chunk'] = number
+            chunk.attrs['timings'] = {'read': time.perf_counter() - started_at}
+            yield chunk, byte_offset
+
+    def _run_sequential(self, chunks, checkpoint, archive_name):
+        """Importa os chunks um após o outro na thread atual."""
+        total_rows_processed = 0
+        while True:
+            # Cada grupo de `commit_every` chunks é gravado junto com o checkpoint numa transação curta
+            with transaction.atomic():
+                group_rows = 0
+                for chunk, byte_offset in itertools.islice(chunks, self.commit_every):
+                    self.process_chunk(chunk)
+                    group_rows += len(chunk)
+                    checkpoint.byte_offset = byte_offset
+                    checkpoint.chunks_processed += 1
+                if not group_rows:
+                    return total_rows_processed
+                checkpoint.rows_processed += group_rows
+                self._save_checkpoint(checkpoint, ['byte_offset', 'rows_processed', 'chunks_processed'])
+            total_rows_processed += group_rows
+            self.stdout.write(f'[{archive_name}] Processado chunk {checkpoint.chunks_processed}... Total de linhas até agora: {checkpoint.rows_processed}')
+
+    def _run_pipeline(self, chunks, checkpoint, archive_name):
+        """Importa os chunks com leitura, transformação e gravação em threads (ver ChunkPipeline)."""
+        rows_before = checkpoint.rows_processed
+
+        def save_checkpoint(confirmed):
+            # Chamado dentro da transação do gravador, como no modo sequencial
+            checkpoint.byte_offset = confirmed[-1][1]
+            checkpoint.rows_processed += sum(rows for rows, _ in confirmed)
+            checkpoint.chunks_processed += len(confirmed)
+            self._save_checkpoint(checkpoint, ['byte_offset', 'rows_processed', 'chunks_processed'])
+            self.stdout.write(f'[{archive_name}] Processado chunk {checkpoint.chunks_processed}... Total de linhas até agora: {checkpoint.rows_processed}')
+
+        pipeline = ChunkPipeline(
+            transform=self.transform_chunk,
+            write=self.write_chunk,
+            save_checkpoint=save_checkpoint,
+            queue_depth=self.queue_depth,
+            writers=self.writers,
+            commit_every=self.commit_every,
+        )
+        pipeline.run(chunks)
+        return checkpoint.rows_processed - rows_before
+
+    def normalize_chunk(self, chunk: pd.DataFrame):
+        """
+        Normaliza o chunk inteiro com operações de coluna (sem iterar linha a linha).
+        No modo 'text' o capital social continua como texto ('1000.00') para não perder
+        precisão em float; no 'typed' ele já vem como float64 (exato até os centavos
+        abaixo de ~90 trilhões).
+        """
+        if self.parse_mode != 'typed':
+            capital_social = chunk['capital_social'].str.replace(',', '.', regex=False)
+            invalid_capital = pd.to_numeric(capital_social, errors='coerce').isna()
+            chunk['capital_social'] = capital_social.mask(invalid_capital, '0')
+
+        for column in NULLABLE_COLUMNS:
+            values = chunk[column]
+            chunk[column] = values.where(values.notna() & (values != ''), None)
+        for column in REQUIRED_TEXT_COLUMNS:
+            values = chunk[column]
+            if isinstance(values.dtype, pd.CategoricalDtype) and '' not in values.cat.categories:
+                values = values.cat.add_categories([''])
+            # Sem isso o COPY leria o campo vazio como NULL (e recusaria o chunk inteiro)
+            chunk[column] = values.fillna('')
+
+        chunk['row_hash'] = compute_row_hashes(chunk)
+        if self.parse_mode == 'typed':
+            # Depois do hash: o capital inválido (NaN) entra no hash como o '0' do modo 'text'
+            chunk['capital_social'] = chunk['capital_social'].fillna(0.0)
+        return chunk
+
+    def transform_chunk(self, chunk: pd.DataFrame):
+        """Etapa de CPU: normaliza o chunk e registra os CNPJs lidos."""
+        timings = chunk.attrs.setdefault('timings', {})
+        with timed(timings, 'transform'):
+            chunk = self.normalize_chunk(chunk)
+            if self.track_seen:
+                self.seen_cnpjs.append(pd.to_numeric(chunk['cnpj'], errors='coerce').dropna().to_numpy(dtype=np.uint32))
+        chunk.attrs['timings'] = timings
+        return chunk
+
+    def write_chunk(self, chunk: pd.DataFrame):
+        """Etapa de banco: grava o chunk normalizado (pode rodar em várias threads)."""
+        timings = chunk.attrs.get('timings', {})
+        created, updated, unchanged = self.loader.load(chunk, timings=timings)
+        with self._counters_lock:
+            self.companies_created += created
+            self.companies_updated += updated
+            self.companies_unchanged += unchanged
+            add_timings(self.stage_seconds, timings)
+        emit_event(
+            'chunk', command='populate_companies', archive=self.archive_name, chunk=chunk.attrs.get('chunk'),
+            engine=self.loader.name, rows=len(chunk), created=created, updated=updated, unchanged=unchanged,
+            timings=rounded(timings),
+        )
+        return created, updated, unchanged
+
+    def process_chunk(self, chunk: pd.DataFrame):
+        return self.write_chunk(self.transform_chunk(chunk))
+
+
+
+# Bitmap de CNPJs conhecidos do processo do pool: recebe os CNPJs de todos os arquivos que ele importa
+_worker_known_cnpjs = None
+
+
+def _init_worker(known_cnpjs=None):
+    global _worker_known_cnpjs
+    # Garante o Django configurado também quando o pool usa 'spawn' em vez de 'fork'
+    django.setup()
+    _worker_known_cnpjs = CnpjBitmap.from_bytes(known_cnpjs) if known_cnpjs is not None else None
+
+
+def _import_archive_worker(zip_file_path, options):
+    """Ponto de entrada dos processos do pool: importa um único arquivo."""
+    command = Command()
+    command.configure(options, known_cnpjs=_worker_known_cnpjs)
+    try:
+        return command.import_archive(zip_file_path)
+    finally:
+        connections.close_all()
@@ -5,6 +5,7 @@ from django.db import transaction
 
 from data_importer.models import Region, State, Municipality, District
 from data_importer.services import IBGEApiClient
+from data_importer.cache import DATASET_IBGE, bump_dataset_version
 
 #Configura um logger para o comando
 logger = logging.getLogger(__name__)
@@ -38,6 +39,8 @@ class Command(BaseCommand):
         self.stdout.write(f'{self.created_states} novos estados criados.')
         self.stdout.write(f'{self.created_municipalities} novos municípios criados.')
         self.stdout.write(f'{self.created_districts} novos distritos criados.')
+        # Invalida o cache das páginas de localidades
+        bump_dataset_version(DATASET_IBGE)
         self.stdout.write(self.style.SUCCESS('>>> Importação concluída com sucesso!'))
 
     def _import_regions_and_states(self):
@@ -76,6 +79,9 @@ class Command(BaseCommand):
         
         municipalities_to_create = []
         for mun_item in municipalities_data:
+            if not mun_item.microrregiao:
+                logger.warning(f"Município '{mun_item.nome}' (ID: {mun_item.id}) veio sem microrregião. Pulando.")
+                continue
             state_id = mun_item.microrregiao.mesorregiao.UF.id
             state_instance = states_map.get(state_id)
             
@@ -93,7 +99,7 @@ class Command(BaseCommand):
 
     def _import_districts(self):
         self.stdout.write('Importando distritos... (Pode levar um momento)')
-        districts_data = self.client.get_districts()
+        districts_data = self.client.iter_districts()
 
         municipalities_map = {m.id: m for m in Municipality.objects.all()}
 
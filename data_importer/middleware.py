@@ -0,0 +1,154 @@
+# data_importer/middleware.py
+import re
+import json
+import time
+import logging
+from contextlib import ExitStack
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from .benchmark import QueryStats
+
+slow_request_logger = logging.getLogger('data_importer.slow_requests')
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST = re.compile(r'\bIN\s*\((?:\s*(?:%s|\?)\s*,?)+\)', re.IGNORECASE)
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_sql(sql):
+    """
+    Reduz o SQL à sua forma (sem valores), para agrupar consultas repetidas:
+    literais e números viram '?' e listas de IN viram 'IN (...)'.
+    """
+    sql = _STRING_LITERAL.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = sql.replace('%s', '?')
+    sql = _IN_LIST.sub('IN (...)', sql)
+    return _WHITESPACE.sub(' ', sql).strip()
+
+
+class StatementRecorder(QueryStats):
+    """QueryStats que também guarda o tempo de cada consulta, agrupado pelo SQL normalizado."""
+
+    def __init__(self):
+        super().__init__()
+        self.statements = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        started_at = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started_at
+            with self._lock:
+                self.queries += 1
+                self.db_seconds += elapsed
+                count, total, slowest = self.statements.get(sql, (0, 0.0, 0.0))
+                self.statements[sql] = (count + 1, total + elapsed, max(slowest, elapsed))
+
+    def slowest(self, limit):
+        """As `limit` formas de SQL com mais tempo acumulado: [(sql normalizado, vezes, segundos, maior)]."""
+        grouped = {}
+        for sql, (count, total, slowest) in self.statements.items():
+            key = normalize_sql(sql)
+            prev_count, prev_total, prev_slowest = grouped.get(key, (0, 0.0, 0.0))
+            grouped[key] = (prev_count + count, prev_total + total, max(prev_slowest, slowest))
+        ranked = sorted(grouped.items(), key=lambda item: item[1][1], reverse=True)
+        return [(sql, count, total, slowest) for sql, (count, total, slowest) in ranked[:limit]]
+
+
+class SqlInstrumentationMiddleware:
+    """
+    Mede as consultas de cada requisição: quantidade, tempo total no banco e as mais
+    lentas. Os números vão no cabeçalho `Server-Timing` (visível no DevTools do
+    navegador) e as requisições acima de SQL_SLOW_REQUEST_MS são registradas no
+    logger 'data_importer.slow_requests' com o SQL normalizado.
+
+    Só é carregado com SQL_INSTRUMENTATION = True; caso contrário o Django remove-o
+    da cadeia de middlewares na inicialização (custo zero por requisição).
+
+    Funciona também pelo ASGI com as views assíncronas (ver __acall__).
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'SQL_INSTRUMENTATION', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.slow_request_seconds = getattr(settings, 'SQL_SLOW_REQUEST_MS', 500) / 1000
+        self.slowest_statements = getattr(settings, 'SQL_SLOWEST_STATEMENTS', 3)
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        recorder = StatementRecorder()
+        started_at = time.perf_counter()
+        with self._instrument(recorder):
+            response = self.get_response(request)
+            # Respostas de template são renderizadas depois da view; as consultas da renderização também contam
+            if hasattr(response, 'render') and not response.is_rendered:
+                response.render()
+        return self._finish(request, response, recorder, time.perf_counter() - started_at)
+
+    async def __acall__(self, request):
+        """
+        Versão assíncrona. As conexões do Django são por thread, e o ORM de uma view assíncrona
+        roda na thread de banco da requisição (sync_to_async com thread_sensitive); por isso o
+        recorder é instalado e removido nessa thread, e não na do event loop, que não consulta.
+        """
+        recorder = StatementRecorder()
+        started_at = time.perf_counter()
+        stack = await sync_to_async(self._instrument)(recorder)
+        try:
+            response = await self.get_response(request)
+            if hasattr(response, 'render') and not response.is_rendered:
+                await sync_to_async(response.render)()
+        finally:
+            await sync_to_async(stack.close)()
+        return self._finish(request, response, recorder, time.perf_counter() - started_at)
+
+    def _instrument(self, recorder):
+        """Instala o recorder em todas as conexões da thread atual; fechar o ExitStack o remove."""
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(recorder))
+        return stack
+
+    def _finish(self, request, response, recorder, elapsed):
+        slowest = recorder.slowest(self.slowest_statements)
+        response['Server-Timing'] = self._server_timing(recorder, elapsed, slowest)
+        if elapsed >= self.slow_request_seconds:
+            self._log_slow_request(request, response, recorder, elapsed)
+        return response
+
+    def _server_timing(self, recorder, elapsed, slowest):
+        metrics = [
+            f'total;dur={elapsed * 1000:.1f}',
+            f'db;dur={recorder.db_seconds * 1000:.1f};desc="{recorder.queries} consultas"',
+        ]
+        for position, (_, count, total, _) in enumerate(slowest, start=1):
+            metrics.append(f'sql-{position};dur={total * 1000:.1f};desc="{count}x"')
+        return ', '.join(metrics)
+
+    def _log_slow_request(self, request, response, recorder, elapsed):
+        slow_request_logger.warning(json.dumps({
+            'method': request.method,
+            'path': request.get_full_path(),
+            'status': response.status_code,
+            'duration_ms': round(elapsed * 1000, 1),
+            'queries': recorder.queries,
+            'db_ms': round(recorder.db_seconds * 1000, 1),
+            # Todas as formas de SQL, das mais custosas para as menos; muitas repetições indicam N+1
+            'statements': [
+                {'sql': sql, 'count': count, 'total_ms': round(total * 1000, 2), 'max_ms': round(slowest * 1000, 2)}
+                for sql, count, total, slowest in recorder.slowest(None)
+            ],
+        }, ensure_ascii=False))
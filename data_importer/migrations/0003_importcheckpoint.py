@@ -0,0 +1,31 @@
+# Generated by Django 5.2.5 on 2026-10-18 08:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_importer', '0002_company'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('archive', models.CharField(max_length=255, unique=True, verbose_name='Arquivo')),
+                ('archive_hash', models.CharField(max_length=64, verbose_name='Hash do Arquivo (SHA-256)')),
+                ('byte_offset', models.BigIntegerField(default=0, verbose_name='Posição no CSV (bytes)')),
+                ('rows_processed', models.BigIntegerField(default=0, verbose_name='Linhas Processadas')),
+                ('chunks_processed', models.IntegerField(default=0, verbose_name='Chunks Processados')),
+                ('completed', models.BooleanField(default=False, verbose_name='Concluído')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Atualizado em')),
+            ],
+            options={
+                'verbose_name': 'Checkpoint de Importação',
+                'verbose_name_plural': 'Checkpoints de Importação',
+                'ordering': ['archive'],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 08:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_importer', '0003_importcheckpoint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='company',
+            name='row_hash',
+            field=models.BigIntegerField(blank=True, editable=False, null=True, verbose_name='Hash do Conteúdo'),
+        ),
+    ]
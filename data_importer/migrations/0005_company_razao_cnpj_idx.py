@@ -0,0 +1,22 @@
+# Generated by Django 5.2.5 on 2026-10-18 08:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_importer', '0004_company_row_hash'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='company',
+            name='razao_social',
+            field=models.CharField(max_length=255, verbose_name='Razão Social'),
+        ),
+        migrations.AddIndex(
+            model_name='company',
+            index=models.Index(fields=['razao_social', 'cnpj'], name='company_razao_cnpj_idx'),
+        ),
+    ]
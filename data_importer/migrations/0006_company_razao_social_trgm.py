@@ -0,0 +1,46 @@
+from django.db import migrations
+
+# O índice é criado com CONCURRENTLY para não bloquear a tabela de empresas
+# durante o deploy, por isso a migração não roda dentro de uma transação.
+FORWARD_SQL = [
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    'CREATE EXTENSION IF NOT EXISTS unaccent',
+    # unaccent() é STABLE; o wrapper IMMUTABLE (com o dicionário fixo) permite usá-lo num índice
+    """
+    CREATE OR REPLACE FUNCTION data_importer_unaccent(text) RETURNS text AS $$
+        SELECT public.unaccent('public.unaccent'::regdictionary, $1)
+    $$ LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT
+    """,
+    """
+    CREATE INDEX CONCURRENTLY IF NOT EXISTS company_razao_trgm_idx
+    ON data_importer_company USING gin (data_importer_unaccent(lower(razao_social)) gin_trgm_ops)
+    """,
+]
+
+REVERSE_SQL = [
+    'DROP INDEX CONCURRENTLY IF EXISTS company_razao_trgm_idx',
+    'DROP FUNCTION IF EXISTS data_importer_unaccent(text)',
+]
+
+
+def run_on_postgres(statements):
+    def run(apps, schema_editor):
+        # No SQLite (testes) a busca usa o icontains padrão e não precisa do índice
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('data_importer', '0005_company_razao_cnpj_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(run_on_postgres(FORWARD_SQL), run_on_postgres(REVERSE_SQL)),
+    ]
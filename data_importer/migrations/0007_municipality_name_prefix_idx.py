@@ -0,0 +1,36 @@
+from django.db import migrations
+
+# Índice de prefixo para o autocomplete de municípios: a mesma expressão usada
+# pela busca (data_importer_unaccent, criada na 0006) com text_pattern_ops,
+# que permite ao PostgreSQL resolver LIKE 'prefixo%' pelo índice b-tree.
+FORWARD_SQL = [
+    """
+    CREATE INDEX IF NOT EXISTS municipality_name_prefix_idx
+    ON data_importer_municipality (data_importer_unaccent(lower(name)) text_pattern_ops)
+    """,
+]
+
+REVERSE_SQL = [
+    'DROP INDEX IF EXISTS municipality_name_prefix_idx',
+]
+
+
+def run_on_postgres(statements):
+    def run(apps, schema_editor):
+        # No SQLite (testes) o autocomplete usa istartswith e não precisa do índice
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_importer', '0006_company_razao_social_trgm'),
+    ]
+
+    operations = [
+        migrations.RunPython(run_on_postgres(FORWARD_SQL), run_on_postgres(REVERSE_SQL)),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.5 on 2026-10-18 08:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_importer', '0007_municipality_name_prefix_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DatasetVersion',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False, verbose_name='Conjunto de Dados')),
+                ('version', models.PositiveBigIntegerField(default=0, verbose_name='Versão')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Atualizado em')),
+            ],
+            options={
+                'verbose_name': 'Versão do Conjunto de Dados',
+                'verbose_name_plural': 'Versões dos Conjuntos de Dados',
+                'ordering': ['name'],
+            },
+        ),
+    ]
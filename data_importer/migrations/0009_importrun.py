@@ -0,0 +1,34 @@
+# Generated by Django 5.2.5 on 2026-10-18 08:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_importer', '0008_datasetversion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('command', models.CharField(db_index=True, max_length=50, verbose_name='Comando')),
+                ('started_at', models.DateTimeField(verbose_name='Início')),
+                ('finished_at', models.DateTimeField(verbose_name='Fim')),
+                ('success', models.BooleanField(default=True, verbose_name='Sucesso')),
+                ('rows', models.BigIntegerField(default=0, verbose_name='Linhas Lidas')),
+                ('created', models.BigIntegerField(default=0, verbose_name='Criadas')),
+                ('updated', models.BigIntegerField(default=0, verbose_name='Atualizadas')),
+                ('unchanged', models.BigIntegerField(default=0, verbose_name='Inalteradas')),
+                ('stage_seconds', models.JSONField(default=dict, verbose_name='Tempo por Etapa (s)')),
+                ('peak_rss_mb', models.FloatField(blank=True, null=True, verbose_name='Pico de Memória (MiB)')),
+            ],
+            options={
+                'verbose_name': 'Execução de Importação',
+                'verbose_name_plural': 'Execuções de Importação',
+                'ordering': ['-finished_at'],
+            },
+        ),
+    ]
@@ -72,9 +72,7 @@ class District(models.Model):
 class Company(models.Model):
     # O CNPJ básico (8 primeiros dígitos) vai ser a chave primaria
     cnpj = models.CharField("CNPJ Básico", max_length=8, primary_key=True)
-    razao_social = models.CharField(
-        "Razão Social", max_length=255, db_index=True
-    )
+    razao_social = models.CharField("Razão Social", max_length=255)
     natureza_juridica = models.CharField("Natureza Jurídica", max_length=4)
     qualificacao_responsavel = models.CharField(
         "Qualificação do Responsável", max_length=2
@@ -88,11 +86,76 @@ class Company(models.Model):
     ente_federativo_responsavel = models.CharField(
         "Ente Federativo Responsável", max_length=255, null=True, blank=True
     )
+    # Hash das colunas da Receita, usado para gravar apenas as linhas que mudaram
+    row_hash = models.BigIntegerField(
+        "Hash do Conteúdo", null=True, blank=True, editable=False
+    )
 
     class Meta:
         verbose_name = "Empresa"
         verbose_name_plural = "Empresas"
         ordering = ['razao_social']
+        indexes = [
+            # Atende a ordenação por razão social e a paginação por cursor (razao_social, cnpj)
+            models.Index(fields=['razao_social', 'cnpj'], name='company_razao_cnpj_idx'),
+        ]
+
+    def __str__(self):
+        return self.razao_social
+
+class ImportCheckpoint(models.Model):
+    # Ponto de retomada da importação de um arquivo da Receita (populate_companies --resume)
+    archive = models.CharField("Arquivo", max_length=255, unique=True)
+    archive_hash = models.CharField("Hash do Arquivo (SHA-256)", max_length=64)
+    byte_offset = models.BigIntegerField("Posição no CSV (bytes)", default=0)
+    rows_processed = models.BigIntegerField("Linhas Processadas", default=0)
+    chunks_processed = models.IntegerField("Chunks Processados", default=0)
+    completed = models.BooleanField("Concluído", default=False)
+    updated_at = models.DateTimeField("Atualizado em", auto_now=True)
+
+    class Meta:
+        verbose_name = "Checkpoint de Importação"
+        verbose_name_plural = "Checkpoints de Importação"
+        ordering = ['archive']
+
+    def __str__(self):
+        return f'{self.archive} ({self.rows_processed} linhas)'
+
+
+class DatasetVersion(models.Model):
+    # Versão de cada conjunto de dados ('ibge', 'companies'), incrementada ao fim de cada importação.
+    # Entra na chave dos caches de página, então uma importação invalida-os sem depender de TTL.
+    name = models.CharField("Conjunto de Dados", max_length=50, primary_key=True)
+    version = models.PositiveBigIntegerField("Versão", default=0)
+    updated_at = models.DateTimeField("Atualizado em", auto_now=True)
+
+    class Meta:
+        verbose_name = "Versão do Conjunto de Dados"
+        verbose_name_plural = "Versões dos Conjuntos de Dados"
+        ordering = ['name']
+
+    def __str__(self):
+        return f'{self.name} v{self.version}'
+
+
+class ImportRun(models.Model):
+    # Resumo da última execução de cada comando de importação, exposto em /metrics
+    command = models.CharField("Comando", max_length=50, db_index=True)
+    started_at = models.DateTimeField("Início")
+    finished_at = models.DateTimeField("Fim")
+    success = models.BooleanField("Sucesso", default=True)
+    rows = models.BigIntegerField("Linhas Lidas", default=0)
+    created = models.BigIntegerField("Criadas", default=0)
+    updated = models.BigIntegerField("Atualizadas", default=0)
+    unchanged = models.BigIntegerField("Inalteradas", default=0)
+    # Segundos gastos em cada etapa (read, transform, lookup, insert, update...)
+    stage_seconds = models.JSONField("Tempo por Etapa (s)", default=dict)
+    peak_rss_mb = models.FloatField("Pico de Memória (MiB)", null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Execução de Importação"
+        verbose_name_plural = "Execuções de Importação"
+        ordering = ['-finished_at']
 
     def __str__(self):
-        return self.razao_social
\ No newline at end of file
+        return f'{self.command} em {self.finished_at:%d/%m/%Y %H:%M}'
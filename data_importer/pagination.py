@@ -0,0 +1,290 @@
+# data_importer/pagination.py
+import json
+import base64
+import hashlib
+import binascii
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.core.paginator import EmptyPage, Page, PageNotAnInteger, Paginator
+from django.db import connections
+from django.db.models import QuerySet
+from django.http import Http404
+from django.utils.functional import cached_property
+
+from .cache import aget_dataset_version, dataset_for_model, get_dataset_version
+
+
+def encode_cursor(values, direction):
+    """Gera um token opaco (base64) com a chave de ordenação e a direção ('n' próxima / 'p' anterior)."""
+    payload = json.dumps({'k': list(values), 'd': direction}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def _is_cursor_value(value):
+    # bool é subclasse de int, mas nenhum campo de ordenação é booleano
+    return value is None or isinstance(value, (str, int)) and not isinstance(value, bool)
+
+
+def decode_cursor(token, size=None):
+    """
+    Decodifica o token de `encode_cursor`. Retorna (valores, direção). Com `size`, exige
+    exatamente esse número de valores (um por campo da ordenação); cada valor precisa ser
+    texto, inteiro ou nulo, para que um token adulterado nunca chegue à consulta.
+    """
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        values, direction = payload['k'], payload['d']
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        raise Http404('Cursor de paginação inválido.')
+    if direction not in ('n', 'p') or not isinstance(values, list):
+        raise Http404('Cursor de paginação inválido.')
+    if size is not None and len(values) != size or not all(_is_cursor_value(value) for value in values):
+        raise Http404('Cursor de paginação inválido.')
+    return values, direction
+
+
+class CursorPage:
+    """Página da paginação por cursor, com a mesma interface usada pelo template de paginação."""
+    is_cursor = True
+
+    def __init__(self, object_list, has_next, has_previous, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self._has_next = has_next
+        self._has_previous = has_previous
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+
+class CursorPaginator:
+    """
+    Paginação por chave (keyset) sobre uma ordenação única, ex.: (razao_social, cnpj).
+
+    Em vez de OFFSET, cada página busca as linhas depois (ou antes) da última chave
+    vista, o que é resolvido direto pelo índice composto: a página N custa o mesmo
+    que a página 1. O último campo da ordenação precisa ser único (a chave primária).
+    """
+
+    def __init__(self, queryset, per_page, ordering=('razao_social', 'cnpj')):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.ordering = ordering
+
+    def _key(self, obj):
+        # Aceita instâncias do modelo e também os dicts de um queryset .values()
+        if isinstance(obj, dict):
+            return [obj[field] for field in self.ordering]
+        return [getattr(obj, field) for field in self.ordering]
+
+    def _seek(self, queryset, values, forward):
+        # `razao_social >= x` é o que permite ao banco posicionar no índice; o exclude
+        # descarta os empates já vistos (mesma razão social com cnpj <= o último)
+        first, last = self.ordering
+        first_value, last_value = values
+        if forward:
+            return queryset.filter(**{f'{first}__gte': first_value}).exclude(
+                **{first: first_value, f'{last}__lte': last_value}
+            )
+        return queryset.filter(**{f'{first}__lte': first_value}).exclude(
+            **{first: first_value, f'{last}__gte': last_value}
+        )
+
+    def _query(self, cursor):
+        values, direction = decode_cursor(cursor, size=len(self.ordering)) if cursor else (None, 'n')
+        forward = direction == 'n'
+
+        queryset = self.queryset
+        if values is not None:
+            queryset = self._seek(queryset, values, forward)
+        ordering = self.ordering if forward else [f'-{field}' for field in self.ordering]
+        return queryset.order_by(*ordering)[:self.per_page + 1], values, forward
+
+    def _build_page(self, rows, values, forward):
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if not forward:
+            rows.reverse()
+
+        if forward:
+            has_next, has_previous = has_more, values is not None
+        else:
+            has_next, has_previous = True, has_more
+
+        return CursorPage(
+            rows,
+            has_next=has_next and bool(rows),
+            has_previous=has_previous and bool(rows),
+            next_cursor=encode_cursor(self._key(rows[-1]), 'n') if rows else None,
+            previous_cursor=encode_cursor(self._key(rows[0]), 'p') if rows else None,
+        )
+
+    def page(self, cursor=None):
+        queryset, values, forward = self._query(cursor)
+        return self._build_page(list(queryset), values, forward)
+
+    async def apage(self, cursor=None):
+        """Mesmo que `page`, com as linhas lidas pelo ORM assíncrono."""
+        queryset, values, forward = self._query(cursor)
+        return self._build_page([row async for row in queryset], values, forward)
+
+
+class AsyncPaginator(Paginator):
+    """
+    Paginator com `acount()`/`apage()` para as views assíncronas: a contagem e a
+    leitura da página usam o ORM assíncrono, e o template recebe uma lista pronta
+    (nenhuma consulta fica para a renderização).
+    """
+
+    async def acount(self):
+        if 'count' not in self.__dict__:
+            queryset = self.object_list
+            # `count` é um cached_property: guardar o valor dispensa a contagem síncrona
+            self.__dict__['count'] = await queryset.acount() if isinstance(queryset, QuerySet) else len(queryset)
+        return self.count
+
+    async def apage(self, number):
+        await self.acount()
+        page = self.page(number)
+        page.object_list = await _alist(page.object_list)
+        return page
+
+
+async def _alist(object_list):
+    if isinstance(object_list, QuerySet):
+        return [obj async for obj in object_list]
+    return list(object_list)
+
+
+class EstimatedPage(Page):
+    """Página cujo "próximo" vem da leitura de uma linha a mais, e não da contagem total."""
+
+    def __init__(self, object_list, number, paginator, has_next):
+        super().__init__(object_list, number, paginator)
+        self._has_next = has_next
+
+    def has_next(self):
+        return self._has_next
+
+
+class EstimatedCountPaginator(AsyncPaginator):
+    """
+    Paginator que evita o SELECT COUNT(*) em resultados grandes.
+
+    No PostgreSQL, pergunta primeiro ao planejador quantas linhas a consulta deve
+    retornar (EXPLAIN, que usa as estatísticas de pg_class.reltuples). Acima de
+    `estimate_threshold` a estimativa é usada como total ("Página X de ~Y"); abaixo
+    dele, ou em outros bancos, faz a contagem exata e guarda-a no cache, para que a
+    mesma combinação de filtros não seja contada de novo a cada página. A chave
+    inclui a versão do conjunto de dados, então uma nova importação invalida-a.
+    """
+    estimate_threshold = 10000
+    count_cache_timeout = 300
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.is_estimated = False
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not isinstance(queryset, QuerySet):
+            return super().count
+        estimate = self.estimate_count(queryset)
+        if estimate is not None and estimate >= self.estimate_threshold:
+            self.is_estimated = True
+            return estimate
+        return self.exact_count(queryset)
+
+    def estimate_count(self, queryset):
+        """Retorna a estimativa de linhas do planejador (apenas PostgreSQL) ou None."""
+        connection = connections[queryset.db]
+        if connection.vendor != 'postgresql':
+            return None
+        sql, params = queryset.order_by().query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows'])
+
+    async def acount(self):
+        if 'count' in self.__dict__:
+            return self.count
+        queryset = self.object_list
+        if not isinstance(queryset, QuerySet):
+            return await super().acount()
+        # O Django não tem cursor assíncrono para o EXPLAIN: esse passo vai para uma thread
+        estimate = await sync_to_async(self.estimate_count)(queryset)
+        if estimate is not None and estimate >= self.estimate_threshold:
+            self.is_estimated = True
+            count = estimate
+        else:
+            key = self.count_cache_key(
+                queryset, version=await aget_dataset_version(dataset_for_model(queryset.model))
+            )
+            count = await cache.aget(key)
+            if count is None:
+                count = await queryset.acount()
+                await cache.aset(key, count, self.count_cache_timeout)
+        self.__dict__['count'] = count
+        return count
+
+    def count_cache_key(self, queryset, version=None):
+        sql, params = queryset.order_by().query.sql_with_params()
+        if version is None:
+            version = get_dataset_version(dataset_for_model(queryset.model))
+        digest = hashlib.sha256(f'{queryset.db}:{sql}:{params!r}'.encode()).hexdigest()
+        return f'pagination-count:v{version}:{digest}'
+
+    def exact_count(self, queryset):
+        return cache.get_or_set(self.count_cache_key(queryset), queryset.count, self.count_cache_timeout)
+
+    def validate_number(self, number):
+        self.count  # define is_estimated
+        if not self.is_estimated:
+            return super().validate_number(number)
+        # A estimativa pode errar para menos: páginas além dela não são rejeitadas aqui
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger(self.error_messages['invalid_page'])
+        if number < 1:
+            raise EmptyPage(self.error_messages['min_page'])
+        return number
+
+    def page(self, number):
+        number = self.validate_number(number)
+        if not self.is_estimated:
+            return super().page(number)
+        bottom = (number - 1) * self.per_page
+        rows = list(self.object_list[bottom:bottom + self.per_page + 1])
+        if not rows and number > 1:
+            raise EmptyPage(self.error_messages['no_results'])
+        return EstimatedPage(rows[:self.per_page], number, self, has_next=len(rows) > self.per_page)
+
+    async def apage(self, number):
+        await self.acount()
+        if not self.is_estimated:
+            return await super().apage(number)
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        rows = await _alist(self.object_list[bottom:bottom + self.per_page + 1])
+        if not rows and number > 1:
+            raise EmptyPage(self.error_messages['no_results'])
+        return EstimatedPage(rows[:self.per_page], number, self, has_next=len(rows) > self.per_page)
@@ -0,0 +1,194 @@
+# data_importer/parquet_cache.py
+import os
+import json
+import tempfile
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from .receita import CATEGORICAL_COLUMNS, COLUMN_NAMES
+
+# Entra no nome do arquivo: mudar o formato invalida os caches antigos
+CACHE_FORMAT_VERSION = 1
+BYTE_OFFSETS_KEY = b'receita.byte_offsets'
+ARCHIVE_NAME_KEY = b'receita.archive_name'
+
+
+def cache_schema(mode='text'):
+    """
+    Colunas do cache com os tipos de cada modo de leitura (receita.PARSE_MODES): no 'text'
+    os valores ficam como no CSV; no 'typed', as categorias viram dicionários e o
+    capital social, float64.
+    """
+    fields = []
+    for name in COLUMN_NAMES:
+        if mode == 'typed' and name in CATEGORICAL_COLUMNS:
+            fields.append((name, pa.dictionary(pa.int32(), pa.string())))
+        elif mode == 'typed' and name == 'capital_social':
+            fields.append((name, pa.float64()))
+        else:
+            fields.append((name, pa.string()))
+    return pa.schema(fields)
+
+
+def _merge_row_groups(sizes, first_group=0, max_rows=None):
+    """Agrupa os índices de row groups seguidos em lotes de até `max_rows` linhas (sem limite: um por lote)."""
+    batch, rows = [], 0
+    for group in range(first_group, len(sizes)):
+        if batch and (max_rows is None or rows + sizes[group] > max_rows):
+            yield batch
+            batch, rows = [], 0
+        batch.append(group)
+        rows += sizes[group]
+    if batch:
+        yield batch
+
+
+class ArchiveCache:
+    """
+    Cache colunar (Parquet com zstd) dos arquivos da Receita já lidos do CSV.
+
+    Cada arquivo vira `<pasta>/<sha256 do zip>.v<versão>[.typed].parquet` (um por modo
+    de leitura), com um row group por chunk do CSV. Os metadados guardam o offset em
+    bytes no CSV do fim de cada row group, então os checkpoints do --resume valem para
+    as duas fontes. Outras ferramentas podem ler o mesmo arquivo direto (pyarrow,
+    pandas.read_parquet, DuckDB...), só com as colunas de que precisam.
+
+    O cache não cresce sem limite: ao gravar um arquivo, as entradas anteriores com o mesmo
+    nome de arquivo (ex.: o Empresas0.zip do mês passado) e o mesmo modo são apagadas, e,
+    com `max_bytes`, as entradas menos usadas saem até o total caber no limite.
+    """
+
+    def __init__(self, directory, mode='text', arrow_strings=False, max_bytes=None):
+        self.directory = directory
+        self.mode = mode
+        self.arrow_strings = arrow_strings
+        self.max_bytes = max_bytes
+        self.schema = cache_schema(mode)
+
+    @property
+    def suffix(self):
+        variant = '.typed' if self.mode == 'typed' else ''
+        return f'.v{CACHE_FORMAT_VERSION}{variant}.parquet'
+
+    def path(self, archive_hash):
+        return os.path.join(self.directory, f'{archive_hash}{self.suffix}')
+
+    def byte_offsets(self, archive_hash):
+        """Offsets (no CSV) do fim de cada row group, ou None se o arquivo não estiver no cache."""
+        try:
+            metadata = pq.read_metadata(self.path(archive_hash))
+        except (OSError, pa.ArrowInvalid):
+            return None
+        return json.loads(metadata.metadata[BYTE_OFFSETS_KEY])
+
+    def row_group_sizes(self, archive_hash):
+        """Linhas de cada row group (os chunks com que o cache foi gravado)."""
+        metadata = pq.read_metadata(self.path(archive_hash))
+        return [metadata.row_group(group).num_rows for group in range(metadata.num_row_groups)]
+
+    def can_read(self, archive_hash, start_offset=0):
+        """O arquivo está no cache e `start_offset` (de um checkpoint) cai no limite de um row group?"""
+        offsets = self.byte_offsets(archive_hash)
+        return offsets is not None and (start_offset == 0 or start_offset in offsets)
+
+    def read_chunks(self, archive_hash, start_offset=0, columns=None, max_rows=None):
+        """
+        Gera (chunk, byte_offset) como receita.read_csv_chunks, um row group de cada vez.
+        Com `max_rows`, row groups seguidos são juntados em chunks de até `max_rows` linhas
+        (um row group maior vem inteiro); cada chunk termina no fim de um row group, então
+        o offset continua valendo para os checkpoints. O arquivo é mapeado em memória e só
+        as colunas pedidas são lidas.
+        """
+        offsets = self.byte_offsets(archive_hash)
+        first_group = offsets.index(start_offset) + 1 if start_offset else 0
+        # A data de modificação marca o último uso: é por ela que o limite de tamanho escolhe o que apagar
+        os.utime(self.path(archive_hash))
+        parquet = pq.ParquetFile(self.path(archive_hash), memory_map=True)
+        sizes = [parquet.metadata.row_group(group).num_rows for group in range(parquet.num_row_groups)]
+        for groups in _merge_row_groups(sizes, first_group, max_rows):
+            table = parquet.read_row_groups(groups, columns=columns)
+            yield table.to_pandas(types_mapper=self._types_mapper), offsets[groups[-1]]
+
+    def _types_mapper(self, arrow_type):
+        # Com arrow_strings os textos continuam nos buffers do Arrow, como na leitura do CSV
+        if self.arrow_strings and arrow_type in (pa.string(), pa.large_string()):
+            return pd.StringDtype('pyarrow')
+        return None
+
+    def write_chunks(self, archive_hash, chunks, archive_name=None):
+        """
+        Repassa os (chunk, byte_offset) de read_csv_chunks, gravando cada chunk como um row
+        group antes de entregá-lo. O arquivo só aparece no cache quando `chunks` chega ao fim;
+        nesse momento as entradas antigas de `archive_name` são apagadas (ver prune).
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix='.tmp-', suffix='.parquet')
+        os.close(fd)
+        try:
+            offsets = []
+            with pq.ParquetWriter(tmp_path, self.schema, compression='zstd', use_dictionary=CATEGORICAL_COLUMNS) as writer:
+                for chunk, byte_offset in chunks:
+                    # Grava antes de entregar: a normalização altera o chunk no lugar
+                    table = pa.Table.from_pandas(chunk[COLUMN_NAMES], schema=self.schema, preserve_index=False)
+                    writer.write_table(table, row_group_size=len(chunk))
+                    offsets.append(byte_offset)
+                    yield chunk, byte_offset
+                metadata = {BYTE_OFFSETS_KEY: json.dumps(offsets)}
+                if archive_name:
+                    metadata[ARCHIVE_NAME_KEY] = archive_name
+                writer.add_key_value_metadata(metadata)
+            os.replace(tmp_path, self.path(archive_hash))
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        self.prune(keep=archive_hash, archive_name=archive_name)
+
+    def entries(self):
+        """(caminho, nome do arquivo de origem, bytes, última utilização) de cada entrada, de todos os modos."""
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        entries = []
+        for name in names:
+            if not name.endswith('.parquet') or name.startswith('.tmp-'):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                metadata = pq.read_metadata(path).metadata or {}
+                stat = os.stat(path)
+            except (OSError, pa.ArrowInvalid):
+                continue
+            archive_name = metadata.get(ARCHIVE_NAME_KEY)
+            entries.append((path, archive_name.decode() if archive_name else None, stat.st_size, stat.st_mtime))
+        return entries
+
+    def prune(self, keep=None, archive_name=None):
+        """
+        Apaga as entradas substituídas e as que passam do limite de tamanho (somando os dois
+        modos). `keep` (o hash recém-gravado) nunca é apagado; as demais do mesmo modo com o
+        mesmo `archive_name` sempre são. Devolve os caminhos apagados.
+        """
+        keep_path = self.path(keep) if keep else None
+        entries = sorted(self.entries(), key=lambda entry: entry[3])
+        removed = [
+            path for path, name, _, _ in entries
+            if archive_name and name == archive_name and path.endswith(self.suffix) and path != keep_path
+        ]
+        if self.max_bytes is not None:
+            remaining = [entry for entry in entries if entry[0] not in removed]
+            total = sum(size for _, _, size, _ in remaining)
+            # Das menos usadas para as mais usadas
+            for path, _, size, _ in remaining:
+                if total <= self.max_bytes:
+                    break
+                if path != keep_path:
+                    removed.append(path)
+                    total -= size
+        for path in removed:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        return removed
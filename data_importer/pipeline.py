@@ -0,0 +1,140 @@
+# data_importer/pipeline.py
+import queue
+import logging
+import threading
+from django.db import connection, transaction
+
+logger = logging.getLogger(__name__)
+
+# Marca o fim do fluxo de chunks entre as etapas
+_END = object()
+
+
+class ChunkPipeline:
+    """
+    Executa a importação em etapas concorrentes ligadas por filas limitadas:
+
+        leitura (CSV -> DataFrame) -> transformação -> N gravadores no banco
+
+    Enquanto o PostgreSQL grava um chunk, o pandas já está lendo/normalizando os
+    próximos. A memória fica limitada a aproximadamente
+    (2 * queue_depth + writers + 2) chunks em memória ao mesmo tempo.
+
+    Cada gravador junta até `commit_every` chunks numa transação e, antes de
+    confirmá-la, chama `save_checkpoint` com os (linhas, byte_offset) dos chunks que
+    passam a formar uma sequência contínua desde o início (seq 0, 1, 2...): o
+    checkpoint é confirmado junto com os dados e nunca pula um chunk ainda pendente
+    em outro gravador. Os gravadores confirmam um de cada vez (só o COMMIT, não a
+    gravação), para que um não salve o checkpoint com base num chunk que o outro
+    ainda pode desfazer.
+    """
+
+    def __init__(self, transform, write, save_checkpoint, queue_depth=2, writers=1, commit_every=1):
+        self.transform = transform
+        self.write = write
+        self.save_checkpoint = save_checkpoint
+        self.writers = max(1, writers)
+        self.commit_every = max(1, commit_every)
+        self.parsed = queue.Queue(maxsize=max(1, queue_depth))
+        self.transformed = queue.Queue(maxsize=max(1, queue_depth))
+        self.stop = threading.Event()
+        self.errors = []
+        self._commit_lock = threading.Lock()
+        self._pending = {}
+        self._next_seq = 0
+
+    def run(self, chunks):
+        """Consome `chunks` (iterável de (DataFrame, byte_offset)) até o fim ou até a primeira falha."""
+        threads = [
+            threading.Thread(target=self._guard, args=(self._read, chunks), name='import-reader'),
+            threading.Thread(target=self._guard, args=(self._transform,), name='import-transform'),
+        ] + [
+            threading.Thread(target=self._guard, args=(self._write,), name=f'import-writer-{i}')
+            for i in range(self.writers)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if self.errors:
+            raise self.errors[0]
+
+    def _guard(self, target, *args):
+        try:
+            target(*args)
+        except Exception as e:
+            logger.error(f'Falha na etapa {threading.current_thread().name} da importação: {e}')
+            self.errors.append(e)
+            self.stop.set()
+
+    def _put(self, q, item):
+        # Espera por espaço na fila sem travar para sempre se outra etapa falhar
+        while not self.stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, q):
+        while not self.stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _END
+
+    def _read(self, chunks):
+        for seq, (chunk, byte_offset) in enumerate(chunks):
+            if not self._put(self.parsed, (seq, chunk, byte_offset)):
+                return
+        self._put(self.parsed, _END)
+
+    def _transform(self):
+        while (item := self._get(self.parsed)) is not _END:
+            seq, chunk, byte_offset = item
+            if not self._put(self.transformed, (seq, self.transform(chunk), byte_offset)):
+                return
+        # Um marcador de fim para cada gravador
+        for _ in range(self.writers):
+            self._put(self.transformed, _END)
+
+    def _write(self):
+        try:
+            finished = False
+            while not finished:
+                group = []
+                while len(group) < self.commit_every:
+                    item = self._get(self.transformed)
+                    if item is _END:
+                        finished = True
+                        break
+                    group.append(item)
+                if group and not self.stop.is_set():
+                    self._write_group(group)
+        finally:
+            # Cada thread usa a sua própria conexão com o banco
+            connection.close()
+
+    def _write_group(self, group):
+        """Grava um grupo de chunks e o checkpoint que eles completam numa única transação."""
+        locked = False
+        try:
+            with transaction.atomic():
+                for seq, chunk, byte_offset in group:
+                    self.write(chunk)
+                # O lock vai até o COMMIT (fim do atomic): o estado abaixo só vale se ele der certo
+                self._commit_lock.acquire()
+                locked = True
+                done = {**self._pending, **{seq: (len(chunk), byte_offset) for seq, chunk, byte_offset in group}}
+                confirmed = []
+                while self._next_seq + len(confirmed) in done:
+                    confirmed.append(done.pop(self._next_seq + len(confirmed)))
+                if confirmed:
+                    self.save_checkpoint(confirmed)
+            self._pending = done
+            self._next_seq += len(confirmed)
+        finally:
+            if locked:
+                self._commit_lock.release()
@@ -0,0 +1,130 @@
+# data_importer/receita.py
+import io
+import hashlib
+import itertools
+import pandas as pd
+
+# Nomes das colunas baseados no documento de metadados da Receita Federal
+COLUMN_NAMES = [
+    'cnpj', 'razao_social', 'natureza_juridica', 'qualificacao_responsavel',
+    'capital_social', 'porte_empresa', 'ente_federativo_responsavel'
+]
+# Colunas opcionais: campos vazios viram NULL no banco
+NULLABLE_COLUMNS = ['porte_empresa', 'ente_federativo_responsavel']
+# Colunas de texto NOT NULL no modelo: um campo ausente vira '' (e não NULL) nos dois engines
+REQUIRED_TEXT_COLUMNS = ['cnpj', 'razao_social', 'natureza_juridica', 'qualificacao_responsavel']
+# Colunas com poucos valores distintos: 'category' no modo tipado
+CATEGORICAL_COLUMNS = ['natureza_juridica', 'qualificacao_responsavel', 'porte_empresa', 'ente_federativo_responsavel']
+
+# 'text': tudo como str (objetos Python); 'typed': categorias e capital social numérico
+PARSE_MODES = ['text', 'typed']
+
+DEFAULT_CHUNK_SIZE = 50000
+# Limites do chunk calculado a partir de --memory-budget
+MIN_CHUNK_SIZE = 1000
+MAX_CHUNK_SIZE = 1000000
+# Linhas lidas para estimar a memória de cada linha
+MEMORY_SAMPLE_ROWS = 10000
+
+
+def compute_row_hashes(chunk: pd.DataFrame):
+    """
+    Calcula a impressão digital (64 bits) do conteúdo de cada linha a partir das
+    colunas da Receita já normalizadas. O valor é determinístico entre execuções.
+    """
+    columns = chunk[COLUMN_NAMES]
+    if pd.api.types.is_numeric_dtype(columns['capital_social']):
+        # Modo tipado: o hash usa o mesmo texto do modo 'text' ('1000.00'), para que os dois
+        # modos gerem o mesmo row_hash (as categorias e as strings Arrow já têm o mesmo hash)
+        # (NaN é o capital inválido, que o modo 'text' grava como '0')
+        capital_social = columns['capital_social']
+        columns = columns.assign(capital_social=capital_social.map('{:.2f}'.format).mask(capital_social.isna(), '0'))
+    hashes = pd.util.hash_pandas_object(columns, index=False)
+    # O banco guarda inteiros com sinal: reinterpreta os mesmos 64 bits como int64
+    return pd.Series(hashes.to_numpy().view('int64'), index=chunk.index)
+
+
+def find_csv_member(zf):
+    """Encontra o primeiro arquivo CSV dentro do zip."""
+    csv_filename = next((name for name in zf.namelist() if '.csv' in name.lower() or '.emprecsv' in name.lower()), None)
+    if not csv_filename:
+        raise FileNotFoundError(f'Nenhum arquivo CSV encontrado em {zf.filename}')
+    return csv_filename
+
+
+def file_sha256(path):
+    """Calcula o SHA-256 do arquivo (usado para validar checkpoints e caches)."""
+    with open(path, 'rb') as f:
+        return hashlib.file_digest(f, 'sha256').hexdigest()
+
+
+def column_dtypes(mode='text', arrow_strings=False):
+    """
+    Tipos das colunas na leitura do CSV. Com `arrow_strings`, os textos ficam em
+    buffers do Arrow em vez de um objeto Python por valor.
+    """
+    string = pd.StringDtype('pyarrow') if arrow_strings else str
+    dtypes = {name: string for name in COLUMN_NAMES}
+    if mode == 'typed':
+        dtypes.update({name: 'category' for name in CATEGORICAL_COLUMNS})
+        # Sem tipo fixo: o pandas lê '1000,00' como float (decimal=',')
+        del dtypes['capital_social']
+    return dtypes
+
+
+def parse_csv_bytes(data: bytes, mode='text', arrow_strings=False):
+    """
+    Converte um bloco de linhas do CSV da Receita num DataFrame. No modo 'typed' o
+    capital social sai sempre como float64, com NaN nos valores inválidos.
+    """
+    chunk = pd.read_csv(
+        io.BytesIO(data),
+        header=None,
+        names=COLUMN_NAMES,
+        sep=';',
+        encoding='latin-1',
+        dtype=column_dtypes(mode, arrow_strings),
+        decimal=',' if mode == 'typed' else '.',
+    )
+    if mode == 'typed' and not pd.api.types.is_float_dtype(chunk['capital_social']):
+        # Um valor inválido (ou um chunk só de inteiros) deixou a coluna com outro tipo
+        capital_social = chunk['capital_social'].astype(str).str.replace(',', '.', regex=False)
+        chunk['capital_social'] = pd.to_numeric(capital_social, errors='coerce').astype('float64')
+    return chunk
+
+
+def chunk_size_for_budget(csv_file, memory_budget_mb, chunks_in_flight=1, working_bytes_per_row=0,
+                          mode='text', arrow_strings=False):
+    """
+    Linhas por chunk para que `chunks_in_flight` chunks lidos, mais a memória de trabalho
+    da normalização e da gravação (`working_bytes_per_row`), caibam em `memory_budget_mb`.
+    A memória de cada linha lida é medida (deep) numa amostra do início do CSV, com os
+    mesmos tipos da importação.
+    """
+    lines = list(itertools.islice(csv_file, MEMORY_SAMPLE_ROWS))
+    if not lines:
+        return DEFAULT_CHUNK_SIZE
+    sample = parse_csv_bytes(b''.join(lines), mode, arrow_strings)
+    bytes_per_row = sample.memory_usage(index=False, deep=True).sum() / len(sample)
+    rows = int(memory_budget_mb * 1024 * 1024 / (bytes_per_row * chunks_in_flight + working_bytes_per_row))
+    return max(MIN_CHUNK_SIZE, min(rows, MAX_CHUNK_SIZE))
+
+
+def read_csv_chunks(csv_file, chunk_size=DEFAULT_CHUNK_SIZE, start_offset=0, mode='text', arrow_strings=False):
+    """
+    Lê o CSV em blocos de `chunk_size` linhas e gera (chunk, byte_offset_final).
+
+    O corte é feito por linha (os arquivos da Receita não têm quebras de linha
+    dentro dos campos), então o offset retornado é exatamente onde o próximo
+    chunk começa e pode ser gravado como checkpoint.
+    """
+    offset = start_offset
+    if start_offset:
+        csv_file.seek(start_offset)
+    while True:
+        lines = list(itertools.islice(csv_file, chunk_size))
+        if not lines:
+            return
+        data = b''.join(lines)
+        offset += len(data)
+        yield parse_csv_bytes(data, mode, arrow_strings), offset
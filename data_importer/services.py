@@ -1,31 +1,269 @@
 #teste pro importer.py
-import time
+import os
+import json
+import codecs
+import hashlib
+import itertools
+import logging
+import tempfile
 import requests
+from pathlib import Path
+from contextlib import contextmanager
+from typing import Iterator, List, Optional
+from django.conf import settings
+from pydantic import TypeAdapter
+from requests.adapters import HTTPAdapter
 from requests.exceptions import RequestException
-from typing import List
-import logging
-import os
+from urllib3.util.retry import Retry
+
+from data_importer.schemas import FullUFSchema, FullMunicipioSchema, FullDistrictSchema
 
 logger = logging.getLogger(__name__)
 
 IBGE_API_URL = "https://servicodados.ibge.gov.br/api/v1/localidades"
 DEFAULT_TIMEOUT = 60
+DEFAULT_RETRIES = 5
+# Espera entre tentativas: backoff_factor * 2^(tentativa - 1) segundos (0.5, 1, 2, 4...)
+DEFAULT_BACKOFF_FACTOR = 0.5
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# Itens validados de cada vez no modo streaming
+DEFAULT_VALIDATION_BATCH_SIZE = 1000
+STREAM_BLOCK_SIZE = 64 * 1024
+
+_states_adapter = TypeAdapter(List[FullUFSchema])
+_municipalities_adapter = TypeAdapter(List[FullMunicipioSchema])
+_districts_adapter = TypeAdapter(List[FullDistrictSchema])
+
+
+def iter_json_array(fp, block_size=STREAM_BLOCK_SIZE) -> Iterator:
+    """
+    Lê um array JSON (`[{...}, {...}]`) de um arquivo binário em UTF-8 e gera um item
+    de cada vez, sem carregar o documento inteiro. Apenas o item que está sendo
+    decodificado e o bloco atual ficam em memória.
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder('utf-8')()
+    buffer, pos, eof = '', 0, False
+
+    def fill():
+        nonlocal buffer, pos, eof
+        data = fp.read(block_size)
+        eof = not data
+        # Descarta o que já foi consumido antes de juntar o próximo bloco
+        buffer = buffer[pos:] + utf8.decode(data, final=eof)
+        pos = 0
+
+    def skip(chars):
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos] in chars:
+                pos += 1
+            if pos < len(buffer) or eof:
+                return
+            fill()
+
+    skip(' \t\r\n')
+    if buffer[pos:pos + 1] != '[':
+        raise ValueError('O documento JSON não começa com um array.')
+    pos += 1
+
+    while True:
+        skip(' \t\r\n,')
+        if pos >= len(buffer):
+            raise ValueError('Array JSON incompleto.')
+        if buffer[pos] == ']':
+            return
+        try:
+            item, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            # O item pode estar cortado no fim do bloco: lê mais e tenta de novo
+            if eof:
+                raise
+            fill()
+            continue
+        if end == len(buffer) and not eof:
+            # Um número no fim do bloco pode continuar no próximo
+            fill()
+            continue
+        pos = end
+        yield item
+
+
+class ResponseCache:
+    """
+    Cache em disco das respostas da API, uma entrada por URL.
+
+    Guarda o corpo bruto (`<sha256>.body`) e os validadores HTTP (`<sha256>.json`,
+    com ETag e Last-Modified). Numa nova execução o corpo só volta a ser descarregado
+    se o servidor não responder 304 (Not Modified).
+    """
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+
+    def _paths(self, url):
+        key = hashlib.sha256(url.encode()).hexdigest()
+        return self.directory / f'{key}.json', self.directory / f'{key}.body'
+
+    def get(self, url):
+        """Retorna os validadores guardados para a URL, ou None se não houver entrada válida."""
+        meta_path, body_path = self._paths(url)
+        try:
+            meta = json.loads(meta_path.read_text())
+        except (OSError, ValueError):
+            return None
+        return meta if body_path.exists() else None
+
+    def read_body(self, url):
+        return self._paths(url)[1].read_bytes()
+
+    def open_body(self, url):
+        return open(self._paths(url)[1], 'rb')
+
+    def set(self, url, headers, chunks):
+        """
+        Grava o corpo (um iterável de blocos de bytes) e os validadores da resposta.
+        Retorna False, sem consumir `chunks`, se a resposta não tiver ETag nem Last-Modified.
+        """
+        meta = {
+            'url': url,
+            'etag': headers.get('ETag'),
+            'last_modified': headers.get('Last-Modified'),
+        }
+        if not meta['etag'] and not meta['last_modified']:
+            # Sem validadores não há como revalidar: não vale a pena guardar
+            return False
+        self.directory.mkdir(parents=True, exist_ok=True)
+        meta_path, body_path = self._paths(url)
+        # Grava o corpo antes dos validadores, cada um de forma atômica
+        self._write_atomic(body_path, chunks)
+        self._write_atomic(meta_path, [json.dumps(meta).encode()])
+        return True
+
+    def _write_atomic(self, path, chunks):
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in chunks:
+                    f.write(chunk)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
 
 class IBGEApiClient:
+    """
+    Cliente da API de localidades do IBGE.
+
+    Usa uma única `requests.Session` (conexões reaproveitadas) com novas tentativas
+    e backoff exponencial para erros temporários e 429 (respeitando o Retry-After).
+    As respostas ficam no cache em disco de `settings.IBGE_CACHE_DIR` e são
+    revalidadas com If-None-Match/If-Modified-Since.
+    """
+
+    def __init__(self, base_url: str = IBGE_API_URL, cache_dir: Optional[str] = None,
+                 timeout: int = DEFAULT_TIMEOUT, retries: int = DEFAULT_RETRIES,
+                 backoff_factor: float = DEFAULT_BACKOFF_FACTOR):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        if cache_dir is None:
+            cache_dir = getattr(settings, 'IBGE_CACHE_DIR', '')
+        self.cache = ResponseCache(cache_dir) if cache_dir else None
+
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=['GET'],
+            respect_retry_after_header=True,
+        )
+        self.session = requests.Session()
+        self.session.mount('https://', HTTPAdapter(max_retries=retry))
+        self.session.mount('http://', HTTPAdapter(max_retries=retry))
+
+    def _request(self, endpoint: str, stream: bool = False):
+        """
+        Faz o GET condicional. Retorna (url, resposta); a resposta é None quando o
+        conteúdo em cache pode ser usado (304 ou API indisponível).
+        """
+        url = f"{self.base_url}/{endpoint}"
+        cached = self.cache.get(url) if self.cache else None
+
+        headers = {}
+        if cached:
+            if cached.get('etag'):
+                headers['If-None-Match'] = cached['etag']
+            if cached.get('last_modified'):
+                headers['If-Modified-Since'] = cached['last_modified']
 
-    def _make_request(self, endpoint: str) -> List[dict]:
-        url = f"{IBGE_API_URL}/{endpoint}"
         try:
-            response = requests.get(url, timeout=DEFAULT_TIMEOUT)
-            response.raise_for_status()  
-            time.sleep(3)
-            return response.json()
+            response = self.session.get(url, headers=headers, timeout=self.timeout, stream=stream)
+            if response.status_code == 304 and cached:
+                logger.info(f"Resposta de {url} não mudou (304). Usando o cache em disco.")
+                response.close()
+                return url, None
+            response.raise_for_status()
         except RequestException as e:
+            if cached:
+                logger.warning(f"Erro na requisição à API para {url}: {e}. Usando a cópia em cache.")
+                return url, None
             logger.error(f"Erro na requisição à API para {url}: {e}")
             raise
+        return url, response
+
+    def _fetch(self, endpoint: str) -> bytes:
+        """Retorna o corpo da resposta, usando o cache em disco quando o servidor responde 304."""
+        url, response = self._request(endpoint)
+        if response is None:
+            return self.cache.read_body(url)
+        if self.cache:
+            self.cache.set(url, response.headers, [response.content])
+        return response.content
+
+    @contextmanager
+    def _open(self, endpoint: str):
+        """
+        Abre o corpo da resposta como um arquivo binário, sem carregá-lo inteiro em memória.
+        Com o cache ativo, a resposta é gravada em disco por blocos e lida de lá.
+        """
+        url, response = self._request(endpoint, stream=True)
+        if response is not None:
+            with response:
+                stored = self.cache and self.cache.set(url, response.headers, response.iter_content(STREAM_BLOCK_SIZE))
+                if not stored:
+                    # Sem cache (ou resposta sem validadores): lê direto da conexão
+                    response.raw.decode_content = True
+                    yield response.raw
+                    return
+        with self.cache.open_body(url) as f:
+            yield f
+
+    def _make_request(self, endpoint: str) -> List[dict]:
+        body = self._fetch(endpoint)
+        try:
+            return json.loads(body)
         except ValueError as e:
-            logger.error(f"Erro ao decodificar JSON de {url}: {e}")
+            logger.error(f"Erro ao decodificar JSON de {self.base_url}/{endpoint}: {e}")
             raise
 
+    def get_states(self) -> List[FullUFSchema]:
+        return _states_adapter.validate_python(self._make_request("estados?orderBy=nome"))
+
+    def get_municipalities(self) -> List[FullMunicipioSchema]:
+        return _municipalities_adapter.validate_python(self._make_request("municipios?orderBy=nome"))
+
     def get_districts(self) -> List[dict]:
-        return self._make_request("distritos?orderBy=nome")
\ No newline at end of file
+        return self._make_request("distritos?orderBy=nome")
+
+    def iter_districts(self, batch_size: int = DEFAULT_VALIDATION_BATCH_SIZE) -> Iterator[FullDistrictSchema]:
+        """
+        Gera os distritos já validados, lendo o JSON de forma incremental.
+
+        Os itens são validados em lotes de `batch_size` com um único TypeAdapter, então
+        nunca existe em memória a lista completa de dicts nem a de objetos pydantic.
+        """
+        with self._open("distritos?orderBy=nome") as f:
+            items = iter_json_array(f)
+            while batch := list(itertools.islice(items, batch_size)):
+                yield from _districts_adapter.validate_python(batch)
@@ -0,0 +1,197 @@
+# data_importer/snapshot.py
+import re
+import time
+import logging
+from django.db import IntegrityError, OperationalError, connection, transaction
+
+from .models import Company
+
+logger = logging.getLogger(__name__)
+
+_INDEX_DEF = re.compile(r'^(CREATE (?:UNIQUE )?INDEX) \S+ ON (?:ONLY )?\S+ (USING .*)$')
+
+# Limite de tamanho dos identificadores do PostgreSQL
+MAX_IDENTIFIER_LENGTH = 63
+
+
+def suffixed_name(name, suffix):
+    """Nome de índice/constraint com sufixo, cortado para caber nos 63 caracteres do PostgreSQL."""
+    return f'{name[:MAX_IDENTIFIER_LENGTH - len(suffix)]}{suffix}'
+
+
+def rewrite_index_definition(definition, name, table):
+    """Troca o nome e a tabela de um CREATE INDEX (como devolvido por pg_get_indexdef)."""
+    match = _INDEX_DEF.match(definition)
+    if match is None:
+        raise ValueError(f'Definição de índice não reconhecida: {definition}')
+    create, using = match.groups()
+    return f'{create} {name} ON {table} {using}'
+
+
+class CompanySnapshot:
+    """
+    Troca blue/green da tabela de empresas (apenas PostgreSQL).
+
+    A base nova é carregada numa tabela sombra, sem índices nem chave primária, que
+    só depois da carga recebe as mesmas constraints e índices da tabela em uso e um
+    ANALYZE. A troca é um par de renomeações numa transação curta: quem lê a tabela
+    nunca vê a carga pela metade nem espera por ela, e a tabela anterior fica guardada
+    (com o sufixo _previous) para um rollback instantâneo.
+    """
+    shadow_suffix = '_shadow'
+    previous_suffix = '_previous'
+    # Quanto a troca espera pelo lock antes de desistir e tentar de novo; enquanto ela
+    # espera, as novas leituras ficam na fila atrás dela
+    lock_timeout = '5s'
+    swap_attempts = 5
+
+    def __init__(self):
+        self.table = Company._meta.db_table
+        self.shadow_table = f'{self.table}{self.shadow_suffix}'
+        self.previous_table = f'{self.table}{self.previous_suffix}'
+
+    def prepare(self):
+        """Recria a tabela sombra vazia, com as colunas (e defaults) da tabela de empresas."""
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS {self.shadow_table}')
+            cursor.execute(
+                f'CREATE TABLE {self.shadow_table} '
+                f'(LIKE {self.table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING STORAGE)'
+            )
+
+    def discard(self):
+        """Remove a tabela sombra (carga com falha ou já trocada)."""
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS {self.shadow_table}')
+
+    def finish(self):
+        """
+        Cria na sombra as constraints e os índices da tabela em uso e atualiza as
+        estatísticas. Retorna quantas linhas duplicadas (mesmo CNPJ) foram descartadas.
+        """
+        with connection.cursor() as cursor:
+            constraints = self._constraints(cursor, self.table)
+            indexes = self._indexes(cursor, self.table)
+
+        removed = 0
+        for name, definition in constraints:
+            try:
+                with transaction.atomic(), connection.cursor() as cursor:
+                    self._add_constraint(cursor, name, definition)
+            except IntegrityError:
+                # CNPJ repetido na carga: fica uma linha por CNPJ (a de maior ctid, em geral a última gravada)
+                with transaction.atomic(), connection.cursor() as cursor:
+                    removed += self._remove_duplicates(cursor)
+                    self._add_constraint(cursor, name, definition)
+
+        with connection.cursor() as cursor:
+            for name, definition in indexes:
+                cursor.execute(rewrite_index_definition(
+                    definition, suffixed_name(name, self.shadow_suffix), self.shadow_table
+                ))
+            cursor.execute(f'ANALYZE {self.shadow_table}')
+        return removed
+
+    def swap(self):
+        """Põe a sombra no lugar da tabela em uso; a tabela anterior vira a _previous."""
+        def rotate(cursor):
+            cursor.execute(f'DROP TABLE IF EXISTS {self.previous_table}')
+            self._rename(cursor, self.table, '', self.previous_table, self.previous_suffix)
+            self._rename(cursor, self.shadow_table, self.shadow_suffix, self.table, '')
+
+        self._in_transaction(rotate)
+
+    def rollback(self):
+        """Volta para a tabela anterior; a que estava em uso passa a ser a _previous (rodar de novo desfaz)."""
+        if not self._exists(self.previous_table):
+            raise ValueError(f'Não há snapshot anterior ({self.previous_table}) para voltar.')
+        self.discard()
+
+        def rotate(cursor):
+            # Em três passos: em uso -> sombra, anterior -> em uso, sombra -> anterior
+            self._rename(cursor, self.table, '', self.shadow_table, self.shadow_suffix)
+            self._rename(cursor, self.previous_table, self.previous_suffix, self.table, '')
+            self._rename(cursor, self.shadow_table, self.shadow_suffix, self.previous_table, self.previous_suffix)
+
+        self._in_transaction(rotate)
+
+    def drop_previous(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS {self.previous_table}')
+
+    def row_estimates(self):
+        """Linhas estimadas (pg_class.reltuples) da tabela em uso, da anterior e da sombra; None se não existir."""
+        tables = [self.table, self.previous_table, self.shadow_table]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT relname, reltuples::bigint FROM pg_class WHERE relkind = %s AND relname = ANY(%s)',
+                ['r', tables],
+            )
+            found = dict(cursor.fetchall())
+        return {table: found.get(table) for table in tables}
+
+    def _in_transaction(self, operations):
+        """Executa as renomeações numa transação curta, com lock_timeout e novas tentativas."""
+        for attempt in range(1, self.swap_attempts + 1):
+            try:
+                with transaction.atomic(), connection.cursor() as cursor:
+                    cursor.execute(f"SET LOCAL lock_timeout = '{self.lock_timeout}'")
+                    operations(cursor)
+                return
+            except OperationalError as e:
+                # Uma leitura longa segurou o lock: desiste, libera a fila e tenta de novo
+                if attempt == self.swap_attempts:
+                    raise
+                logger.warning(f'Troca da tabela de empresas sem lock (tentativa {attempt}): {e}')
+                time.sleep(attempt)
+
+    def _rename(self, cursor, table, suffix, new_table, new_suffix):
+        """Renomeia a tabela e os seus índices (os das constraints vão junto) trocando o sufixo."""
+        for index in self._index_names(cursor, table):
+            base = index[:-len(suffix)] if suffix and index.endswith(suffix) else index
+            cursor.execute(f'ALTER INDEX {index} RENAME TO {suffixed_name(base, new_suffix)}')
+        cursor.execute(f'ALTER TABLE {table} RENAME TO {new_table}')
+
+    def _add_constraint(self, cursor, name, definition):
+        cursor.execute(
+            f'ALTER TABLE {self.shadow_table} '
+            f'ADD CONSTRAINT {suffixed_name(name, self.shadow_suffix)} {definition}'
+        )
+
+    def _remove_duplicates(self, cursor):
+        pk = Company._meta.pk.column
+        cursor.execute(
+            f'DELETE FROM {self.shadow_table} a USING {self.shadow_table} b '
+            f'WHERE a.{pk} = b.{pk} AND a.ctid < b.ctid'
+        )
+        return cursor.rowcount
+
+    def _exists(self, table):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT to_regclass(%s) IS NOT NULL', [table])
+            return cursor.fetchone()[0]
+
+    def _constraints(self, cursor, table):
+        """Chave primária e UNIQUE da tabela: (nome, definição)."""
+        cursor.execute(
+            'SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint '
+            "WHERE conrelid = %s::regclass AND contype IN ('p', 'u') ORDER BY contype, conname",
+            [table],
+        )
+        return cursor.fetchall()
+
+    def _indexes(self, cursor, table):
+        """Índices da tabela que não pertencem a uma constraint: (nome, CREATE INDEX)."""
+        cursor.execute(
+            'SELECT i.relname, pg_get_indexdef(i.oid) FROM pg_index x '
+            'JOIN pg_class i ON i.oid = x.indexrelid '
+            'WHERE x.indrelid = %s::regclass '
+            'AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = x.indexrelid) '
+            'ORDER BY i.relname',
+            [table],
+        )
+        return cursor.fetchall()
+
+    def _index_names(self, cursor, table):
+        cursor.execute('SELECT indexrelid::regclass::text FROM pg_index WHERE indrelid = %s::regclass', [table])
+        return [name for (name,) in cursor.fetchall()]
@@ -0,0 +1,113 @@
+# data_importer/synthetic.py
+import io
+import csv
+import os
+import zipfile
+import numpy as np
+import pandas as pd
+
+from .receita import COLUMN_NAMES
+
+# Valores frequentes na base real, com pesos aproximados
+NATUREZAS_JURIDICAS = (['2062', '2135', '2305', '2240', '3999', '2054', '1244'], [0.45, 0.30, 0.10, 0.05, 0.05, 0.04, 0.01])
+QUALIFICACOES = (['49', '50', '65', '16', '05', '10'], [0.55, 0.25, 0.10, 0.05, 0.03, 0.02])
+PORTES = (['01', '03', '05', ''], [0.55, 0.10, 0.30, 0.05])
+ENTES_FEDERATIVOS = ['', 'UNIÃO', 'SÃO PAULO - SP', 'BELO HORIZONTE - MG', 'PARANÁ']
+
+NAME_PREFIXES = np.array([
+    'COMERCIO DE', 'DISTRIBUIDORA DE', 'INDÚSTRIA DE', 'SERVIÇOS DE', 'TRANSPORTES', 'CONSTRUÇÕES',
+    'RESTAURANTE', 'PADARIA', 'CONFECÇÕES', 'AUTO PEÇAS', 'FARMÁCIA', 'ASSOCIAÇÃO',
+])
+NAME_WORDS = np.array([
+    'ALIMENTOS', 'SÃO JOÃO', 'AÇAÍ', 'MÁQUINAS', 'INFORMÁTICA', 'CONFIANÇA', 'BRASIL', 'NORDESTE',
+    'PARANÁ', 'GOIÂNIA', 'ELETRÔNICOS', 'MÓVEIS', 'CALÇADOS', 'ESPERANÇA', 'LOGÍSTICA', 'SAÚDE',
+])
+NAME_SUFFIXES = np.array(['LTDA', 'ME', 'EIRELI', 'S.A.', 'EPP', ''])
+
+# Passo usado para percorrer os 10^8 CNPJs básicos sem repetir (primo com 10^8)
+_CNPJ_SPACE = 10 ** 8
+_CNPJ_STRIDE = 48_271_263
+
+
+def _choice(rng, values_weights, size):
+    values, weights = values_weights
+    return rng.choice(np.array(values, dtype=object), size=size, p=weights)
+
+
+def synthetic_companies(rng, cnpjs):
+    """Monta um DataFrame com as colunas do CSV da Receita para os CNPJs informados."""
+    size = len(cnpjs)
+    names = (
+        rng.choice(NAME_PREFIXES, size).astype(object) + ' '
+        + rng.choice(NAME_WORDS, size).astype(object) + ' '
+        + rng.choice(NAME_SUFFIXES, size).astype(object)
+    )
+    # Capital social com vírgula decimal; a maioria das empresas tem valores pequenos
+    capital = np.round(rng.lognormal(mean=9, sigma=2.5, size=size), 2)
+    capital[rng.random(size) < 0.15] = 0
+    capital_social = pd.Series(capital).map('{:.2f}'.format).str.replace('.', ',', regex=False)
+
+    ente = np.full(size, '', dtype=object)
+    public = rng.random(size) < 0.01
+    ente[public] = rng.choice(np.array(ENTES_FEDERATIVOS[1:], dtype=object), int(public.sum()))
+
+    return pd.DataFrame({
+        'cnpj': pd.Series(cnpjs).map('{:08d}'.format),
+        'razao_social': pd.Series(names).str.strip(),
+        'natureza_juridica': _choice(rng, NATUREZAS_JURIDICAS, size),
+        'qualificacao_responsavel': _choice(rng, QUALIFICACOES, size),
+        'capital_social': capital_social,
+        'porte_empresa': _choice(rng, PORTES, size),
+        'ente_federativo_responsavel': ente,
+    }, columns=COLUMN_NAMES)
+
+
+def generate_empresas_zip(path, rows, existing_cnpjs=None, collide_fraction=0.0, seed=0, chunk_size=100000):
+    """
+    Gera um .zip no formato do arquivo Empresas da Receita (latin-1, ';', todos os campos
+    entre aspas, capital social com vírgula decimal), escrito em blocos.
+
+    Uma fração `collide_fraction` das linhas reutiliza CNPJs de `existing_cnpjs` (com
+    outros dados, para virarem atualizações na importação); as demais têm CNPJs novos,
+    que não existem em `existing_cnpjs` nem se repetem no arquivo.
+    Retorna {'rows', 'colliding', 'bytes'}.
+    """
+    rng = np.random.default_rng(seed)
+    existing = np.unique(np.asarray(existing_cnpjs if existing_cnpjs is not None else [], dtype=np.int64))
+    colliding = min(int(round(rows * collide_fraction)), len(existing))
+    reused = rng.choice(existing, size=colliding, replace=False) if colliding else np.array([], dtype=np.int64)
+    # Posições (no arquivo) das linhas que colidem, espalhadas ao longo do arquivo
+    collide_at = np.zeros(rows, dtype=bool)
+    collide_at[rng.choice(rows, size=colliding, replace=False)] = True
+
+    next_index = int(rng.integers(_CNPJ_SPACE))
+    reused_pos = 0
+    csv_name = os.path.basename(path).rsplit('.', 1)[0] + '.EMPRECSV'
+
+    with zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+        with zf.open(csv_name, 'w', force_zip64=True) as raw:
+            for start in range(0, rows, chunk_size):
+                is_colliding = collide_at[start:start + chunk_size]
+                size = len(is_colliding)
+                cnpjs = np.empty(size, dtype=np.int64)
+
+                n_reused = int(is_colliding.sum())
+                cnpjs[is_colliding] = reused[reused_pos:reused_pos + n_reused]
+                reused_pos += n_reused
+
+                # CNPJs novos: percorre o espaço de 10^8 com um passo fixo e descarta os já existentes
+                new_cnpjs = np.empty(0, dtype=np.int64)
+                while len(new_cnpjs) < size - n_reused:
+                    wanted = size - n_reused - len(new_cnpjs)
+                    candidates = (next_index + _CNPJ_STRIDE * np.arange(wanted, dtype=np.int64)) % _CNPJ_SPACE
+                    next_index = int((next_index + _CNPJ_STRIDE * wanted) % _CNPJ_SPACE)
+                    new_cnpjs = np.concatenate([new_cnpjs, candidates[~np.isin(candidates, existing)]])
+                cnpjs[~is_colliding] = new_cnpjs
+
+                buffer = io.StringIO()
+                synthetic_companies(rng, cnpjs).to_csv(
+                    buffer, sep=';', header=False, index=False, quoting=csv.QUOTE_ALL, lineterminator='\n'
+                )
+                raw.write(buffer.getvalue().encode('latin-1'))
+
+    return {'rows': rows, 'colliding': colliding, 'bytes': os.path.getsize(path)}
@@ -0,0 +1,152 @@
+# data_importer/telemetry.py
+import json
+import time
+import bisect
+import logging
+import threading
+from contextlib import contextmanager
+from django.utils import timezone
+
+from .benchmark import current_rss_mb, peak_rss_mb
+from .models import ImportRun
+
+# Os eventos são linhas JSON neste logger (ver LOGGING em core/settings.py)
+event_logger = logging.getLogger('data_importer.events')
+
+
+def emit_event(event, **fields):
+    """Registra um evento estruturado (uma linha JSON) com o horário e a memória atual do processo."""
+    payload = {'event': event, 'ts': timezone.now().isoformat(), 'rss_mb': current_rss_mb(), **fields}
+    event_logger.info(json.dumps(payload, ensure_ascii=False, default=str))
+
+
+@contextmanager
+def timed(timings, stage):
+    """Soma em `timings[stage]` os segundos gastos no bloco (não faz nada se `timings` for None)."""
+    if timings is None:
+        yield
+        return
+    started_at = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - started_at
+
+
+def add_timings(total, timings):
+    for stage, seconds in timings.items():
+        total[stage] = total.get(stage, 0.0) + seconds
+    return total
+
+
+def rounded(timings):
+    return {stage: round(seconds, 4) for stage, seconds in timings.items()}
+
+
+class Histogram:
+    """
+    Histograma cumulativo no formato do Prometheus, por rótulo, em memória.
+    Cada processo (worker do gunicorn/uvicorn) mantém o seu, e o /metrics responde com o do worker
+    que atendeu a coleta. Os dados da última importação vêm do banco e valem para todos.
+    """
+
+    def __init__(self, name, help_text, label, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self.buckets = sorted(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_value, value):
+        with self._lock:
+            counts, total = self._series.get(label_value, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._series[label_value] = (counts, total + value)
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = {key: (list(counts), total) for key, (counts, total) in self._series.items()}
+        for label_value, (counts, total) in sorted(series.items()):
+            label = f'{self.label}="{_escape(label_value)}"'
+            cumulative = 0
+            for bound, count in zip(self.buckets + [float('inf')], counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(float(bound))
+                lines.append(f'{self.name}_bucket{{{label},le="{le}"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{label}}} {total}')
+            lines.append(f'{self.name}_count{{{label}}} {cumulative}')
+        return lines
+
+
+LIST_VIEW_LATENCY = Histogram(
+    'arko_list_view_request_duration_seconds',
+    'Tempo de resposta das páginas de listagem.',
+    'view',
+    [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10],
+)
+
+
+def record_import_run(command, started_at, success, rows=0, created=0, updated=0, unchanged=0, stage_seconds=None):
+    """Guarda o resumo da execução (lido por /metrics) e emite o evento final da importação."""
+    run = ImportRun.objects.create(
+        command=command,
+        started_at=started_at,
+        finished_at=timezone.now(),
+        success=success,
+        rows=rows,
+        created=created,
+        updated=updated,
+        unchanged=unchanged,
+        stage_seconds=rounded(stage_seconds or {}),
+        peak_rss_mb=peak_rss_mb(),
+    )
+    emit_event(
+        'import_finished', command=command, success=success, rows=rows, created=created, updated=updated,
+        unchanged=unchanged, seconds=round((run.finished_at - started_at).total_seconds(), 4),
+        stage_seconds=run.stage_seconds,
+    )
+    return run
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _gauge(lines, name, help_text, samples):
+    lines.append(f'# HELP {name} {help_text}')
+    lines.append(f'# TYPE {name} gauge')
+    for labels, value in samples:
+        label_text = ','.join(f'{key}="{_escape(val)}"' for key, val in labels.items())
+        lines.append(f'{name}{{{label_text}}} {value}')
+
+
+def render_metrics():
+    """Monta o texto no formato de exposição do Prometheus (version=0.0.4)."""
+    commands = ImportRun.objects.order_by('command').values_list('command', flat=True).distinct()
+    runs = [ImportRun.objects.filter(command=command).first() for command in commands]
+
+    lines = []
+    _gauge(lines, 'arko_import_last_run_timestamp_seconds', 'Fim da última importação (epoch).',
+           [({'command': run.command}, run.finished_at.timestamp()) for run in runs])
+    _gauge(lines, 'arko_import_last_run_success', '1 se a última importação terminou sem falhas.',
+           [({'command': run.command}, int(run.success)) for run in runs])
+    _gauge(lines, 'arko_import_last_run_duration_seconds', 'Duração da última importação.',
+           [({'command': run.command}, (run.finished_at - run.started_at).total_seconds()) for run in runs])
+    _gauge(lines, 'arko_import_last_run_rows', 'Linhas da última importação, por resultado.', [
+        ({'command': run.command, 'result': result}, getattr(run, result))
+        for run in runs for result in ('rows', 'created', 'updated', 'unchanged')
+    ])
+    _gauge(lines, 'arko_import_last_run_stage_seconds', 'Segundos gastos em cada etapa da última importação.', [
+        ({'command': run.command, 'stage': stage}, seconds)
+        for run in runs for stage, seconds in sorted(run.stage_seconds.items())
+    ])
+    _gauge(lines, 'arko_import_last_run_peak_rss_mb', 'Pico de memória residente do processo da última importação (MiB).',
+           [({'command': run.command}, run.peak_rss_mb) for run in runs if run.peak_rss_mb is not None])
+    lines.extend(LIST_VIEW_LATENCY.render())
+    return '\n'.join(lines) + '\n'
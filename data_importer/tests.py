@@ -1,11 +1,74 @@
 # data_importer/tests.py
-from django.test import TestCase
+import io
+import os
+import asyncio
+import importlib
+import warnings
+import csv
+import gzip
+import re
+import json
+import logging
+import tempfile
+import threading
+import zipfile
+from io import StringIO
+from urllib.parse import urlencode
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from unittest import mock, skipUnless
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.handlers.asgi import ASGIHandler
+from django.core.cache import cache, caches
+from django.core.exceptions import PermissionDenied
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.http import HttpResponse
+from django.test.utils import CaptureQueriesContext
+from django.urls import clear_url_caches, resolve, reverse
+from django.contrib.auth.models import AnonymousUser
+from django.test import AsyncRequestFactory, TestCase, TransactionTestCase, override_settings
+import django_filters
+import numpy as np
 import pandas as pd
+import pyarrow.parquet as pq
+from requests.exceptions import RequestException
 from decimal import Decimal
 
 # Importa o comando que queremos testar e o modelo
+from data_importer.management.commands import populate_companies
 from data_importer.management.commands.populate_companies import Command as PopulateCompaniesCommand
-from data_importer.models import Company
+from data_importer.management.commands.generate_empresas import Command as GenerateEmpresasCommand
+from data_importer.models import Region, State, Municipality, District, Company, ImportCheckpoint
+from data_importer.bitmap import CnpjBitmap, CnpjMembership, cnpj_numbers
+from data_importer.download import DownloadError, RangeDownloader
+from data_importer.parquet_cache import ArchiveCache
+from data_importer.loaders import CopyCompanyLoader, OrmCompanyLoader, SnapshotCompanyLoader, get_loader
+from data_importer.filters import CompanyFilter
+from data_importer.pagination import EstimatedCountPaginator, decode_cursor, encode_cursor
+from data_importer.services import IBGEApiClient, iter_json_array
+from data_importer.receita import (
+    MAX_CHUNK_SIZE, MIN_CHUNK_SIZE, PARSE_MODES, chunk_size_for_budget, file_sha256, find_csv_member, parse_csv_bytes
+)
+from data_importer.schemas import FullDistrictSchema
+from data_importer.cache import DATASET_COMPANIES, bump_dataset_version, page_cache_stats
+from data_importer.telemetry import LIST_VIEW_LATENCY
+from data_importer.middleware import SqlInstrumentationMiddleware, normalize_sql
+from data_importer.models import ImportRun
+from data_importer.export import accepts_gzip
+from data_importer.async_views import (
+    AsyncCompanyExportView, AsyncCompanyListView, AsyncDistrictListView, AsyncStateListView, AsyncMunicipalityApiView,
+    AsyncMunicipalityAutocompleteView,
+)
+from data_importer import urls as data_importer_urls
+from data_importer.management.commands.loadtest import latency_summary
+from data_importer.snapshot import CompanySnapshot, rewrite_index_definition, suffixed_name
+
+# Os eventos JSON das importações (um por chunk) poluiriam a saída dos testes;
+# os testes de telemetria capturam-nos com assertLogs
+logging.getLogger('data_importer.events').setLevel(logging.WARNING)
 
 class PopulateCompaniesCommandTests(TestCase):
     """
@@ -81,4 +144,2207 @@ class PopulateCompaniesCommandTests(TestCase):
         empresa_atualizada = Company.objects.get(cnpj='11111111')
         self.assertEqual(empresa_atualizada.razao_social, 'NOME NOVO ATUALIZADO')
         self.assertEqual(empresa_atualizada.capital_social, Decimal('5000.00'))
-        self.assertEqual(empresa_atualizada.porte_empresa, '05')
\ No newline at end of file
+        self.assertEqual(empresa_atualizada.porte_empresa, '05')
+
+    def test_process_chunk_normalizes_empty_fields_and_invalid_capital(self):
+        """
+        Verifica se campos opcionais vazios viram NULL e se um capital social inválido vira zero.
+        """
+        data = {
+            'cnpj': ['33333333'],
+            'razao_social': ['EMPRESA C ME'],
+            'natureza_juridica': ['2135'],
+            'qualificacao_responsavel': ['50'],
+            'capital_social': ['abc'],
+            'porte_empresa': [None],
+            'ente_federativo_responsavel': [''],
+        }
+        chunk = pd.DataFrame(data)
+
+        self.command.process_chunk(chunk)
+
+        empresa = Company.objects.get(cnpj='33333333')
+        self.assertEqual(empresa.capital_social, Decimal('0'))
+        self.assertIsNone(empresa.porte_empresa)
+        self.assertIsNone(empresa.ente_federativo_responsavel)
+
+    def test_process_chunk_skips_rows_whose_content_did_not_change(self):
+        """
+        Verifica se uma linha idêntica à gravada é contada como inalterada e não é regravada,
+        e se uma linha alterada é atualizada.
+        """
+        def make_chunk(razao_social):
+            return pd.DataFrame({
+                'cnpj': ['11111111'],
+                'razao_social': [razao_social],
+                'natureza_juridica': ['2062'],
+                'qualificacao_responsavel': ['49'],
+                'capital_social': ['1000,00'],
+                'porte_empresa': ['01'],
+                'ente_federativo_responsavel': [''],
+            })
+
+        self.assertEqual(self.command.process_chunk(make_chunk('EMPRESA A LTDA')), (1, 0, 0))
+        self.assertEqual(self.command.process_chunk(make_chunk('EMPRESA A LTDA')), (0, 0, 1))
+        self.assertEqual(self.command.process_chunk(make_chunk('EMPRESA A EIRELI')), (0, 1, 0))
+        self.assertEqual(Company.objects.get(cnpj='11111111').razao_social, 'EMPRESA A EIRELI')
+
+class CompanyLoaderTests(TestCase):
+    """
+    Testes para a escolha do engine de gravação e para a serialização do COPY.
+    """
+
+    def test_copy_engine_falls_back_to_orm_outside_postgres(self):
+        """
+        Verifica se o engine 'copy' cai para o ORM quando o banco não é PostgreSQL (ex.: SQLite).
+        """
+        loader = get_loader('copy')
+        self.assertIsInstance(loader, OrmCompanyLoader)
+
+    def test_copy_buffer_serializes_nulls_and_decimals(self):
+        """
+        Verifica se o buffer do COPY escreve campos vazios como NULL e o capital com 2 casas.
+        """
+        chunk = pd.DataFrame({
+            'cnpj': ['11111111'],
+            'razao_social': ['EMPRESA A LTDA'],
+            'natureza_juridica': ['2062'],
+            'qualificacao_responsavel': ['49'],
+            'capital_social': [1000.5],
+            'porte_empresa': ['01'],
+            'ente_federativo_responsavel': [None],
+            'row_hash': [-42],
+        })
+
+        buffer = CopyCompanyLoader()._to_csv_buffer(chunk)
+
+        self.assertEqual(buffer.read(), '11111111,EMPRESA A LTDA,2062,49,1000.50,01,,-42\n')
+
+    def test_empty_required_text_is_stored_as_empty_string(self):
+        """
+        Verifica se um campo NOT NULL vazio (ex.: razão social) vira '' na normalização, nos dois modos
+        de leitura, em vez de NaN (que o COPY gravaria como NULL).
+        """
+        content = b'"00000001";"";"2062";"49";"10,00";"01";""\n"00000002";"EMPRESA";"";"49";"1,00";"";""\n'
+        hashes = []
+        for mode in PARSE_MODES:
+            command = PopulateCompaniesCommand(stdout=StringIO())
+            command.parse_mode = mode
+            chunk = command.normalize_chunk(parse_csv_bytes(content, mode=mode))
+            self.assertEqual(chunk['razao_social'].tolist(), ['', 'EMPRESA'])
+            self.assertEqual(chunk['natureza_juridica'].astype(object).tolist(), ['2062', ''])
+            hashes.append(chunk['row_hash'].tolist())
+        self.assertEqual(hashes[0], hashes[1])
+
+    @skipUnless(connection.vendor == 'postgresql', 'O engine copy usa COPY FROM STDIN do PostgreSQL.')
+    def test_copy_engine_accepts_empty_required_text(self):
+        """
+        Verifica se o engine copy grava uma razão social vazia como '' (como o ORM), sem violar o NOT NULL.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'Empresas0.zip')
+            write_empresas_zip(path, [['00000001', '', '2062', '49', '10,00', '01', '']])
+            with override_settings(RECEITA_CACHE_DIR=''):
+                call_command('populate_companies', path, engine='copy', stdout=StringIO())
+
+        self.assertEqual(Company.objects.get(cnpj='00000001').razao_social, '')
+
+
+def write_empresas_zip(path, rows):
+    """Cria um .zip no formato da Receita (latin-1, separado por ';') com as linhas informadas."""
+    content = '\n'.join(';'.join(f'"{value}"' for value in row) for row in rows) + '\n'
+    with zipfile.ZipFile(path, 'w') as zf:
+        zf.writestr(os.path.basename(path).replace('.zip', '.EMPRECSV'), content.encode('latin-1'))
+
+
+@override_settings(RECEITA_CACHE_DIR='')
+class PopulateCompaniesMultiArchiveTests(TestCase):
+    """
+    Testes para a importação de vários arquivos .zip numa única execução do comando.
+    """
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        write_empresas_zip(os.path.join(self.tmp_dir.name, 'Empresas0.zip'), [
+            ['11111111', 'EMPRESA A LTDA', '2062', '49', '1000,00', '01', ''],
+        ])
+        write_empresas_zip(os.path.join(self.tmp_dir.name, 'Empresas1.zip'), [
+            ['22222222', 'EMPRESA B SÃO PAULO', '2054', '10', '2500,50', '03', ''],
+            ['33333333', 'EMPRESA C ME', '2135', '50', '0,00', '', ''],
+        ])
+
+    def test_imports_every_archive_matched_by_glob(self):
+        """
+        Verifica se um padrão glob importa todos os arquivos e se o resumo lista cada um deles.
+        """
+        out = StringIO()
+        call_command('populate_companies', os.path.join(self.tmp_dir.name, 'Empresas*.zip'), stdout=out)
+
+        self.assertEqual(Company.objects.count(), 3)
+        self.assertEqual(Company.objects.get(cnpj='22222222').razao_social, 'EMPRESA B SÃO PAULO')
+        self.assertIn('Empresas0.zip: 1 linhas, 1 criadas', out.getvalue())
+        self.assertIn('Empresas1.zip: 2 linhas, 2 criadas', out.getvalue())
+
+    def test_missing_delete_removes_companies_absent_from_every_archive(self):
+        """
+        Verifica se --missing=delete remove apenas os CNPJs que não apareceram em nenhum arquivo.
+        """
+        Company.objects.create(
+            cnpj='99999999', razao_social='EMPRESA BAIXADA', natureza_juridica='2062',
+            qualificacao_responsavel='49', capital_social=Decimal('1.00')
+        )
+        out = StringIO()
+        call_command(
+            'populate_companies', os.path.join(self.tmp_dir.name, 'Empresas*.zip'), '--missing=delete', stdout=out
+        )
+
+        self.assertFalse(Company.objects.filter(cnpj='99999999').exists())
+        self.assertEqual(Company.objects.count(), 3)
+        self.assertIn('1 empresas ausentes dos arquivos importados foram removidas', out.getvalue())
+
+
+@override_settings(RECEITA_CACHE_DIR='')
+class CnpjBitmapTests(TestCase):
+    """
+    Testes para o bitmap de CNPJs que separa, sem consultar a base, as empresas novas das existentes.
+    """
+
+    def test_bitmap_add_and_contains(self):
+        """
+        Verifica se o bitmap marca e encontra os números, inclusive nos extremos do intervalo.
+        """
+        bitmap = CnpjBitmap()
+        bitmap.add([0, 11111111, 99999999])
+
+        self.assertEqual(bitmap.contains([0, 11111111, 11111112, 99999999]).tolist(), [True, True, False, True])
+        self.assertEqual(len(bitmap), 3)
+
+    def test_cnpj_numbers_only_accepts_eight_digits(self):
+        """
+        Verifica se apenas CNPJs com 8 dígitos são convertidos (os demais não cabem no bitmap).
+        """
+        numbers, valid = cnpj_numbers(['00000001', '0000001', 'ABC12345', None])
+
+        self.assertEqual(valid.tolist(), [True, False, False, False])
+        self.assertEqual(numbers[0], 1)
+
+    def test_route_looks_up_only_known_cnpjs_and_counts_repeats(self):
+        """
+        Verifica se só os CNPJs já gravados (ou fora do formato) vão para a consulta e se os lidos
+        duas vezes na execução são contados.
+        """
+        Company.objects.create(
+            cnpj='11111111', razao_social='EMPRESA A LTDA', natureza_juridica='2062',
+            qualificacao_responsavel='49', capital_social=Decimal('1.00')
+        )
+        membership = CnpjMembership.from_database()
+
+        first = membership.route(pd.Series(['11111111', '22222222', '123']))
+        second = membership.route(pd.Series(['22222222']))
+
+        self.assertEqual(first.tolist(), [True, False, True])
+        self.assertEqual(second.tolist(), [True])
+        self.assertEqual(membership.repeated, 1)
+
+    def test_orm_loader_skips_lookup_for_new_companies(self):
+        """
+        Verifica se, com o bitmap, um chunk só de empresas novas é gravado sem a consulta por CNPJ
+        e se um CNPJ repetido no chunk fica com a última linha.
+        """
+        command = PopulateCompaniesCommand()
+        command.loader = OrmCompanyLoader(membership=CnpjMembership.from_database())
+        chunk = pd.DataFrame({
+            'cnpj': ['11111111', '22222222', '11111111'],
+            'razao_social': ['NOME ANTIGO', 'EMPRESA B SA', 'NOME NOVO'],
+            'natureza_juridica': ['2062', '2054', '2062'],
+            'qualificacao_responsavel': ['49', '10', '49'],
+            'capital_social': ['1000,00', '2500,50', '1000,00'],
+            'porte_empresa': ['01', '03', '01'],
+            'ente_federativo_responsavel': ['', '', ''],
+        })
+
+        with CaptureQueriesContext(connection) as queries:
+            created, updated, unchanged = command.process_chunk(chunk)
+
+        self.assertEqual((created, updated, unchanged), (2, 0, 0))
+        self.assertFalse(any('SELECT' in query['sql'] for query in queries.captured_queries))
+        self.assertEqual(Company.objects.get(cnpj='11111111').razao_social, 'NOME NOVO')
+        self.assertEqual(command.loader.membership.repeated, 1)
+
+    def test_cnpj_repeated_across_archives_is_updated(self):
+        """
+        Verifica se um CNPJ que reaparece em outro arquivo da mesma execução é atualizado (e não
+        recriado) e se o resumo avisa a repetição.
+        """
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            write_empresas_zip(os.path.join(tmp_dir, 'Empresas0.zip'), [
+                ['11111111', 'NOME ANTIGO', '2062', '49', '1000,00', '01', ''],
+            ])
+            write_empresas_zip(os.path.join(tmp_dir, 'Empresas1.zip'), [
+                ['11111111', 'NOME NOVO', '2062', '49', '1000,00', '01', ''],
+            ])
+            out = StringIO()
+            call_command('populate_companies', os.path.join(tmp_dir, 'Empresas*.zip'), stdout=out)
+
+        self.assertEqual(Company.objects.get(cnpj='11111111').razao_social, 'NOME NOVO')
+        self.assertIn('Empresas1.zip: 1 linhas, 0 criadas, 1 atualizadas', out.getvalue())
+        self.assertIn('Empresas1.zip: 1 linhas com CNPJ já lido nesta execução', out.getvalue())
+
+    def test_pool_worker_uses_bitmap_built_by_the_main_process(self):
+        """
+        Verifica se os processos do pool usam o bitmap recebido do processo principal (sem ler a
+        tabela de empresas de novo) e se ele acumula os CNPJs de todos os arquivos do processo.
+        """
+        Company.objects.create(
+            cnpj='11111111', razao_social='NOME ANTIGO', natureza_juridica='2062',
+            qualificacao_responsavel='49', capital_social=Decimal('1000.00')
+        )
+        known_cnpjs = CnpjMembership.from_database().known.to_bytes()
+        command = PopulateCompaniesCommand()
+        options = vars(command.create_parser('manage.py', 'populate_companies').parse_args(['unused.zip']))
+        self.addCleanup(setattr, populate_companies, '_worker_known_cnpjs', None)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            first, second = os.path.join(tmp_dir, 'Empresas0.zip'), os.path.join(tmp_dir, 'Empresas1.zip')
+            write_empresas_zip(first, [
+                ['11111111', 'NOME NOVO', '2062', '49', '1000,00', '01', ''],
+                ['22222222', 'EMPRESA B SA', '2054', '10', '2500,50', '03', ''],
+            ])
+            write_empresas_zip(second, [['22222222', 'EMPRESA B S.A.', '2054', '10', '2500,50', '03', '']])
+            with mock.patch.object(populate_companies.django, 'setup'), \
+                    mock.patch.object(populate_companies.connections, 'close_all'), \
+                    mock.patch.object(CnpjMembership, 'from_database', side_effect=AssertionError('tabela relida')), \
+                    mock.patch('sys.stdout', new_callable=StringIO):
+                populate_companies._init_worker(known_cnpjs)
+                first_result = populate_companies._import_archive_worker(first, options)
+                second_result = populate_companies._import_archive_worker(second, options)
+
+        self.assertEqual((first_result['created'], first_result['updated']), (1, 1))
+        self.assertEqual((second_result['created'], second_result['updated']), (0, 1))
+        self.assertEqual(Company.objects.get(cnpj='22222222').razao_social, 'EMPRESA B S.A.')
+
+    def test_bitmap_round_trips_through_bytes(self):
+        """
+        Verifica se o bitmap convertido em bytes (para o initializer do pool) volta com os mesmos números.
+        """
+        bitmap = CnpjBitmap()
+        bitmap.add([1, 99999999])
+
+        restored = CnpjBitmap.from_bytes(bitmap.to_bytes())
+        restored.add([2])
+
+        self.assertEqual(restored.contains([1, 2, 99999999]).tolist(), [True, True, True])
+        self.assertFalse(bitmap.contains([2])[0])
+
+
+class PopulateCompaniesCheckpointTests(TestCase):
+    """
+    Testes para os commits por chunk e para a retomada (--resume) a partir do checkpoint.
+    """
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.zip_path = os.path.join(self.tmp_dir.name, 'Empresas0.zip')
+        write_empresas_zip(self.zip_path, [
+            [f'{i:08d}', f'EMPRESA {i}', '2062', '49', '10,00', '01', ''] for i in range(1, 6)
+        ])
+
+    def _command(self, resume=False):
+        command = PopulateCompaniesCommand(stdout=StringIO(), stderr=StringIO())
+        command.chunk_size = 2
+        command.resume = resume
+        return command
+
+    def test_resume_continues_after_last_committed_chunk(self):
+        """
+        Verifica se uma falha no segundo chunk mantém o primeiro gravado e se o --resume
+        continua do byte seguinte, sem reprocessar o que já foi confirmado.
+        """
+        command = self._command()
+        original_load = command.loader.load
+        calls = []
+
+        def flaky_load(chunk, timings=None):
+            calls.append(len(chunk))
+            if len(calls) == 2:
+                raise RuntimeError('falha simulada')
+            return original_load(chunk, timings=timings)
+
+        with mock.patch.object(command.loader, 'load', side_effect=flaky_load):
+            with self.assertRaises(RuntimeError):
+                command.import_archive(self.zip_path)
+
+        checkpoint = ImportCheckpoint.objects.get(archive='Empresas0.zip')
+        self.assertEqual(checkpoint.rows_processed, 2)
+        self.assertFalse(checkpoint.completed)
+        self.assertEqual(Company.objects.count(), 2)
+
+        resumed = self._command(resume=True)
+        result = resumed.import_archive(self.zip_path)
+
+        self.assertEqual(result['rows'], 3)
+        self.assertEqual(result['created'], 3)
+        self.assertEqual(Company.objects.count(), 5)
+        checkpoint.refresh_from_db()
+        self.assertTrue(checkpoint.completed)
+        self.assertEqual(checkpoint.rows_processed, 5)
+
+    def test_completed_archive_is_skipped_on_resume(self):
+        """
+        Verifica se um arquivo já concluído (com o mesmo hash) é pulado quando se usa --resume.
+        """
+        self._command().import_archive(self.zip_path)
+
+        result = self._command(resume=True).import_archive(self.zip_path)
+
+        self.assertEqual(result['rows'], 0)
+
+
+class ArchiveCacheTests(TestCase):
+    """
+    Testes para o cache Parquet dos arquivos da Receita (um por SHA-256 do zip).
+    """
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.cache_dir = os.path.join(self.tmp_dir.name, 'cache')
+        self.zip_path = os.path.join(self.tmp_dir.name, 'Empresas0.zip')
+        write_empresas_zip(self.zip_path, [
+            [f'{i:08d}', f'EMPRESA {i}', '2062', '49', '10,00', '01' if i % 2 else '', ''] for i in range(1, 6)
+        ])
+        self.archive_hash = file_sha256(self.zip_path)
+
+    def _command(self, resume=False):
+        command = PopulateCompaniesCommand(stdout=StringIO(), stderr=StringIO())
+        command.chunk_size = 2
+        command.resume = resume
+        command.archive_cache = ArchiveCache(self.cache_dir)
+        return command
+
+    def test_first_import_writes_cache_and_next_import_reads_it(self):
+        """
+        Verifica se a primeira importação grava um row group por chunk e se a seguinte lê do cache,
+        com o mesmo row_hash (nenhuma empresa muda).
+        """
+        self._command().import_archive(self.zip_path)
+        cache = ArchiveCache(self.cache_dir)
+        self.assertEqual(pq.ParquetFile(cache.path(self.archive_hash)).num_row_groups, 3)
+
+        command = self._command()
+        result = command.import_archive(self.zip_path)
+
+        self.assertIn('do cache colunar', command.stdout.getvalue())
+        self.assertEqual((result['rows'], result['unchanged']), (5, 5))
+        self.assertIsNone(Company.objects.get(cnpj='00000002').porte_empresa)
+
+    def test_new_version_of_an_archive_replaces_its_cache_entry(self):
+        """
+        Verifica se, ao gravar o cache de uma nova versão de um arquivo (mesmo nome, outro SHA-256),
+        a entrada antiga é apagada e as de outros arquivos ficam.
+        """
+        other_zip = os.path.join(self.tmp_dir.name, 'Empresas1.zip')
+        write_empresas_zip(other_zip, [['00000009', 'OUTRA EMPRESA', '2062', '49', '1,00', '', '']])
+        self._command().import_archive(self.zip_path)
+        self._command().import_archive(other_zip)
+        write_empresas_zip(self.zip_path, [['00000001', 'EMPRESA 1 NOVA', '2062', '49', '10,00', '01', '']])
+
+        self._command().import_archive(self.zip_path)
+
+        cache = ArchiveCache(self.cache_dir)
+        self.assertEqual(
+            sorted(os.path.basename(path) for path in os.listdir(self.cache_dir)),
+            sorted(os.path.basename(cache.path(file_sha256(path))) for path in (self.zip_path, other_zip)),
+        )
+        self.assertFalse(os.path.exists(cache.path(self.archive_hash)))
+
+    def test_size_limit_evicts_least_recently_used_entries(self):
+        """
+        Verifica se, acima do limite de tamanho, as entradas usadas há mais tempo são apagadas
+        (a leitura conta como uso) e se a entrada recém-gravada fica mesmo sozinha acima do limite.
+        """
+        cache = ArchiveCache(self.cache_dir)
+        chunk = parse_csv_bytes(b'"00000001";"EMPRESA";"2062";"49";"1,00";"";""\n')
+        for archive_hash in ('a', 'b', 'c'):
+            list(cache.write_chunks(archive_hash, [(chunk, 10)], archive_name=f'{archive_hash}.zip'))
+        for age, archive_hash in enumerate(('a', 'b', 'c')):
+            os.utime(cache.path(archive_hash), (1000 + age, 1000 + age))
+        list(cache.read_chunks('a'))
+        entry_size = os.path.getsize(cache.path('a'))
+
+        limited = ArchiveCache(self.cache_dir, max_bytes=2 * entry_size)
+        list(limited.write_chunks('d', [(chunk, 10)], archive_name='d.zip'))
+
+        self.assertEqual([os.path.exists(limited.path(h)) for h in 'abcd'], [True, False, False, True])
+        self.assertEqual(ArchiveCache(self.cache_dir, max_bytes=1).prune(keep='d'), [limited.path('a')])
+        self.assertTrue(os.path.exists(limited.path('d')))
+
+    def test_read_chunks_projects_columns(self):
+        """
+        Verifica se a leitura do cache devolve só as colunas pedidas, com o offset de cada chunk no CSV.
+        """
+        self._command().import_archive(self.zip_path)
+
+        chunks = list(ArchiveCache(self.cache_dir).read_chunks(self.archive_hash, columns=['cnpj']))
+
+        self.assertEqual([list(chunk.columns) for chunk, _ in chunks], [['cnpj']] * 3)
+        self.assertEqual(chunks[0][0]['cnpj'].tolist(), ['00000001', '00000002'])
+        with zipfile.ZipFile(self.zip_path) as zf:
+            csv_size = zf.infolist()[0].file_size
+        self.assertEqual([offset for _, offset in chunks][-1], csv_size)
+
+    def test_failed_import_leaves_no_cache(self):
+        """
+        Verifica se uma importação interrompida não deixa um cache incompleto e se a retomada
+        lê o restante do CSV.
+        """
+        command = self._command()
+        with mock.patch.object(command.loader, 'load', side_effect=[(2, 0, 0), RuntimeError('falha simulada')]):
+            with self.assertRaises(RuntimeError):
+                command.import_archive(self.zip_path)
+
+        self.assertEqual(os.listdir(self.cache_dir), [])
+        result = self._command(resume=True).import_archive(self.zip_path)
+        self.assertEqual(result['rows'], 3)
+        self.assertFalse(ArchiveCache(self.cache_dir).can_read(self.archive_hash))
+
+    def test_resume_reads_remaining_row_groups_from_cache(self):
+        """
+        Verifica se um checkpoint no limite de um chunk é retomado a partir do cache.
+        """
+        self._command().import_archive(self.zip_path)
+        offsets = ArchiveCache(self.cache_dir).byte_offsets(self.archive_hash)
+        ImportCheckpoint.objects.filter(archive='Empresas0.zip').update(
+            completed=False, byte_offset=offsets[0], rows_processed=2, chunks_processed=1
+        )
+
+        command = self._command(resume=True)
+        result = command.import_archive(self.zip_path)
+
+        self.assertIn('do cache colunar', command.stdout.getvalue())
+        self.assertEqual(result['rows'], 3)
+
+    def test_memory_budget_merges_row_groups_from_cache(self):
+        """
+        Verifica se, com --memory-budget, row groups pequenos do cache são juntados até o tamanho de
+        chunk do orçamento, com os checkpoints no fim de cada row group.
+        """
+        self._command().import_archive(self.zip_path)
+
+        command = self._command()
+        command.memory_budget_mb = 64
+        with mock.patch(
+            'data_importer.management.commands.populate_companies.chunk_size_for_budget', return_value=4
+        ):
+            result = command.import_archive(self.zip_path)
+
+        self.assertIn('do cache colunar', command.stdout.getvalue())
+        self.assertEqual((result['rows'], result['unchanged']), (5, 5))
+        checkpoint = ImportCheckpoint.objects.get(archive='Empresas0.zip')
+        self.assertEqual(checkpoint.chunks_processed, 2)
+        self.assertEqual(checkpoint.byte_offset, ArchiveCache(self.cache_dir).byte_offsets(self.archive_hash)[-1])
+
+    def test_memory_budget_below_cached_chunks_reads_the_csv(self):
+        """
+        Verifica se um cache com row groups maiores que o chunk do --memory-budget é ignorado (com
+        um aviso) e regravado com os chunks menores.
+        """
+        self._command().import_archive(self.zip_path)
+
+        command = self._command()
+        command.memory_budget_mb = 1
+        with mock.patch(
+            'data_importer.management.commands.populate_companies.chunk_size_for_budget', return_value=1
+        ):
+            result = command.import_archive(self.zip_path)
+
+        self.assertIn('acima das 1 do --memory-budget. Lendo o CSV', command.stdout.getvalue())
+        self.assertNotIn('Lendo Empresas0.zip do cache colunar', command.stdout.getvalue())
+        self.assertEqual(result['rows'], 5)
+        self.assertEqual(ArchiveCache(self.cache_dir).row_group_sizes(self.archive_hash), [1] * 5)
+
+
+@override_settings(RECEITA_CACHE_DIR='')
+class ParseModeTests(TestCase):
+    """
+    Testes para os modos de leitura (--parse typed, --arrow-strings) e para o --memory-budget.
+    """
+
+    ROWS = [
+        ['00000001', 'EMPRESA 1', '2062', '49', '1234,50', '01', ''],
+        ['00000002', 'EMPRESA 2', '2062', '49', 'invalido', '', ''],
+        ['00000003', 'EMPRESA 3', '2135', '50', '0,00', '05', ''],
+    ]
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.zip_path = os.path.join(self.tmp_dir.name, 'Empresas0.zip')
+        write_empresas_zip(self.zip_path, self.ROWS)
+
+    def _command(self, parse_mode='text', arrow_strings=False):
+        command = PopulateCompaniesCommand(stdout=StringIO(), stderr=StringIO())
+        command.parse_mode = parse_mode
+        command.arrow_strings = arrow_strings
+        return command
+
+    def _companies(self):
+        return list(Company.objects.order_by('cnpj').values_list(
+            'cnpj', 'capital_social', 'porte_empresa', 'natureza_juridica', 'row_hash'
+        ))
+
+    def test_parse_typed_uses_categories_and_float_capital(self):
+        """
+        Verifica se o modo typed lê as colunas repetitivas como category e o capital como float64.
+        """
+        content = '\n'.join(';'.join(f'"{value}"' for value in row) for row in self.ROWS).encode('latin-1')
+
+        chunk = parse_csv_bytes(content, mode='typed', arrow_strings=True)
+
+        self.assertEqual(chunk['porte_empresa'].dtype, 'category')
+        self.assertEqual(chunk['capital_social'].dtype, 'float64')
+        self.assertEqual(chunk['capital_social'].iloc[0], 1234.5)
+        self.assertTrue(pd.isna(chunk['capital_social'].iloc[1]))
+        self.assertEqual(chunk['razao_social'].dtype, pd.StringDtype('pyarrow'))
+
+    def test_all_modes_write_the_same_rows(self):
+        """
+        Verifica se os modos de leitura gravam as mesmas empresas com o mesmo row_hash,
+        inclusive com capital inválido e porte vazio, e se reimportar em outro modo não muda nada.
+        """
+        self._command().import_archive(self.zip_path)
+        expected = self._companies()
+        self.assertEqual(expected[1][1], Decimal('0.00'))
+        self.assertIsNone(expected[1][2])
+
+        for parse_mode, arrow_strings in [('typed', False), ('text', True), ('typed', True)]:
+            with self.subTest(parse_mode=parse_mode, arrow_strings=arrow_strings):
+                result = self._command(parse_mode, arrow_strings).import_archive(self.zip_path)
+                self.assertEqual(result['unchanged'], 3)
+                Company.objects.all().delete()
+                self._command(parse_mode, arrow_strings).import_archive(self.zip_path)
+                self.assertEqual(self._companies(), expected)
+
+    def test_typed_cache_round_trip(self):
+        """
+        Verifica se o cache do modo typed fica num arquivo próprio e devolve os mesmos tipos da leitura do CSV.
+        """
+        command = self._command('typed')
+        command.archive_cache = ArchiveCache(os.path.join(self.tmp_dir.name, 'cache'), 'typed')
+        command.import_archive(self.zip_path)
+        expected = self._companies()
+
+        cache = ArchiveCache(os.path.join(self.tmp_dir.name, 'cache'), 'typed')
+        self.assertTrue(cache.path(file_sha256(self.zip_path)).endswith('.typed.parquet'))
+        chunk, _ = next(cache.read_chunks(file_sha256(self.zip_path)))
+        self.assertEqual(chunk['porte_empresa'].dtype, 'category')
+        self.assertEqual(chunk['capital_social'].dtype, 'float64')
+
+        Company.objects.all().delete()
+        command.import_archive(self.zip_path)
+        self.assertIn('do cache colunar', command.stdout.getvalue())
+        self.assertEqual(self._companies(), expected)
+
+    def test_chunk_size_for_budget(self):
+        """
+        Verifica se o tamanho do chunk cresce com o orçamento e com os tipos compactos, diminui
+        com os chunks em circulação e a memória de trabalho, e fica entre os limites.
+        """
+        content = b''.join(
+            f'"{i:08d}";"EMPRESA {i}";"2062";"49";"10,00";"01";""\n'.encode('latin-1') for i in range(2000)
+        )
+
+        def size(*args, **kwargs):
+            return chunk_size_for_budget(io.BytesIO(content), *args, **kwargs)
+
+        self.assertLess(size(64), size(128))
+        self.assertLess(size(128, chunks_in_flight=4), size(128))
+        self.assertLess(size(128, working_bytes_per_row=1000), size(128))
+        self.assertGreater(size(64, mode='typed', arrow_strings=True), size(64))
+        self.assertEqual(size(1, chunks_in_flight=100), MIN_CHUNK_SIZE)
+        self.assertEqual(size(10**6), MAX_CHUNK_SIZE)
+
+    def test_memory_budget_option_sets_chunk_size(self):
+        """
+        Verifica se o --memory-budget escolhe o tamanho do chunk e o informa na saída.
+        """
+        out = StringIO()
+        call_command('populate_companies', self.zip_path, memory_budget=64, stdout=out, stderr=StringIO())
+
+        self.assertRegex(out.getvalue(), r'Chunks de [\d.,]+ linhas para caber em 64 MB')
+        self.assertEqual(Company.objects.count(), 3)
+
+
+class PopulateCompaniesPipelineTests(TransactionTestCase):
+    """
+    Testes para o modo --pipeline (as gravações acontecem em outras threads,
+    por isso é usado TransactionTestCase em vez de TestCase).
+    """
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.zip_path = os.path.join(self.tmp_dir.name, 'Empresas0.zip')
+        write_empresas_zip(self.zip_path, [
+            [f'{i:08d}', f'EMPRESA {i}', '2062', '49', '10,00', '01', ''] for i in range(1, 8)
+        ])
+
+    def test_pipeline_imports_every_chunk_and_checkpoints_in_order(self):
+        """
+        Verifica se o pipeline grava todos os chunks e se o checkpoint final aponta para o fim do CSV.
+        """
+        command = PopulateCompaniesCommand(stdout=StringIO(), stderr=StringIO())
+        command.chunk_size = 2
+        command.pipeline = True
+        command.queue_depth = 1
+
+        result = command.import_archive(self.zip_path)
+
+        self.assertEqual(result['rows'], 7)
+        self.assertEqual(result['created'], 7)
+        self.assertEqual(Company.objects.count(), 7)
+        checkpoint = ImportCheckpoint.objects.get(archive='Empresas0.zip')
+        self.assertTrue(checkpoint.completed)
+        self.assertEqual(checkpoint.chunks_processed, 4)
+        self.assertEqual(checkpoint.rows_processed, 7)
+
+    def test_pipeline_stops_and_raises_when_a_stage_fails(self):
+        """
+        Verifica se uma falha na gravação interrompe as outras etapas e é propagada ao comando.
+        """
+        command = PopulateCompaniesCommand(stdout=StringIO(), stderr=StringIO())
+        command.chunk_size = 2
+        command.pipeline = True
+
+        with mock.patch.object(command.loader, 'load', side_effect=RuntimeError('falha simulada')):
+            with self.assertRaises(RuntimeError):
+                command.import_archive(self.zip_path)
+
+        self.assertFalse(ImportCheckpoint.objects.get(archive='Empresas0.zip').completed)
+
+    def test_orm_engine_uses_a_single_writer(self):
+        """
+        Verifica se o engine orm ignora --writers > 1 (dois gravadores poderiam criar o mesmo CNPJ).
+        """
+        command = PopulateCompaniesCommand(stdout=StringIO(), stderr=StringIO())
+        parser = command.create_parser('manage.py', 'populate_companies')
+        options = vars(parser.parse_args([self.zip_path, '--pipeline', '--writers', '4', '--engine', 'orm']))
+
+        command.configure(options)
+        self.assertEqual(command.writers, 1)
+        self.assertIn("O engine 'orm' grava com uma única thread", command.stdout.getvalue())
+
+    def test_commit_every_groups_chunks_with_the_checkpoint(self):
+        """
+        Verifica se o --commit-every vale no pipeline: cada grupo de chunks é confirmado junto com
+        o checkpoint, e uma falha desfaz o grupo inteiro, de onde o --resume continua.
+        """
+        command = PopulateCompaniesCommand(stdout=StringIO(), stderr=StringIO())
+        command.chunk_size = 2
+        command.pipeline = True
+        command.commit_every = 2
+        load = command.loader.load
+        calls = []
+
+        def fail_on_third_chunk(chunk, timings=None):
+            calls.append(len(chunk))
+            if len(calls) == 3:
+                raise RuntimeError('falha simulada')
+            return load(chunk, timings=timings)
+
+        with mock.patch.object(command.loader, 'load', side_effect=fail_on_third_chunk):
+            with self.assertRaises(RuntimeError):
+                command.import_archive(self.zip_path)
+
+        checkpoint = ImportCheckpoint.objects.get(archive='Empresas0.zip')
+        self.assertEqual((checkpoint.chunks_processed, checkpoint.rows_processed), (2, 4))
+        self.assertEqual(Company.objects.count(), 4)
+
+        command = PopulateCompaniesCommand(stdout=StringIO(), stderr=StringIO())
+        command.chunk_size = 2
+        command.pipeline = True
+        command.resume = True
+        result = command.import_archive(self.zip_path)
+        self.assertEqual((result['rows'], result['created']), (3, 3))
+        self.assertEqual(Company.objects.count(), 7)
+
+    def test_checkpoint_failure_rolls_back_the_chunk(self):
+        """
+        Verifica se o checkpoint é gravado na mesma transação do chunk: se ele falhar, o chunk é desfeito.
+        """
+        command = PopulateCompaniesCommand(stdout=StringIO(), stderr=StringIO())
+        command.chunk_size = 2
+        command.pipeline = True
+        save = ImportCheckpoint.save
+        saves = []
+
+        def fail_on_second_chunk(checkpoint, *args, **kwargs):
+            if kwargs.get('update_fields') and 'byte_offset' in kwargs['update_fields']:
+                saves.append(checkpoint.chunks_processed)
+                if len(saves) == 2:
+                    raise RuntimeError('falha simulada')
+            return save(checkpoint, *args, **kwargs)
+
+        with mock.patch.object(ImportCheckpoint, 'save', fail_on_second_chunk), self.assertRaises(RuntimeError):
+            command.import_archive(self.zip_path)
+
+        self.assertEqual(Company.objects.count(), 2)
+        self.assertEqual(ImportCheckpoint.objects.get(archive='Empresas0.zip').chunks_processed, 1)
+
+
+class CompanyListViewCursorPaginationTests(TestCase):
+    """
+    Testes para a paginação por cursor (keyset) da listagem de empresas.
+    """
+
+    def setUp(self):
+        user = User.objects.create_user(username='analista', password='senha-segura-123')
+        self.client.force_login(user)
+        # Duas empresas com a mesma razão social para exercitar o desempate pelo CNPJ
+        for cnpj, razao_social in [
+            ('00000003', 'AGRO BETA'), ('00000001', 'AGRO ALFA'), ('00000002', 'AGRO ALFA'),
+            ('00000004', 'COMERCIO GAMA'), ('00000005', 'AGRO DELTA'),
+        ]:
+            Company.objects.create(
+                cnpj=cnpj, razao_social=razao_social, natureza_juridica='2062',
+                qualificacao_responsavel='49', capital_social=Decimal('1.00'), porte_empresa='05'
+            )
+        self.url = reverse('data_importer:company_list')
+
+    def _cnpjs(self, response):
+        return [company.cnpj for company in response.context['companies']]
+
+    def test_next_and_previous_cursors_walk_the_ordering(self):
+        """
+        Verifica se os cursores percorrem (razao_social, cnpj) sem pular nem repetir linhas,
+        inclusive quando a razão social se repete.
+        """
+        with mock.patch('data_importer.views.CompanyListView.paginate_by', 2):
+            first = self.client.get(self.url)
+            self.assertEqual(self._cnpjs(first), ['00000001', '00000002'])
+            self.assertFalse(first.context['page_obj'].has_previous())
+
+            second = self.client.get(self.url, {'cursor': first.context['page_obj'].next_cursor})
+            self.assertEqual(self._cnpjs(second), ['00000003', '00000005'])
+
+            third = self.client.get(self.url, {'cursor': second.context['page_obj'].next_cursor})
+            self.assertEqual(self._cnpjs(third), ['00000004'])
+            self.assertFalse(third.context['page_obj'].has_next())
+
+            back = self.client.get(self.url, {'cursor': third.context['page_obj'].previous_cursor})
+            self.assertEqual(self._cnpjs(back), ['00000003', '00000005'])
+            self.assertTrue(back.context['page_obj'].has_previous())
+
+    def test_cursor_pagination_respects_the_filter(self):
+        """
+        Verifica se o cursor funciona junto com o CompanyFilter e se o link mantém o filtro.
+        """
+        with mock.patch('data_importer.views.CompanyListView.paginate_by', 2):
+            first = self.client.get(self.url, {'razao_social': 'AGRO'})
+            second = self.client.get(self.url, {'razao_social': 'AGRO', 'cursor': first.context['page_obj'].next_cursor})
+
+        self.assertEqual(self._cnpjs(second), ['00000003', '00000005'])
+        self.assertContains(first, 'razao_social=AGRO&amp;cursor=')
+
+    def test_invalid_cursor_returns_404(self):
+        """
+        Verifica se um cursor adulterado resulta em 404, como uma página inexistente.
+        """
+        response = self.client.get(self.url, {'cursor': 'nao-e-um-cursor'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_cursor_with_wrong_size_or_value_types_returns_404(self):
+        """
+        Verifica se um cursor bem codificado, mas com o número errado de valores ou com valores que
+        não são texto, inteiro ou nulo, resulta em 404 em vez de chegar à consulta.
+        """
+        for values in (['AGRO'], ['AGRO', '00000001', 'extra'], [{'a': 1}, '00000001'], [['AGRO'], '1'], [True, '1']):
+            with self.subTest(values=values):
+                response = self.client.get(self.url, {'cursor': encode_cursor(values, 'n')})
+                self.assertEqual(response.status_code, 404)
+
+        self.assertEqual(decode_cursor(encode_cursor(['AGRO', None], 'p'), size=2), (['AGRO', None], 'p'))
+        self.assertEqual(decode_cursor(encode_cursor([35, 1], 'n'), size=2), ([35, 1], 'n'))
+
+
+class CompanyFilterTests(TestCase):
+    """
+    Testes para a busca por razão social do CompanyFilter.
+    """
+
+    def setUp(self):
+        for cnpj, razao_social in [('00000001', 'AGROPECUARIA SAO JOAO'), ('00000002', 'COMERCIO DE GRAOS')]:
+            Company.objects.create(
+                cnpj=cnpj, razao_social=razao_social, natureza_juridica='2062',
+                qualificacao_responsavel='49', capital_social=Decimal('1.00')
+            )
+
+    def test_razao_social_falls_back_to_icontains_outside_postgres(self):
+        """
+        Verifica se, fora do PostgreSQL, a busca continua sendo por substring sem diferenciar maiúsculas.
+        """
+        qs = CompanyFilter({'razao_social': 'sao jo'}, queryset=Company.objects.all()).qs
+
+        self.assertEqual([company.cnpj for company in qs], ['00000001'])
+        self.assertNotIn('data_importer_unaccent', str(qs.query))
+
+    @skipUnless(connection.vendor == 'postgresql', 'O índice pg_trgm só existe no PostgreSQL.')
+    def test_razao_social_search_uses_the_trigram_index(self):
+        """
+        Verifica se, no PostgreSQL, a busca por trecho da razão social ignora acentos e se o plano
+        usa o índice GIN company_razao_trgm_idx (a expressão do filtro é a mesma do índice).
+        """
+        qs = CompanyFilter({'razao_social': 'SÃO jo'}, queryset=Company.objects.all()).qs
+
+        self.assertEqual([company.cnpj for company in qs], ['00000001'])
+        with connection.cursor() as cursor:
+            # Com poucas linhas o planejador preferiria varrer a tabela; sem essa opção, o índice
+            # só fica de fora se a expressão do filtro não casar com a dele
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        plan = qs.explain()
+        self.assertIn('company_razao_trgm_idx', plan)
+        self.assertNotIn('Seq Scan', plan)
+
+
+class EstimatedCountPaginatorTests(TestCase):
+    """
+    Testes para o paginator com contagem estimada e cache de contagens exatas.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        for i in range(1, 6):
+            Company.objects.create(
+                cnpj=f'{i:08d}', razao_social=f'EMPRESA {i}', natureza_juridica='2062',
+                qualificacao_responsavel='49', capital_social=Decimal('1.00')
+            )
+
+    def test_exact_count_is_cached_for_the_same_filters(self):
+        """
+        Verifica se a contagem exata de uma mesma consulta é feita uma única vez.
+        """
+        queryset = Company.objects.filter(razao_social__startswith='EMPRESA')
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(EstimatedCountPaginator(queryset, 2).count, 5)
+            self.assertEqual(EstimatedCountPaginator(queryset.all(), 2).count, 5)
+        # As demais consultas são só a leitura (por chave primária) da versão do conjunto de dados
+        self.assertEqual(sum('COUNT(' in query['sql'] for query in ctx.captured_queries), 1)
+        self.assertFalse(EstimatedCountPaginator(queryset, 2).is_estimated)
+
+    def test_large_estimate_is_used_without_counting(self):
+        """
+        Verifica se uma estimativa acima do limite vira o total (sem COUNT) e se o "próximo"
+        passa a depender da linha extra lida na própria página.
+        """
+        paginator = EstimatedCountPaginator(Company.objects.all(), 2)
+        with mock.patch.object(EstimatedCountPaginator, 'estimate_count', return_value=1_000_000):
+            page = paginator.page(3)
+
+        self.assertTrue(paginator.is_estimated)
+        self.assertEqual(paginator.num_pages, 500_000)
+        self.assertEqual([company.cnpj for company in page], ['00000005'])
+        self.assertFalse(page.has_next())
+
+
+class AutocompleteTests(TestCase):
+    """
+    Testes para os endpoints de autocomplete e para os selects que só renderizam o valor escolhido.
+    """
+
+    def setUp(self):
+        user = User.objects.create_user(username='analista', password='senha-segura-123')
+        self.client.force_login(user)
+        region = Region.objects.create(id=3, name='Sudeste', acronym='SE')
+        state = State.objects.create(id=35, name='São Paulo', acronym='SP', region=region)
+        self.santos = Municipality.objects.create(id=3548500, name='Santos', state=state)
+        Municipality.objects.create(id=3548708, name='São Bernardo do Campo', state=state)
+        Municipality.objects.create(id=3550308, name='São Paulo', state=state)
+        Municipality.objects.create(id=3509502, name='Campinas', state=state)
+        District.objects.create(id=354850005, name='Santos', municipality=self.santos)
+
+    def test_municipality_autocomplete_returns_prefix_matches(self):
+        """
+        Verifica se o endpoint devolve, em JSON, os municípios que começam com o texto digitado.
+        """
+        response = self.client.get(reverse('data_importer:municipality_autocomplete'), {'q': 's'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [item['text'] for item in response.json()['results']],
+            ['Santos (SP)', 'São Bernardo do Campo (SP)', 'São Paulo (SP)'],
+        )
+
+    def test_autocomplete_requires_login(self):
+        """
+        Verifica se o endpoint, como as páginas, exige autenticação.
+        """
+        self.client.logout()
+        response = self.client.get(reverse('data_importer:state_autocomplete'))
+        self.assertEqual(response.status_code, 302)
+
+    def test_district_list_renders_only_the_selected_municipality(self):
+        """
+        Verifica se o select de município não lista todos os municípios, apenas o selecionado.
+        """
+        response = self.client.get(reverse('data_importer:district_list'), {'municipality': self.santos.pk})
+
+        self.assertContains(response, 'data-autocomplete-url="/app/autocomplete/municipalities/"')
+        self.assertContains(response, f'<option value="{self.santos.pk}" selected>Santos</option>', html=True)
+        self.assertNotContains(response, 'Campinas')
+
+
+class PageCacheTests(TestCase):
+    """
+    Testes para o cache versionado das páginas de listagem.
+    """
+
+    def setUp(self):
+        caches['pages'].clear()
+        self.addCleanup(caches['pages'].clear)
+        user = User.objects.create_user(username='analista', password='senha-segura-123')
+        self.client.force_login(user)
+        Company.objects.create(
+            cnpj='00000001', razao_social='EMPRESA ANTIGA', natureza_juridica='2062',
+            qualificacao_responsavel='49', capital_social=Decimal('1.00')
+        )
+        self.url = reverse('data_importer:company_list')
+
+    def test_equivalent_querystrings_share_the_cached_page(self):
+        """
+        Verifica se a segunda requisição (mesmos filtros, em outra ordem e com campos vazios)
+        é servida do cache e se os contadores registram o hit e o miss.
+        """
+        first = self.client.get(self.url, {'razao_social': 'EMPRESA', 'porte_empresa': ''})
+        second = self.client.get(f'{self.url}?porte_empresa=&razao_social=EMPRESA')
+
+        self.assertEqual(first['X-Page-Cache'], 'MISS')
+        self.assertEqual(second['X-Page-Cache'], 'HIT')
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(page_cache_stats(), {'hits': 1, 'misses': 1})
+
+    def test_import_version_bump_invalidates_the_cached_page(self):
+        """
+        Verifica se, depois de uma importação (versão incrementada), a página é gerada de novo.
+        """
+        self.client.get(self.url)
+        Company.objects.filter(cnpj='00000001').update(razao_social='EMPRESA NOVA')
+
+        self.assertNotContains(self.client.get(self.url), 'EMPRESA NOVA')
+        bump_dataset_version(DATASET_COMPANIES)
+        response = self.client.get(self.url)
+
+        self.assertEqual(response['X-Page-Cache'], 'MISS')
+        self.assertContains(response, 'EMPRESA NOVA')
+
+
+def ibge_district(district_id, name, municipality_id, municipality_name, state_id=35, state_acronym='SP'):
+    """Monta um item no formato retornado pelo endpoint de distritos do IBGE."""
+    region = {'id': 3, 'sigla': 'SE', 'nome': 'Sudeste'}
+    state = {'id': state_id, 'sigla': state_acronym, 'nome': f'Estado {state_acronym}', 'regiao': region}
+    return {
+        'id': district_id,
+        'nome': name,
+        'municipio': {
+            'id': municipality_id,
+            'nome': municipality_name,
+            'microrregiao': {'id': 1, 'nome': 'Micro', 'mesorregiao': {'id': 1, 'nome': 'Meso', 'UF': state}},
+        },
+    }
+
+
+class ImporterCommandTests(TestCase):
+    """
+    Testes para o comando `importer` (upsert em lote das localidades do IBGE).
+    """
+
+    def run_importer(self, districts):
+        out = StringIO()
+        with mock.patch('data_importer.management.commands.importer.IBGEApiClient') as client_class:
+            client_class.return_value.iter_districts.return_value = (
+                FullDistrictSchema.model_validate(district) for district in districts
+            )
+            call_command('importer', stdout=out)
+        return out.getvalue()
+
+    def test_repeated_parents_are_written_once_per_level(self):
+        """
+        Verifica se região, estado e municípios repetidos em vários distritos são gravados
+        uma única vez, com um número de consultas que não depende da quantidade de distritos.
+        """
+        districts = [
+            ibge_district(id_, f'Distrito {id_}', 3550308 + id_ % 2, f'Município {id_ % 2}')
+            for id_ in range(1, 41)
+        ]
+        with CaptureQueriesContext(connection) as ctx:
+            output = self.run_importer(districts)
+
+        # Por nível: uma leitura dos valores atuais e um único upsert
+        location_queries = [
+            query['sql'] for query in ctx.captured_queries
+            if any(f'"data_importer_{table}"' in query['sql'] for table in ('region', 'state', 'municipality', 'district'))
+        ]
+        self.assertEqual(len(location_queries), 8)
+
+        self.assertEqual(Region.objects.count(), 1)
+        self.assertEqual(State.objects.count(), 1)
+        self.assertEqual(Municipality.objects.count(), 2)
+        self.assertEqual(District.objects.count(), 40)
+        self.assertIn('1 novas regiões criadas, 0 atualizadas.', output)
+        self.assertIn('40 novos distritos criados, 0 atualizados.', output)
+
+    def test_second_run_updates_only_changed_names(self):
+        """
+        Verifica se uma segunda importação atualiza apenas os nomes que mudaram e se o
+        resumo conta criados e atualizados corretamente.
+        """
+        self.run_importer([
+            ibge_district(1, 'Distrito A', 10, 'Município X'),
+            ibge_district(2, 'Distrito B', 10, 'Município X'),
+        ])
+
+        output = self.run_importer([
+            ibge_district(1, 'Distrito A', 10, 'Município X'),
+            ibge_district(2, 'Distrito B Renomeado', 10, 'Município X'),
+            ibge_district(3, 'Distrito C', 11, 'Município Y', state_id=33, state_acronym='RJ'),
+        ])
+
+        self.assertIn('0 novas regiões criadas, 0 atualizadas.', output)
+        self.assertIn('1 novos estados criados, 0 atualizados.', output)
+        self.assertIn('1 novos municípios criados, 0 atualizados.', output)
+        self.assertIn('1 novos distritos criados, 1 atualizados.', output)
+        self.assertEqual(District.objects.get(id=2).name, 'Distrito B Renomeado')
+        self.assertEqual(District.objects.get(id=3).municipality.state.acronym, 'RJ')
+
+
+class StubIBGEHandler(BaseHTTPRequestHandler):
+    """Servidor HTTP local que imita a API do IBGE (com ETag e falhas temporárias)."""
+    etag = '"v1"'
+
+    def do_GET(self):
+        server = self.server
+        server.requests.append((self.path, dict(self.headers)))
+        if server.failures_left:
+            server.failures_left -= 1
+            self.send_response(503)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        if self.headers.get('If-None-Match') == self.etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        body = json.dumps(server.payload).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', self.etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class IBGEApiClientTests(TestCase):
+    """
+    Testes para o cliente da API do IBGE contra um servidor HTTP local.
+    """
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StubIBGEHandler)
+        self.server.requests = []
+        self.server.failures_left = 0
+        self.server.payload = [
+            {'id': 35, 'sigla': 'SP', 'nome': 'São Paulo', 'regiao': {'id': 3, 'sigla': 'SE', 'nome': 'Sudeste'}}
+        ]
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        self.cache_dir = cache_dir.name
+        self.base_url = f'http://127.0.0.1:{self.server.server_port}/api/v1/localidades'
+
+    def make_client(self, **kwargs):
+        return IBGEApiClient(base_url=self.base_url, cache_dir=self.cache_dir, backoff_factor=0, **kwargs)
+
+    def test_second_run_revalidates_with_etag_and_uses_disk_cache(self):
+        """
+        Verifica se uma nova execução (outro cliente) envia o If-None-Match e, com a resposta 304,
+        retorna os estados guardados em disco.
+        """
+        first = self.make_client().get_states()
+        second = self.make_client().get_states()
+
+        self.assertEqual([state.sigla for state in first], ['SP'])
+        self.assertEqual(second, first)
+        self.assertNotIn('If-None-Match', self.server.requests[0][1])
+        self.assertEqual(self.server.requests[1][1]['If-None-Match'], '"v1"')
+
+    def test_temporary_errors_are_retried(self):
+        """
+        Verifica se respostas 503 são repetidas (backoff) até o servidor responder.
+        """
+        self.server.failures_left = 2
+
+        states = self.make_client().get_states()
+
+        self.assertEqual(states[0].regiao.nome, 'Sudeste')
+        self.assertEqual(len(self.server.requests), 3)
+
+    def test_cached_copy_is_used_when_the_api_keeps_failing(self):
+        """
+        Verifica se, esgotadas as tentativas, a cópia em cache é usada; e se sem cache o erro sobe.
+        """
+        self.make_client().get_states()
+        self.server.failures_left = 10
+
+        self.assertEqual(self.make_client(retries=1).get_states()[0].id, 35)
+        with self.assertRaises(RequestException):
+            IBGEApiClient(base_url=self.base_url, cache_dir='', retries=1, backoff_factor=0).get_states()
+
+    def test_iter_districts_streams_and_validates_in_batches(self):
+        """
+        Verifica se os distritos chegam por um gerador, validados, tanto da rede (1ª execução)
+        quanto do cache em disco (304 na 2ª).
+        """
+        self.server.payload = [
+            ibge_district(id_, f'Distrito {id_}', 10, 'Município X') for id_ in range(1, 6)
+        ]
+
+        for _ in range(2):
+            districts = self.make_client().iter_districts(batch_size=2)
+            self.assertNotIsInstance(districts, list)
+            self.assertEqual([district.id for district in districts], [1, 2, 3, 4, 5])
+        self.assertEqual(self.server.requests[1][1]['If-None-Match'], '"v1"')
+
+    def test_iter_json_array_handles_items_split_across_blocks(self):
+        """
+        Verifica se o parser incremental reconstrói itens, números e caracteres UTF-8
+        cortados entre blocos.
+        """
+        data = [{'nome': 'São João d\'Aliança', 'id': 5300108}, 123456789, [], 'ç', {'a': [1, {'b': None}]}]
+        raw = json.dumps(data, ensure_ascii=False, indent=1).encode()
+
+        for block_size in (1, 3, 7, len(raw)):
+            with self.subTest(block_size=block_size):
+                self.assertEqual(list(iter_json_array(io.BytesIO(raw), block_size=block_size)), data)
+        self.assertEqual(list(iter_json_array(io.BytesIO(b' [ ] '))), [])
+        with self.assertRaises(ValueError):
+            list(iter_json_array(io.BytesIO(b'[{"id": 1}, {"id"')))
+
+
+class StubRangeHandler(BaseHTTPRequestHandler):
+    """Servidor HTTP local que serve um arquivo com suporte a Range e ETag (e pode cortar as respostas)."""
+
+    def do_HEAD(self):
+        self.respond(send_body=False)
+
+    def do_GET(self):
+        self.respond(send_body=True)
+
+    def respond(self, send_body):
+        server = self.server
+        body = server.body
+        server.requests.append((self.command, self.headers.get('Range')))
+        if_range = self.headers.get('If-Range')
+        if self.command == 'GET':
+            server.if_range_headers.append(if_range)
+        # Como manda a RFC 9110: um ETag fraco no If-Range nunca confere, e a resposta vem inteira
+        same_file = if_range is None or if_range in (server.etag, server.last_modified) and not if_range.startswith('W/')
+        start, end, status = 0, len(body) - 1, 200
+        match = re.fullmatch(r'bytes=(\d+)-(\d+)', self.headers.get('Range') or '')
+        if send_body and match and same_file:
+            start, end, status = int(match.group(1)), int(match.group(2)), 206
+        self.send_response(status)
+        self.send_header('Accept-Ranges', 'bytes')
+        if server.etag:
+            self.send_header('ETag', server.etag)
+        if server.last_modified:
+            self.send_header('Last-Modified', server.last_modified)
+        self.send_header('Content-Length', str(end - start + 1))
+        if status == 206:
+            self.send_header('Content-Range', f'bytes {start}-{end}/{len(body)}')
+        self.end_headers()
+        if send_body:
+            payload = body[start:end + 1]
+            # Conexão que cai no meio da resposta
+            self.wfile.write(payload[:len(payload) // 2] if server.truncate else payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class RangeDownloaderTests(TestCase):
+    """
+    Testes para o download em segmentos paralelos (HTTP Range) dos arquivos da Receita.
+    """
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StubRangeHandler)
+        self.server.requests = []
+        self.server.truncate = False
+        self.server.etag = '"v1"'
+        self.server.last_modified = None
+        self.server.if_range_headers = []
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w') as zf:
+            # Conteúdo aleatório (sem compressão) para o zip ter alguns segmentos
+            zf.writestr('K3241.K03200Y0.D50913.EMPRECSV', os.urandom(64 * 1024))
+        self.server.body = buffer.getvalue()
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.path = os.path.join(tmp_dir.name, 'Empresas0.zip')
+        self.url = f'http://127.0.0.1:{self.server.server_port}/Empresas0.zip'
+
+    def make_downloader(self, **kwargs):
+        return RangeDownloader(
+            connections=4, min_segment_size=16 * 1024, backoff_factor=0, progress=False, **kwargs
+        )
+
+    def ranges(self):
+        return [header for method, header in self.server.requests if method == 'GET']
+
+    def test_downloads_segments_in_parallel(self):
+        """
+        Verifica se o arquivo é baixado em um segmento por conexão e montado byte a byte igual ao do servidor.
+        """
+        status = self.make_downloader().download(self.url, self.path)
+
+        self.assertEqual(status, 'downloaded')
+        with open(self.path, 'rb') as f:
+            self.assertEqual(f.read(), self.server.body)
+        self.assertEqual(len(self.ranges()), 4)
+        self.assertTrue(all(header.startswith('bytes=') for header in self.ranges()))
+        self.assertFalse(os.path.exists(f'{self.path}.part'))
+
+    def test_resumes_interrupted_download(self):
+        """
+        Verifica se, depois de uma falha no meio dos segmentos, a próxima execução pede só os bytes que faltam.
+        """
+        self.server.truncate = True
+        with mock.patch('data_importer.download.BLOCK_SIZE', 1024), self.assertRaises(DownloadError):
+            self.make_downloader(retries=0).download(self.url, self.path)
+        with open(f'{self.path}.part.json') as f:
+            segments = json.load(f)['segments']
+        self.assertTrue(any(segment['offset'] > segment['start'] for segment in segments))
+
+        self.server.truncate = False
+        self.server.requests.clear()
+        status = self.make_downloader().download(self.url, self.path)
+
+        self.assertEqual(status, 'resumed')
+        with open(self.path, 'rb') as f:
+            self.assertEqual(f.read(), self.server.body)
+        self.assertEqual(
+            sorted(self.ranges()), sorted(f"bytes={segment['offset']}-{segment['end']}" for segment in segments)
+        )
+
+    def test_write_error_becomes_download_error(self):
+        """
+        Verifica se um erro ao gravar a parte (ex.: disco cheio) vira DownloadError, com o progresso
+        salvo para a retomada, e se o comando o mostra como CommandError.
+        """
+        real_open = open
+
+        class FullDisk:
+            def __init__(self, f):
+                self.f = f
+
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc_info):
+                self.f.close()
+
+            def seek(self, offset):
+                self.f.seek(offset)
+
+            def write(self, block):
+                raise OSError(28, 'No space left on device')
+
+        def segment_open(path, mode='r', *args, **kwargs):
+            f = real_open(path, mode, *args, **kwargs)
+            return FullDisk(f) if mode == 'r+b' else f
+
+        with mock.patch('data_importer.download.open', side_effect=segment_open, create=True):
+            with self.assertRaisesMessage(DownloadError, 'No space left on device'):
+                self.make_downloader().download(self.url, self.path)
+            self.assertTrue(os.path.exists(f'{self.path}.part.json'))
+            with mock.patch(
+                'data_importer.management.commands.populate_companies.RangeDownloader',
+                side_effect=lambda connections: self.make_downloader(),
+            ), self.assertRaises(CommandError):
+                PopulateCompaniesCommand(stdout=StringIO(), stderr=StringIO())._download_file(self.url, self.path)
+
+    def test_existing_file_is_checked_against_server(self):
+        """
+        Verifica se uma cópia local em dia é reaproveitada sem download e se uma cópia truncada
+        ou com outro ETag é baixada de novo.
+        """
+        self.make_downloader().download(self.url, self.path)
+        self.server.requests.clear()
+        self.assertEqual(self.make_downloader().download(self.url, self.path), 'cached')
+        self.assertEqual(self.ranges(), [])
+
+        with open(self.path, 'r+b') as f:
+            f.truncate(1000)
+        self.assertEqual(self.make_downloader().download(self.url, self.path), 'downloaded')
+
+        self.server.etag = '"v2"'
+        self.server.requests.clear()
+        self.assertEqual(self.make_downloader().download(self.url, self.path), 'downloaded')
+        self.assertEqual(len(self.ranges()), 4)
+
+    def test_weak_etag_is_not_sent_in_if_range(self):
+        """
+        Verifica se um ETag fraco não vai no If-Range (o servidor devolveria o arquivo inteiro): vale o
+        Last-Modified, ou nenhum If-Range se o servidor não informar a data.
+        """
+        self.server.etag = 'W/"v1"'
+        self.server.last_modified = 'Sat, 13 Sep 2025 10:00:00 GMT'
+
+        self.assertEqual(self.make_downloader().download(self.url, self.path), 'downloaded')
+        with open(self.path, 'rb') as f:
+            self.assertEqual(f.read(), self.server.body)
+        self.assertEqual(self.server.if_range_headers, ['Sat, 13 Sep 2025 10:00:00 GMT'] * 4)
+
+        os.remove(self.path)
+        self.server.last_modified = None
+        self.server.if_range_headers.clear()
+        self.assertEqual(self.make_downloader().download(self.url, self.path), 'downloaded')
+        self.assertEqual(self.server.if_range_headers, [None] * 4)
+
+    def test_corrupted_zip_is_rejected(self):
+        """
+        Verifica se um arquivo que não é um zip válido é recusado e não fica no destino.
+        """
+        self.server.body = b'nao e um zip' * 10000
+
+        with self.assertRaises(DownloadError):
+            self.make_downloader().download(self.url, self.path)
+
+        self.assertFalse(os.path.exists(self.path))
+        self.assertFalse(os.path.exists(f'{self.path}.part'))
+
+
+@override_settings(RECEITA_CACHE_DIR='')
+class SyntheticDatasetTests(TestCase):
+    """
+    Testes para o gerador de arquivos sintéticos e para o comando de benchmark.
+    """
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        for i in range(1, 11):
+            Company.objects.create(
+                cnpj=f'{i:08d}', razao_social=f'EMPRESA {i}', natureza_juridica='2062',
+                qualificacao_responsavel='49', capital_social=Decimal('1.00')
+            )
+
+    def test_generated_archive_has_receita_format_and_requested_collisions(self):
+        """
+        Verifica se o .zip gerado é lido pelo importador (latin-1, ';', vírgula decimal), se os CNPJs
+        não se repetem e se a fração pedida de linhas reutiliza CNPJs da base.
+        """
+        path = os.path.join(self.tmp_dir.name, 'Empresas.zip')
+        call_command('generate_empresas', path, rows=40, collide_fraction=0.25, chunk_size=7, stdout=StringIO())
+
+        with zipfile.ZipFile(path) as zf, zf.open(find_csv_member(zf)) as csv_file:
+            raw = csv_file.read()
+            chunk = parse_csv_bytes(raw)
+
+        self.assertEqual(len(chunk), 40)
+        self.assertTrue(chunk['cnpj'].is_unique)
+        self.assertEqual(chunk['cnpj'].isin([f'{i:08d}' for i in range(1, 11)]).sum(), 10)
+        self.assertTrue(chunk['capital_social'].str.fullmatch(r'\d+,\d{2}').all())
+        # Acentos gravados em latin-1 (um byte) e lidos de volta corretamente
+        self.assertNotIn(b'\xc3\x83', raw)
+        self.assertTrue(chunk['razao_social'].str.contains('[ÇÃÁÉÍÓÚÂÊÔ]').any())
+
+    def test_existing_cnpjs_are_converted_in_batches(self):
+        """
+        Verifica se os CNPJs da base são lidos em lotes e devolvidos num único array int64,
+        ignorando os que não são numéricos.
+        """
+        Company.objects.create(
+            cnpj='ABC', razao_social='INVÁLIDA', natureza_juridica='2062',
+            qualificacao_responsavel='49', capital_social=Decimal('1.00')
+        )
+        command = GenerateEmpresasCommand(stdout=StringIO())
+
+        existing = command.existing_cnpjs(batch_size=3)
+
+        self.assertEqual(existing.dtype, np.int64)
+        self.assertEqual(sorted(existing.tolist()), list(range(1, 11)))
+
+    def test_benchmark_appends_stage_results_without_changing_the_database(self):
+        """
+        Verifica se o benchmark grava no JSON as métricas por etapa e se a etapa process_chunk
+        desfaz as suas gravações.
+        """
+        archive = os.path.join(self.tmp_dir.name, 'Empresas.zip')
+        output = os.path.join(self.tmp_dir.name, 'results.json')
+        call_command('generate_empresas', archive, rows=25, stdout=StringIO())
+
+        for label in ('antes', 'depois'):
+            call_command('benchmark_import', archive, stages=['process_chunk'], output=output, label=label, stdout=StringIO())
+
+        with open(output) as f:
+            results = json.load(f)
+        self.assertEqual([run['label'] for run in results], ['antes', 'depois'])
+        stage = results[-1]['stages']['process_chunk']
+        self.assertEqual(stage['rows'], 25)
+        self.assertEqual(stage['created'], 25)
+        self.assertGreater(stage['stages']['write']['queries'], 0)
+        self.assertEqual(stage['stages']['transform']['queries'], 0)
+        self.assertEqual(Company.objects.count(), 10)
+
+    def test_benchmark_populate_companies_reads_the_csv_on_every_run(self):
+        """
+        Verifica se o benchmark do comando completo usa um cache colunar vazio a cada execução,
+        sem ler nem deixar arquivos no RECEITA_CACHE_DIR configurado.
+        """
+        archive = os.path.join(self.tmp_dir.name, 'Empresas.zip')
+        output = os.path.join(self.tmp_dir.name, 'results.json')
+        cache_dir = os.path.join(self.tmp_dir.name, 'cache')
+        call_command('generate_empresas', archive, rows=25, stdout=StringIO())
+
+        with override_settings(RECEITA_CACHE_DIR=cache_dir), \
+                mock.patch.object(ArchiveCache, 'read_chunks', side_effect=AssertionError('leu do cache')):
+            for _ in range(2):
+                call_command('benchmark_import', archive, stages=['populate_companies'], output=output, stdout=StringIO())
+
+        self.assertFalse(os.path.exists(cache_dir))
+        with open(output) as f:
+            self.assertEqual([run['stages']['populate_companies']['rows'] for run in json.load(f)], [25, 25])
+
+
+@override_settings(RECEITA_CACHE_DIR='')
+class ImportTelemetryTests(TestCase):
+    """
+    Testes para os eventos estruturados das importações e para o endpoint /metrics.
+    """
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        LIST_VIEW_LATENCY.clear()
+        self.addCleanup(LIST_VIEW_LATENCY.clear)
+        self.zip_path = os.path.join(self.tmp_dir.name, 'Empresas0.zip')
+        write_empresas_zip(self.zip_path, [
+            ['11111111', 'EMPRESA A LTDA', '2062', '49', '1000,00', '01', ''],
+            ['22222222', 'EMPRESA B ME', '2135', '50', '0,00', '', ''],
+        ])
+
+    def test_populate_companies_emits_chunk_events_with_stage_timings(self):
+        """
+        Verifica se cada chunk gera um evento JSON com os tempos de cada etapa e as contagens,
+        e se o resumo da execução fica guardado para o /metrics.
+        """
+        with self.assertLogs('data_importer.events', level='INFO') as logs:
+            call_command('populate_companies', self.zip_path, stdout=StringIO())
+
+        events = [json.loads(record.getMessage()) for record in logs.records]
+        chunk_event = next(event for event in events if event['event'] == 'chunk')
+        self.assertEqual(chunk_event['archive'], 'Empresas0.zip')
+        self.assertEqual(chunk_event['chunk'], 1)
+        self.assertEqual((chunk_event['rows'], chunk_event['created']), (2, 2))
+        self.assertEqual(set(chunk_event['timings']), {'read', 'transform', 'lookup', 'insert', 'update'})
+        self.assertIn('rss_mb', chunk_event)
+        self.assertEqual(events[-1]['event'], 'import_finished')
+
+        run = ImportRun.objects.get(command='populate_companies')
+        self.assertTrue(run.success)
+        self.assertEqual((run.rows, run.created), (2, 2))
+        self.assertIn('insert', run.stage_seconds)
+
+    def test_metrics_exposes_last_import_and_list_latency(self):
+        """
+        Verifica se /metrics exibe, no formato do Prometheus, a última importação e o
+        histograma de latência das listagens.
+        """
+        with self.assertLogs('data_importer.events', level='INFO'):
+            call_command('populate_companies', self.zip_path, stdout=StringIO())
+        user = User.objects.create_user(username='analista', password='senha-segura-123', is_staff=True)
+        self.client.force_login(user)
+        self.client.get(reverse('data_importer:company_list'))
+
+        response = self.client.get('/metrics')
+
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        body = response.content.decode()
+        self.assertIn('arko_import_last_run_success{command="populate_companies"} 1', body)
+        self.assertIn('arko_import_last_run_rows{command="populate_companies",result="created"} 2', body)
+        self.assertIn('# TYPE arko_list_view_request_duration_seconds histogram', body)
+        self.assertIn('arko_list_view_request_duration_seconds_bucket{view="company_list",le="+Inf"} 1', body)
+        self.assertIn('arko_list_view_request_duration_seconds_count{view="company_list"} 1', body)
+
+    @override_settings(METRICS_TOKEN='token-do-prometheus')
+    def test_metrics_requires_token_or_staff_user(self):
+        """
+        Verifica se /metrics recusa acessos anônimos, com token errado ou de usuários sem staff,
+        e aceita o token configurado em METRICS_TOKEN.
+        """
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response['WWW-Authenticate'], 'Bearer')
+
+        response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer outro-token')
+        self.assertEqual(response.status_code, 401)
+
+        response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer token-do-prometheus')
+        self.assertEqual(response.status_code, 200)
+
+        user = User.objects.create_user(username='analista', password='senha-segura-123')
+        self.client.force_login(user)
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+
+    def test_metrics_token_is_disabled_when_empty(self):
+        """
+        Verifica se, sem METRICS_TOKEN configurado, um cabeçalho Bearer qualquer não dá acesso a /metrics.
+        """
+        with override_settings(METRICS_TOKEN=''):
+            response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer ')
+        self.assertEqual(response.status_code, 401)
+
+
+@override_settings(SQL_INSTRUMENTATION=True, SQL_SLOW_REQUEST_MS=0)
+class SqlInstrumentationMiddlewareTests(TestCase):
+    """
+    Testes para o middleware de instrumentação de SQL.
+    """
+
+    def setUp(self):
+        caches['pages'].clear()
+        self.addCleanup(caches['pages'].clear)
+        user = User.objects.create_user(username='analista', password='senha-segura-123')
+        self.client.force_login(user)
+        region = Region.objects.create(id=3, name='Sudeste', acronym='SE')
+        self.state = State.objects.create(id=35, name='São Paulo', acronym='SP', region=region)
+
+    def add_districts(self, first, last):
+        for i in range(first, last):
+            municipality = Municipality.objects.create(id=i, name=f'Município {i}', state=self.state)
+            District.objects.create(id=i, name=f'Distrito {i}', municipality=municipality)
+
+    def query_count(self, response):
+        match = re.search(r'db;dur=[\d.]+;desc="(\d+) consultas"', response['Server-Timing'])
+        return int(match.group(1))
+
+    def test_server_timing_shows_district_list_has_no_n_plus_one(self):
+        """
+        Verifica se o Server-Timing traz o número de consultas e se ele não cresce com o número
+        de distritos na página (o select_related evita o N+1).
+        """
+        url = reverse('data_importer:district_list')
+        self.add_districts(1, 4)
+        with self.assertLogs('data_importer.slow_requests', level='WARNING'):
+            few = self.query_count(self.client.get(url))
+        caches['pages'].clear()
+        self.add_districts(4, 30)
+        with self.assertLogs('data_importer.slow_requests', level='WARNING'):
+            many = self.query_count(self.client.get(url))
+
+        self.assertEqual(few, many)
+
+    def test_slow_requests_are_logged_with_normalized_sql(self):
+        """
+        Verifica se a requisição acima do limite é registrada com o SQL sem valores
+        e com as consultas repetidas agrupadas.
+        """
+        self.add_districts(1, 3)
+        with self.assertLogs('data_importer.slow_requests', level='WARNING') as logs:
+            self.client.get(reverse('data_importer:district_list'), {'name': "d'Oeste"})
+
+        entry = json.loads(logs.records[0].getMessage())
+        self.assertEqual(entry['path'], '/app/districts/?name=d%27Oeste')
+        self.assertEqual(entry['queries'], sum(statement['count'] for statement in entry['statements']))
+        self.assertNotIn('Oeste', json.dumps(entry['statements']))
+        self.assertEqual(
+            normalize_sql("SELECT * FROM t WHERE id IN (%s, %s, %s) AND name = 'x' LIMIT 20"),
+            'SELECT * FROM t WHERE id IN (...) AND name = ? LIMIT ?'
+        )
+
+    async def test_async_middleware_counts_queries_of_async_views(self):
+        """
+        Verifica se, numa cadeia assíncrona (ASGI), o middleware roda em modo assíncrono e conta as
+        consultas feitas pelo ORM assíncrono da view.
+        """
+        async def view(request):
+            return HttpResponse(str(await State.objects.acount() + await Region.objects.acount()))
+
+        middleware = SqlInstrumentationMiddleware(view)
+        with self.assertLogs('data_importer.slow_requests', level='WARNING'):
+            response = await middleware(AsyncRequestFactory().get('/'))
+
+        self.assertTrue(iscoroutinefunction(middleware))
+        self.assertEqual(response.content, b'2')
+        self.assertEqual(self.query_count(response), 2)
+
+    async def test_async_district_list_reports_the_same_queries_as_the_sync_one(self):
+        """
+        Verifica se a listagem de distritos servida pelas views assíncronas traz no Server-Timing as
+        mesmas consultas da versão síncrona (e não zero).
+        """
+        await sync_to_async(self.add_districts)(1, 4)
+        url = reverse('data_importer:district_list')
+        with self.assertLogs('data_importer.slow_requests', level='WARNING'):
+            sync_queries = self.query_count(await sync_to_async(self.client.get)(url))
+        # Sem a página nem a contagem exata em cache, as duas versões fazem as mesmas consultas
+        await sync_to_async(caches['pages'].clear)()
+        await sync_to_async(cache.clear)()
+
+        def reload_urls():
+            importlib.reload(data_importer_urls)
+            importlib.reload(importlib.import_module(settings.ROOT_URLCONF))
+            clear_url_caches()
+
+        with override_settings(ASYNC_VIEWS=True):
+            reload_urls()
+        self.addCleanup(reload_urls)
+        await self.async_client.aforce_login(await User.objects.aget(username='analista'))
+        self.assertIs(resolve(url).func.view_class, AsyncDistrictListView)
+        with self.assertLogs('data_importer.slow_requests', level='WARNING'):
+            response = await self.async_client.get(url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(sync_queries, 0)
+        self.assertEqual(self.query_count(response), sync_queries)
+
+    @override_settings(SQL_INSTRUMENTATION=False)
+    def test_disabled_middleware_adds_no_header(self):
+        """
+        Verifica se, desativado, o middleware não participa da requisição.
+        """
+        response = self.client.get(reverse('data_importer:district_list'))
+        self.assertNotIn('Server-Timing', response)
+
+
+class CompanyExportTests(TestCase):
+    """
+    Testes para a exportação em streaming das empresas filtradas.
+    """
+
+    def setUp(self):
+        user = User.objects.create_user(username='analista', password='senha-segura-123')
+        self.client.force_login(user)
+        for cnpj, name, porte in [
+            ('00000001', 'AGRO SÃO JOÃO LTDA', '05'),
+            ('00000002', 'AGROPECUÁRIA BOA VISTA', '05'),
+            ('00000003', 'AGRO PEQUENA ME', '01'),
+            ('00000004', 'PADARIA CENTRAL', '05'),
+        ]:
+            Company.objects.create(
+                cnpj=cnpj, razao_social=name, natureza_juridica='2062',
+                qualificacao_responsavel='49', capital_social=Decimal('1234.50'), porte_empresa=porte
+            )
+        self.url = reverse('data_importer:company_export')
+
+    def test_csv_export_streams_only_the_filtered_companies(self):
+        """
+        Verifica se o CSV respeita os filtros da listagem e é enviado em streaming.
+        """
+        response = self.client.get(self.url, {'razao_social': 'AGRO', 'porte_empresa': '05'})
+
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="empresas.csv"')
+        rows = list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual(rows[0][:2], ['cnpj', 'razao_social'])
+        self.assertEqual([row[1] for row in rows[1:]], ['AGRO SÃO JOÃO LTDA', 'AGROPECUÁRIA BOA VISTA'])
+        self.assertEqual(rows[1][4], '1234.50')
+
+    def test_gzip_jsonl_export(self):
+        """
+        Verifica se a exportação JSON Lines com compress=gzip gera um gzip válido, uma empresa por linha.
+        """
+        response = self.client.get(self.url, {'format': 'jsonl', 'compress': 'gzip', 'porte_empresa': '05'})
+
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        lines = gzip.decompress(b''.join(response.streaming_content)).decode().splitlines()
+        companies = [json.loads(line) for line in lines]
+        self.assertEqual([company['cnpj'] for company in companies], ['00000001', '00000002', '00000004'])
+        self.assertEqual(companies[0]['capital_social'], '1234.50')
+        self.assertEqual(self.client.get(self.url, {'format': 'xlsx'}).status_code, 400)
+
+    def test_export_honours_accept_encoding(self):
+        """
+        Verifica se a exportação é comprimida com Content-Encoding: gzip quando o cliente aceita gzip,
+        se varia por Accept-Encoding e se q=0 ou ?compress=none desligam a compressão.
+        """
+        response = self.client.get(self.url, {'porte_empresa': '01'}, HTTP_ACCEPT_ENCODING='gzip, deflate, br')
+
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="empresas.csv"')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        rows = list(csv.reader(io.StringIO(gzip.decompress(b''.join(response.streaming_content)).decode())))
+        self.assertEqual([row[0] for row in rows], ['cnpj', '00000003'])
+
+        for params, accept_encoding in [({}, 'gzip;q=0, br'), ({}, 'identity'), ({'compress': 'none'}, 'gzip')]:
+            with self.subTest(params=params, accept_encoding=accept_encoding):
+                response = self.client.get(self.url, params, HTTP_ACCEPT_ENCODING=accept_encoding)
+                self.assertFalse(response.has_header('Content-Encoding'))
+                self.assertTrue(b''.join(response.streaming_content).startswith(b'cnpj,'))
+        self.assertTrue(accepts_gzip('*'))
+        self.assertFalse(accepts_gzip('gzip;q=0.0, *;q=1'))
+
+    def test_invalid_filter_is_rejected_instead_of_exporting_everything(self):
+        """
+        Verifica se um filtro com valor inválido devolve 400 com o erro, em vez de exportar a tabela inteira.
+        """
+        class CapitalFilter(CompanyFilter):
+            capital_minimo = django_filters.NumberFilter(field_name='capital_social', lookup_expr='gte')
+
+        with mock.patch('data_importer.views.CompanyFilter', CapitalFilter):
+            response = self.client.get(self.url, {'capital_minimo': 'mil'})
+            self.assertEqual(self.client.get(self.url, {'capital_minimo': '1000'}).status_code, 200)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('capital_minimo', response.content.decode())
+
+
+class JsonApiTests(TestCase):
+    """
+    Testes para a API JSON somente leitura (paginação por cursor e GET condicional).
+    """
+
+    def setUp(self):
+        user = User.objects.create_user(username='analista', password='senha-segura-123')
+        self.client.force_login(user)
+        region = Region.objects.create(id=3, name='Sudeste', acronym='SE')
+        self.state = State.objects.create(id=35, name='São Paulo', acronym='SP', region=region)
+        for municipality_id, name in [(3550308, 'São Paulo'), (3509502, 'Campinas'), (3548500, 'Santos')]:
+            Municipality.objects.create(id=municipality_id, name=name, state=self.state)
+        Company.objects.create(
+            cnpj='00000001', razao_social='PADARIA CENTRAL', natureza_juridica='2062',
+            qualificacao_responsavel='49', capital_social=Decimal('1234.50'), porte_empresa='05'
+        )
+        bump_dataset_version('ibge')
+        self.url = reverse('data_importer:api_municipality_list')
+
+    def test_cursor_pagination(self):
+        """
+        Verifica se a API pagina por cursor, com a URL da próxima página pronta para uso.
+        """
+        response = self.client.get(self.url, {'limit': 2})
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual([row['name'] for row in data['results']], ['Campinas', 'Santos'])
+        self.assertEqual(data['results'][0], {'id': 3509502, 'name': 'Campinas', 'state_id': 35})
+        self.assertIsNone(data['previous'])
+
+        data = self.client.get(data['next']).json()
+        self.assertEqual([row['name'] for row in data['results']], ['São Paulo'])
+        self.assertIsNone(data['next'])
+        self.assertIsNotNone(data['previous'])
+
+    def test_conditional_get_returns_304_until_the_next_import(self):
+        """
+        Verifica se If-None-Match com o ETag atual gera 304 sem consultar a listagem,
+        e se uma nova importação muda o ETag.
+        """
+        response = self.client.get(self.url, {'state': 35})
+        etag = response['ETag']
+        self.assertIn('Last-Modified', response)
+        self.assertIn('no-cache', response['Cache-Control'])
+
+        with CaptureQueriesContext(connection) as queries:
+            not_modified = self.client.get(self.url, {'state': 35}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertFalse(any('data_importer_municipality' in query['sql'] for query in queries.captured_queries))
+
+        # Outra combinação de filtros é outra representação
+        self.assertNotEqual(self.client.get(self.url, {'name': 'San'})['ETag'], etag)
+
+        bump_dataset_version('ibge')
+        response = self.client.get(self.url, {'state': 35}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_companies_endpoint_and_errors(self):
+        """
+        Verifica a listagem de empresas, o 400 para filtros inválidos e o 403 sem login.
+        """
+        data = self.client.get(reverse('data_importer:api_company_list')).json()
+        self.assertEqual(data['results'][0]['cnpj'], '00000001')
+        self.assertEqual(data['results'][0]['capital_social'], '1234.50')
+
+        response = self.client.get(self.url, {'state': 999})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('state', response.json()['errors'])
+
+        self.client.logout()
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+
+class AsyncViewsTests(TestCase):
+    """
+    Testes para as versões assíncronas das listagens e dos endpoints JSON (servidas pelo ASGI).
+    """
+
+    def setUp(self):
+        caches['pages'].clear()
+        self.addCleanup(caches['pages'].clear)
+        self.user = User.objects.create_user(username='analista', password='senha-segura-123')
+        region = Region.objects.create(id=3, name='Sudeste', acronym='SE')
+        Region.objects.create(id=4, name='Sul', acronym='S')
+        state = State.objects.create(id=35, name='São Paulo', acronym='SP', region=region)
+        State.objects.create(id=33, name='Rio de Janeiro', acronym='RJ', region=region)
+        for municipality_id, name in [(3550308, 'São Paulo'), (3509502, 'Campinas'), (3548500, 'Santos')]:
+            Municipality.objects.create(id=municipality_id, name=name, state=state)
+        for index in range(1, 4):
+            Company.objects.create(
+                cnpj=f'0000000{index}', razao_social=f'EMPRESA {index}', natureza_juridica='2062',
+                qualificacao_responsavel='49', capital_social=Decimal('1.00'), porte_empresa='05'
+            )
+        self.factory = AsyncRequestFactory()
+
+    async def get(self, view_class, url_name, params=None, user=None, **headers):
+        request = self.factory.get(reverse(f'data_importer:{url_name}'), params or {}, headers=headers)
+        request.resolver_match = resolve(request.path)
+        request.user = user or self.user
+
+        async def auser():
+            return request.user
+
+        request.auser = auser
+        return await view_class.as_view()(request)
+
+    async def test_company_list_paginates_by_cursor_and_uses_the_page_cache(self):
+        """
+        Verifica se a listagem assíncrona de empresas pagina por cursor e se a segunda requisição vem do cache.
+        """
+        with mock.patch.object(AsyncCompanyListView, 'paginate_by', 2):
+            first = await self.get(AsyncCompanyListView, 'company_list')
+            cached = await self.get(AsyncCompanyListView, 'company_list')
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first['X-Page-Cache'], 'MISS')
+        self.assertEqual(cached['X-Page-Cache'], 'HIT')
+        content = first.content.decode()
+        self.assertIn('EMPRESA 1', content)
+        self.assertIn('EMPRESA 2', content)
+        self.assertNotIn('EMPRESA 3', content)
+        self.assertIn('cursor=', content)
+
+    async def test_state_list_validates_the_filter_and_counts_asynchronously(self):
+        """
+        Verifica se a listagem de estados aplica o filtro por região (ModelChoiceFilter) e pagina por OFFSET.
+        """
+        response = await self.get(AsyncStateListView, 'state_list', {'region': 3, 'page': 1})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Rio de Janeiro', response.content.decode())
+        self.assertEqual(response.context_data['paginator'].count, 2)
+        self.assertEqual([state.acronym for state in response.context_data['states']], ['RJ', 'SP'])
+
+    async def test_json_endpoints(self):
+        """
+        Verifica a API e o autocomplete assíncronos, incluindo o 304 do GET condicional.
+        """
+        response = await self.get(AsyncMunicipalityApiView, 'api_municipality_list', {'limit': 2})
+        data = json.loads(response.content)
+        self.assertEqual([row['name'] for row in data['results']], ['Campinas', 'Santos'])
+        self.assertIsNotNone(data['next'])
+
+        not_modified = await self.get(
+            AsyncMunicipalityApiView, 'api_municipality_list', {'limit': 2}, If_None_Match=response['ETag']
+        )
+        self.assertEqual(not_modified.status_code, 304)
+
+        response = await self.get(AsyncMunicipalityApiView, 'api_municipality_list', {'state': 999})
+        self.assertEqual(response.status_code, 400)
+
+        response = await self.get(AsyncMunicipalityAutocompleteView, 'municipality_autocomplete', {'q': 'S'})
+        self.assertEqual(
+            [item['text'] for item in json.loads(response.content)['results']], ['Santos (SP)', 'São Paulo (SP)']
+        )
+
+    async def test_anonymous_requests(self):
+        """
+        Verifica se as páginas redirecionam para o login e a API responde 403 sem usuário autenticado.
+        """
+        response = await self.get(AsyncCompanyListView, 'company_list', user=AnonymousUser())
+        self.assertEqual(response.status_code, 302)
+        self.assertIn(reverse('login'), response['Location'])
+
+        with self.assertRaises(PermissionDenied):
+            await self.get(AsyncMunicipalityApiView, 'api_municipality_list', user=AnonymousUser())
+
+
+class AsyncCompanyExportTests(TransactionTestCase):
+    """
+    Testes para a exportação servida pelo ASGI (ASYNC_VIEWS), passando pelo ASGIHandler do Django.
+    """
+
+    def setUp(self):
+        user = User.objects.create_user(username='analista', password='senha-segura-123')
+        self.client.force_login(user)
+        self.session_cookie = f'{settings.SESSION_COOKIE_NAME}={self.client.cookies[settings.SESSION_COOKIE_NAME].value}'
+        for index in range(1, 6):
+            Company.objects.create(
+                cnpj=f'0000000{index}', razao_social=f'EMPRESA {index}', natureza_juridica='2062',
+                qualificacao_responsavel='49', capital_social=Decimal('1234.50'), porte_empresa='05' if index % 2 else '01'
+            )
+        # As rotas são escolhidas na importação de urls.py: recarrega-o (e o urlconf raiz, que guarda
+        # os resolvers do include) com as views assíncronas, e de novo sem elas no fim
+        with override_settings(ASYNC_VIEWS=True):
+            self.reload_urls()
+        self.addCleanup(self.reload_urls)
+
+    def reload_urls(self):
+        importlib.reload(data_importer_urls)
+        importlib.reload(importlib.import_module(settings.ROOT_URLCONF))
+        clear_url_caches()
+
+    async def asgi_get(self, params, accept_encoding=None):
+        path = reverse('data_importer:company_export')
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+            'path': path, 'raw_path': path.encode(), 'query_string': urlencode(params).encode(), 'root_path': '',
+            'headers': [(b'host', b'testserver'), (b'cookie', self.session_cookie.encode())],
+            'client': ('127.0.0.1', 50000), 'server': ('testserver', 80),
+        }
+        if accept_encoding:
+            scope['headers'].append((b'accept-encoding', accept_encoding.encode()))
+        received = False
+        messages = []
+
+        async def receive():
+            nonlocal received
+            if not received:
+                received = True
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+            # O cliente não desconecta: o handler cancela esta espera ao terminar a resposta
+            await asyncio.Future()
+
+        async def send(message):
+            messages.append(message)
+
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            await ASGIHandler()(scope, receive, send)
+        status = messages[0]['status']
+        body = b''.join(message.get('body', b'') for message in messages[1:])
+        return status, body, caught
+
+    async def test_export_streams_from_an_async_iterator(self):
+        """
+        Verifica se pelo ASGI a exportação usa a view assíncrona, cujas linhas vêm de aiterator(), sem
+        o aviso do Django de que um iterador síncrono precisou ser lido inteiro antes do envio.
+        """
+        self.assertIs(resolve(reverse('data_importer:company_export')).func.view_class, AsyncCompanyExportView)
+        with mock.patch('data_importer.async_views.EXPORT_CHUNK_SIZE', 2):
+            status, body, caught = await self.asgi_get({'porte_empresa': '05'})
+
+        self.assertEqual(status, 200)
+        rows = list(csv.reader(io.StringIO(body.decode())))
+        self.assertEqual([row[0] for row in rows], ['cnpj', '00000001', '00000003', '00000005'])
+        self.assertEqual(rows[1][4], '1234.50')
+        self.assertFalse([w for w in caught if 'synchronous iterators' in str(w.message)])
+
+    async def test_gzip_jsonl_and_errors(self):
+        """
+        Verifica o JSON Lines comprimido com gzip pelo ASGI e os 400 de formato e de filtro inválidos.
+        """
+        status, body, caught = await self.asgi_get({'format': 'jsonl', 'compress': 'gzip'})
+
+        self.assertEqual(status, 200)
+        companies = [json.loads(line) for line in gzip.decompress(body).decode().splitlines()]
+        self.assertEqual([company['cnpj'] for company in companies], [f'0000000{i}' for i in range(1, 6)])
+        self.assertFalse([w for w in caught if 'synchronous iterators' in str(w.message)])
+        self.assertEqual((await self.asgi_get({'format': 'xlsx'}))[0], 400)
+
+    async def test_export_honours_accept_encoding(self):
+        """
+        Verifica se pelo ASGI a exportação também é comprimida quando o cliente aceita gzip.
+        """
+        status, body, _ = await self.asgi_get({'porte_empresa': '01'}, accept_encoding='gzip')
+
+        self.assertEqual(status, 200)
+        self.assertEqual(gzip.decompress(body).decode().splitlines()[0].split(',')[0], 'cnpj')
+
+class StubPageHandler(BaseHTTPRequestHandler):
+    """Servidor HTTP local que responde 200 a tudo e guarda os cookies recebidos."""
+
+    def do_GET(self):
+        self.server.requests.append((self.path, self.headers.get('Cookie', '')))
+        body = b'ok'
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class LoadTestCommandTests(TestCase):
+    """
+    Testes para o comando loadtest (teste de carga contra um servidor em execução).
+    """
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StubPageHandler)
+        self.server.requests = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.url = f'http://127.0.0.1:{self.server.server_port}/app/companies/?razao_social=AGRO'
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.output = os.path.join(directory.name, 'results.json')
+
+    def test_records_latency_percentiles_and_throughput(self):
+        """
+        Verifica se o comando mede as requisições (sem o aquecimento), autentica com --user
+        e acrescenta o resultado ao arquivo JSON.
+        """
+        User.objects.create_user(username='analista', password='senha-segura-123')
+
+        call_command(
+            'loadtest', self.url, requests=20, concurrency=4, warmup=2, user='analista',
+            bust_cache=True, output=self.output, label='stub', stdout=StringIO(),
+        )
+
+        with open(self.output) as f:
+            (run,) = json.load(f)
+        self.assertEqual(run['benchmark'], 'loadtest')
+        self.assertEqual(run['requests'], 20)
+        self.assertEqual(run['status'], {'200': 20})
+        self.assertLessEqual(run['latency_ms']['p50'], run['latency_ms']['p99'])
+        self.assertGreater(run['requests_per_second'], 0)
+        self.assertEqual(len(self.server.requests), 22)
+        paths = [path for path, _ in self.server.requests]
+        self.assertEqual(len(set(paths)), 22)  # --bust-cache: cada requisição tem um parâmetro único
+        self.assertTrue(all('sessionid=' in cookie for _, cookie in self.server.requests))
+
+    def test_latency_summary(self):
+        """
+        Verifica os percentis calculados sobre uma distribuição conhecida.
+        """
+        summary = latency_summary([index / 1000 for index in range(1, 101)])
+
+        self.assertEqual(summary['p50'], 50.5)
+        self.assertEqual(summary['p99'], 99.01)
+        self.assertEqual(summary['max'], 100.0)
+
+
+class CompanySnapshotTests(TestCase):
+    """
+    Testes para o modo --snapshot (troca blue/green da tabela de empresas).
+    """
+
+    def test_index_definitions_are_rewritten_for_the_shadow_table(self):
+        """
+        Verifica se o CREATE INDEX lido de pg_indexes é refeito com o nome e a tabela da sombra.
+        """
+        definition = (
+            'CREATE INDEX company_razao_cnpj_idx ON public.data_importer_company '
+            'USING btree (razao_social, cnpj)'
+        )
+
+        self.assertEqual(
+            rewrite_index_definition(definition, 'company_razao_cnpj_idx_shadow', 'data_importer_company_shadow'),
+            'CREATE INDEX company_razao_cnpj_idx_shadow ON data_importer_company_shadow USING btree (razao_social, cnpj)',
+        )
+        self.assertEqual(len(suffixed_name('x' * 63, '_previous')), 63)
+
+    def test_snapshot_requires_postgres_and_a_full_load(self):
+        """
+        Verifica se o --snapshot é recusado fora do PostgreSQL e com --resume, sem tocar na tabela em uso.
+        """
+        with mock.patch.object(connection, 'vendor', 'sqlite'):
+            with self.assertRaisesMessage(CommandError, 'requer PostgreSQL'):
+                call_command('populate_companies', 'inexistente.zip', snapshot=True, stdout=StringIO())
+        with mock.patch.object(connection, 'vendor', 'postgresql'):
+            with self.assertRaisesMessage(CommandError, '--resume'):
+                call_command('populate_companies', 'inexistente.zip', snapshot=True, resume=True, stdout=StringIO())
+
+    @override_settings(RECEITA_CACHE_DIR='')
+    def test_failed_snapshot_leaves_no_checkpoints(self):
+        """
+        Verifica se o modo snapshot não grava checkpoints: se a troca não acontece, um --resume
+        na tabela em uso não pode pular os arquivos que só chegaram à sombra.
+        """
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        for i in range(2):
+            write_empresas_zip(os.path.join(directory.name, f'Empresas{i}.zip'), [
+                [f'0000000{i}', f'EMPRESA {i}', '2062', '49', '10,00', '01', ''],
+            ])
+        loads = []
+
+        def load(loader, chunk, timings=None):
+            # Sem PostgreSQL não há COPY: a sombra é simulada e o segundo arquivo falha
+            loads.append(len(chunk))
+            if len(loads) == 2:
+                raise RuntimeError('falha simulada')
+            return len(chunk), 0, 0
+
+        with mock.patch.object(connection, 'vendor', 'postgresql'), \
+                mock.patch.multiple(CompanySnapshot, prepare=mock.DEFAULT, discard=mock.DEFAULT) as snapshot, \
+                mock.patch.object(SnapshotCompanyLoader, 'load', autospec=True, side_effect=load), \
+                self.assertRaisesMessage(CommandError, '1 arquivo(s) falharam'):
+            call_command(
+                'populate_companies', os.path.join(directory.name, 'Empresas*.zip'), snapshot=True,
+                stdout=StringIO(), stderr=StringIO(),
+            )
+
+        snapshot['discard'].assert_called_once()
+        self.assertFalse(ImportCheckpoint.objects.exists())
+        call_command('populate_companies', os.path.join(directory.name, 'Empresas*.zip'), resume=True, stdout=StringIO())
+        self.assertEqual(Company.objects.count(), 2)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'As tabelas sombra usam recursos do PostgreSQL.')
+@override_settings(RECEITA_CACHE_DIR='')
+class CompanySnapshotPostgresTests(TransactionTestCase):
+    """
+    Testes de ponta a ponta da troca de snapshots (executados apenas no PostgreSQL).
+    """
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.addCleanup(CompanySnapshot().drop_previous)
+        Company.objects.create(
+            cnpj='00000001', razao_social='EMPRESA ANTIGA', natureza_juridica='2062',
+            qualificacao_responsavel='49', capital_social=Decimal('1.00')
+        )
+
+    def test_swap_keeps_the_previous_table_for_rollback(self):
+        """
+        Verifica se a carga vai para a sombra, se a troca publica a base nova (com os índices)
+        e se o rollback volta para a base anterior.
+        """
+        path = os.path.join(self.directory, 'Empresas0.zip')
+        write_empresas_zip(path, [
+            ['00000002', 'EMPRESA NOVA', '2062', '49', '10,00', '01', ''],
+            ['00000003', 'OUTRA EMPRESA NOVA', '2062', '49', '20,00', '01', ''],
+        ])
+
+        call_command('populate_companies', path, snapshot=True, stdout=StringIO())
+
+        self.assertEqual(sorted(Company.objects.values_list('cnpj', flat=True)), ['00000002', '00000003'])
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, Company._meta.db_table)
+        self.assertIn('company_razao_cnpj_idx', constraints)
+        self.assertTrue(any(info['primary_key'] for info in constraints.values()))
+
+        call_command('company_snapshot', 'rollback', stdout=StringIO())
+        self.assertEqual(list(Company.objects.values_list('cnpj', flat=True)), ['00000001'])
@@ -1,5 +1,29 @@
+from django.conf import settings
 from django.urls import path
-from .views import StateListView, MunicipalityListView, DistrictListView, CompanyListView
+
+if settings.ASYNC_VIEWS:
+    # Servidor ASGI (core/asgi.py): listagens, exportação e endpoints JSON com o ORM assíncrono
+    from .async_views import (
+        AsyncStateListView as StateListView,
+        AsyncMunicipalityListView as MunicipalityListView,
+        AsyncDistrictListView as DistrictListView,
+        AsyncCompanyListView as CompanyListView,
+        AsyncCompanyExportView as CompanyExportView,
+        AsyncRegionAutocompleteView as RegionAutocompleteView,
+        AsyncStateAutocompleteView as StateAutocompleteView,
+        AsyncMunicipalityAutocompleteView as MunicipalityAutocompleteView,
+        AsyncRegionApiView as RegionApiView,
+        AsyncStateApiView as StateApiView,
+        AsyncMunicipalityApiView as MunicipalityApiView,
+        AsyncDistrictApiView as DistrictApiView,
+        AsyncCompanyApiView as CompanyApiView,
+    )
+else:
+    from .views import (
+        StateListView, MunicipalityListView, DistrictListView, CompanyListView, CompanyExportView,
+        RegionAutocompleteView, StateAutocompleteView, MunicipalityAutocompleteView,
+    )
+    from .api import RegionApiView, StateApiView, MunicipalityApiView, DistrictApiView, CompanyApiView
 
 app_name = 'data_importer'
 
@@ -8,4 +32,17 @@ urlpatterns = [
     path('municipalities/', MunicipalityListView.as_view(), name='municipality_list'),
     path('districts/', DistrictListView.as_view(), name='district_list'),
     path('companies/', CompanyListView.as_view(), name='company_list'),
+    path('companies/export/', CompanyExportView.as_view(), name='company_export'),
+
+    # Endpoints JSON usados pelos selects dos filtros
+    path('autocomplete/regions/', RegionAutocompleteView.as_view(), name='region_autocomplete'),
+    path('autocomplete/states/', StateAutocompleteView.as_view(), name='state_autocomplete'),
+    path('autocomplete/municipalities/', MunicipalityAutocompleteView.as_view(), name='municipality_autocomplete'),
+
+    # API JSON somente leitura (paginação por cursor e GET condicional)
+    path('api/regions/', RegionApiView.as_view(), name='api_region_list'),
+    path('api/states/', StateApiView.as_view(), name='api_state_list'),
+    path('api/municipalities/', MunicipalityApiView.as_view(), name='api_municipality_list'),
+    path('api/districts/', DistrictApiView.as_view(), name='api_district_list'),
+    path('api/companies/', CompanyApiView.as_view(), name='api_company_list'),
 ]
\ No newline at end of file
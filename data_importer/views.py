@@ -1,10 +1,62 @@
-from django.views.generic import ListView
+import time
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse, HttpResponseBadRequest, HttpResponseForbidden, JsonResponse, StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.crypto import constant_time_compare
+from django.views.generic import ListView, View
 from django.contrib.auth.mixins import LoginRequiredMixin
 
-from .models import State, Municipality, District, Company
-from .filters import StateFilter, MunicipalityFilter, DistrictFilter, CompanyFilter
+from .models import Region, State, Municipality, District, Company
+from .filters import StateFilter, MunicipalityFilter, DistrictFilter, CompanyFilter, filter_prefix
+from .pagination import CursorPaginator, EstimatedCountPaginator
+from .cache import (
+    DATASET_COMPANIES, DATASET_IBGE, PAGE_CACHE_ALIAS, page_cache_key, record_page_cache
+)
+from .telemetry import LIST_VIEW_LATENCY, render_metrics
+from .export import EXPORT_CHUNK_SIZE, accepts_gzip, encode_stream, gzip_stream, iter_csv, iter_jsonl
 
-class StateListView(LoginRequiredMixin, ListView):
+
+class LatencyMetricsMixin:
+    """Registra o tempo de resposta da view (incluindo a renderização) no histograma de /metrics."""
+
+    def dispatch(self, request, *args, **kwargs):
+        started_at = time.perf_counter()
+        response = super().dispatch(request, *args, **kwargs)
+        if hasattr(response, 'render') and not response.is_rendered:
+            response.render()
+        LIST_VIEW_LATENCY.observe(request.resolver_match.url_name, time.perf_counter() - started_at)
+        return response
+
+
+class CachedListMixin:
+    """
+    Guarda a página renderizada no cache 'pages'. A chave combina a view, a
+    querystring canônica (filtros + página/cursor) e a versão do conjunto de dados,
+    que os comandos de importação incrementam ao terminar: depois de uma
+    importação a próxima requisição já perde o cache, sem depender de TTL.
+    """
+    dataset = DATASET_IBGE
+
+    def get(self, request, *args, **kwargs):
+        page_cache = caches[PAGE_CACHE_ALIAS]
+        key = page_cache_key(self.__class__.__name__, self.dataset, request.GET)
+        cached = page_cache.get(key)
+        if cached is not None:
+            record_page_cache('hits')
+            response = HttpResponse(cached['content'], content_type=cached['content_type'])
+            response['X-Page-Cache'] = 'HIT'
+            return response
+
+        record_page_cache('misses')
+        response = super().get(request, *args, **kwargs)
+        if response.status_code == 200:
+            response.render()
+            page_cache.set(key, {'content': response.content, 'content_type': response['Content-Type']})
+        response['X-Page-Cache'] = 'MISS'
+        return response
+
+class StateListView(LoginRequiredMixin, LatencyMetricsMixin, CachedListMixin, ListView):
     model = State
     template_name = 'data_importer/state_list.html'
     context_object_name = 'states'
@@ -23,7 +75,7 @@ class StateListView(LoginRequiredMixin, ListView):
         context['filter'] = self.filter
         return context
 
-class MunicipalityListView(LoginRequiredMixin, ListView):
+class MunicipalityListView(LoginRequiredMixin, LatencyMetricsMixin, CachedListMixin, ListView):
     model = Municipality
     template_name = 'data_importer/municipality_list.html'
     context_object_name = 'municipalities'
@@ -39,11 +91,12 @@ class MunicipalityListView(LoginRequiredMixin, ListView):
         context['filter'] = self.filter
         return context
 
-class DistrictListView(LoginRequiredMixin, ListView):
+class DistrictListView(LoginRequiredMixin, LatencyMetricsMixin, CachedListMixin, ListView):
     model = District
     template_name = 'data_importer/district_list.html'
     context_object_name = 'districts'
     paginate_by = 50
+    paginator_class = EstimatedCountPaginator
 
     def get_queryset(self):
         # Otimização avançada: busca o município e o estado relacionado de uma só vez
@@ -56,18 +109,160 @@ class DistrictListView(LoginRequiredMixin, ListView):
         context['filter'] = self.filter
         return context
 
-class CompanyListView(LoginRequiredMixin, ListView):
+class CompanyListView(LoginRequiredMixin, LatencyMetricsMixin, CachedListMixin, ListView):
     model = Company
+    dataset = DATASET_COMPANIES
     template_name = 'data_importer/company_list.html'
     context_object_name = 'companies'
     paginate_by = 50
+    paginator_class = EstimatedCountPaginator
+    # Ordenação única usada pela paginação por cursor (coberta por um índice composto)
+    cursor_ordering = ('razao_social', 'cnpj')
 
     def get_queryset(self):
         queryset = super().get_queryset()
         self.filter = CompanyFilter(self.request.GET, queryset=queryset)
         return self.filter.qs
 
+    def paginate_queryset(self, queryset, page_size):
+        # ?page=N mantém a paginação por OFFSET; sem ele, a navegação é por cursor,
+        # que custa o mesmo em qualquer profundidade da tabela
+        if self.page_kwarg in self.request.GET:
+            return super().paginate_queryset(queryset, page_size)
+        paginator = CursorPaginator(queryset, page_size, ordering=self.cursor_ordering)
+        page = paginator.page(self.request.GET.get('cursor'))
+        return (paginator, page, page.object_list, page.has_other_pages())
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['filter'] = self.filter
-        return context
\ No newline at end of file
+        return context
+
+class CompanyExportView(LoginRequiredMixin, View):
+    """
+    Exporta as empresas filtradas (mesmos parâmetros do CompanyFilter) em CSV ou JSON Lines.
+
+    As linhas vêm de um cursor no servidor (`iterator(chunk_size=...)`) e são enviadas
+    à medida que são lidas, então a memória não cresce com o tamanho da exportação.
+    O fluxo é comprimido durante o envio quando o cliente aceita gzip (ver stream_response).
+    """
+    fields = [
+        'cnpj', 'razao_social', 'natureza_juridica', 'qualificacao_responsavel',
+        'capital_social', 'porte_empresa', 'ente_federativo_responsavel',
+    ]
+    formats = {
+        'csv': (iter_csv, 'text/csv; charset=utf-8'),
+        'jsonl': (iter_jsonl, 'application/x-ndjson; charset=utf-8'),
+    }
+
+    def get(self, request, *args, **kwargs):
+        export_format = request.GET.get('format', 'csv')
+        if export_format not in self.formats:
+            return self.invalid_format()
+        filterset = CompanyFilter(request.GET, queryset=Company.objects.all())
+        if not filterset.is_valid():
+            return self.invalid_filters(filterset)
+
+        rows = self.get_rows(filterset).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+        serialize, content_type = self.formats[export_format]
+        stream = encode_stream(serialize(rows, self.fields))
+        return self.stream_response(request, stream, export_format, content_type, gzip_stream)
+
+    def get_rows(self, filterset):
+        return filterset.qs.order_by(*CompanyListView.cursor_ordering).values_list(*self.fields)
+
+    def invalid_format(self):
+        return HttpResponseBadRequest('Formato inválido: use format=csv ou format=jsonl.')
+
+    def invalid_filters(self, filterset):
+        # Sem validar, o django-filter ignoraria o filtro inválido e exportaria a tabela inteira
+        return HttpResponseBadRequest(f'Filtros inválidos:\n{filterset.errors.as_text()}', content_type='text/plain')
+
+    def stream_response(self, request, stream, export_format, content_type, compress):
+        """
+        Resposta em streaming, comprimida por `compress` (gzip_stream ou agzip_stream) quando o cliente
+        aceita gzip (Content-Encoding: gzip, transparente para o navegador). ?compress=gzip força um
+        arquivo .gz e ?compress=none desliga a compressão.
+        """
+        filename = f'empresas.{export_format}'
+        content_encoding = None
+        override = request.GET.get('compress')
+        if override == 'gzip':
+            stream = compress(stream)
+            content_type = 'application/gzip'
+            filename += '.gz'
+        elif override != 'none' and accepts_gzip(request.headers.get('Accept-Encoding', '')):
+            stream = compress(stream)
+            content_encoding = 'gzip'
+
+        response = StreamingHttpResponse(stream, content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        if content_encoding:
+            response['Content-Encoding'] = content_encoding
+        patch_vary_headers(response, ['Accept-Encoding'])
+        return response
+
+class AutocompleteView(LoginRequiredMixin, View):
+    """
+    Endpoint JSON leve para os selects dos filtros: GET ?q=<prefixo> devolve até
+    `limit` opções no formato {"results": [{"id": ..., "text": ...}]}.
+    """
+    model = None
+    search_field = 'name'
+    limit = 20
+
+    def get_queryset(self):
+        return self.model.objects.all()
+
+    def get_label(self, obj):
+        return str(obj)
+
+    def search(self, request):
+        queryset = self.get_queryset()
+        term = request.GET.get('q', '').strip()
+        if term:
+            queryset = filter_prefix(queryset, self.search_field, term)
+        return queryset.order_by(self.search_field, 'pk')[:self.limit]
+
+    def get(self, request, *args, **kwargs):
+        results = [{'id': obj.pk, 'text': self.get_label(obj)} for obj in self.search(request)]
+        return JsonResponse({'results': results})
+
+class RegionAutocompleteView(AutocompleteView):
+    model = Region
+
+class StateAutocompleteView(AutocompleteView):
+    model = State
+
+class MunicipalityAutocompleteView(AutocompleteView):
+    model = Municipality
+
+    def get_queryset(self):
+        # Inclui a UF no rótulo para diferenciar municípios homônimos
+        return super().get_queryset().select_related('state')
+
+    def get_label(self, obj):
+        return f'{obj.name} ({obj.state.acronym})'
+
+
+class MetricsView(View):
+    """
+    Métricas no formato de texto do Prometheus: última importação de cada comando e latência das listagens.
+    Aceita o token de METRICS_TOKEN (Authorization: Bearer <token>) ou um usuário staff logado.
+    """
+
+    def has_access(self, request):
+        token = settings.METRICS_TOKEN
+        authorization = request.headers.get('Authorization', '')
+        if token and authorization.startswith('Bearer '):
+            return constant_time_compare(authorization[len('Bearer '):], token)
+        return request.user.is_authenticated and request.user.is_staff
+
+    def get(self, request, *args, **kwargs):
+        if not self.has_access(request):
+            if request.user.is_authenticated:
+                return HttpResponseForbidden()
+            response = HttpResponse(status=401)
+            response['WWW-Authenticate'] = 'Bearer'
+            return response
+        return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
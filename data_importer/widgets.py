@@ -0,0 +1,41 @@
+# data_importer/widgets.py
+from django import forms
+from django.core.exceptions import ValidationError
+from django.urls import reverse_lazy
+
+
+class AutocompleteSelect(forms.Select):
+    """
+    Select que renderiza apenas a opção vazia e o valor selecionado.
+
+    As demais opções são buscadas sob demanda no endpoint JSON de autocomplete
+    (atributo data-autocomplete-url, usado pelo script em base.html), em vez de
+    colocar milhares de <option> em cada carregamento da página.
+    """
+
+    def __init__(self, url_name, attrs=None):
+        super().__init__(attrs)
+        self.url_name = url_name
+
+    def get_context(self, name, value, attrs):
+        attrs = {**(attrs or {}), 'data-autocomplete-url': reverse_lazy(self.url_name)}
+        return super().get_context(name, value, attrs)
+
+    def optgroups(self, name, value, attrs=None):
+        selected = [v for v in value if v not in (None, '')]
+        field = self.choices.field
+        options = [self.create_option(name, '', field.empty_label or '', not selected, 0, attrs=attrs)]
+        for index, obj in enumerate(self._selected_objects(selected), start=1):
+            options.append(
+                self.create_option(name, obj.pk, field.label_from_instance(obj), True, index, attrs=attrs)
+            )
+        return [(None, options, 0)]
+
+    def _selected_objects(self, selected):
+        if not selected:
+            return []
+        try:
+            return list(self.choices.queryset.filter(pk__in=selected))
+        except (ValueError, TypeError, ValidationError):
+            # Valor inválido na querystring: o formulário já acusa o erro, aqui só não renderiza
+            return []